@@ -0,0 +1,166 @@
+"""
+Supabase queries behind /api/analytics/{session_id}.
+
+supabase-py is synchronous, so each query runs in a worker thread and the
+independent ones (metrics, session info, summary, first page of blocked
+items) run concurrently. blocked_items is read newest first in keyset pages
+(id < cursor), with only the requested columns. The summary comes from the
+caller's rollups when it has them (analytics_rollups.py), otherwise from the
+blocked_items_summary() SQL function (see DEPLOYMENT.md); if the function
+isn't installed we fall back to aggregating just the count and hostname
+columns page by page.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Columns a client may ask for; the page needs all but url and created_at
+BLOCKED_ITEM_COLUMNS = ("id", "timestamp", "count", "url", "hostname", "blocked_items", "created_at")
+DEFAULT_BLOCKED_ITEM_COLUMNS = ("id", "timestamp", "count", "hostname", "blocked_items")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TOP_SITES = 10
+
+# A missing SQL function is skipped until this (monotonic) time, so it costs one round trip per
+# SUMMARY_RPC_RETRY seconds rather than one per request; any other error only affects its own request
+SUMMARY_RPC_RETRY = 600.0
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+_summary_rpc_retry_at = 0.0
+
+
+def parse_columns(fields: Optional[str]) -> Tuple[str, ...]:
+    """Validated column projection for blocked_items; id is always included for the cursor"""
+    if not fields:
+        return DEFAULT_BLOCKED_ITEM_COLUMNS
+    columns = [column.strip() for column in fields.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in BLOCKED_ITEM_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown blocked_items field(s): {', '.join(unknown)}")
+    if "id" not in columns:
+        columns.insert(0, "id")
+    return tuple(dict.fromkeys(columns))
+
+
+def _single(client, table: str, session_id: str) -> Optional[dict]:
+    result = client.table(table).select("*").eq("session_id", session_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
+def _blocked_page(client, session_id: str, columns: Sequence[str], limit: int,
+                  cursor: Optional[int]) -> List[dict]:
+    query = client.table("blocked_items").select(",".join(columns)).eq("session_id", session_id)
+    if cursor is not None:
+        query = query.lt("id", cursor)
+    return query.order("id", desc=True).limit(limit).execute().data or []
+
+
+def _summary_from_rows(rows: List[dict]) -> Dict[str, Any]:
+    sites = Counter()
+    total_blocked = 0
+    for row in rows:
+        total_blocked += row.get("count") or 0
+        sites[row.get("hostname") or ""] += row.get("count") or 0
+    return {
+        "total_records": len(rows),
+        "total_blocked": total_blocked,
+        "unique_sites": len([hostname for hostname in sites if hostname]),
+        "top_sites": [{"hostname": hostname or "Unknown", "count": count}
+                      for hostname, count in sites.most_common(TOP_SITES)]
+    }
+
+
+def _missing_function(error: Exception) -> bool:
+    """PostgREST couldn't find blocked_items_summary() (PGRST202) or Postgres has no such function (42883)"""
+    code = getattr(error, "code", None)
+    return code in _MISSING_FUNCTION_CODES or any(code in str(error) for code in _MISSING_FUNCTION_CODES)
+
+
+def _summary(client, session_id: str) -> Dict[str, Any]:
+    global _summary_rpc_retry_at
+    if time.monotonic() >= _summary_rpc_retry_at:
+        try:
+            data = client.rpc("blocked_items_summary", {"p_session_id": session_id}).execute().data
+            if isinstance(data, list):
+                data = data[0] if data else {}
+            return {
+                "total_records": data.get("total_records") or 0,
+                "total_blocked": data.get("total_blocked") or 0,
+                "unique_sites": data.get("unique_sites") or 0,
+                "top_sites": data.get("top_sites") or []
+            }
+        except Exception as e:
+            if _missing_function(e):
+                _summary_rpc_retry_at = time.monotonic() + SUMMARY_RPC_RETRY
+                logger.warning(f"blocked_items_summary() not installed, aggregating in Python "
+                               f"for the next {SUMMARY_RPC_RETRY:.0f}s: {e}")
+            else:
+                logger.warning(f"blocked_items_summary() failed, aggregating in Python: {e}")
+
+    # Fallback: only the two columns the summary needs, in keyset pages
+    rows, cursor = [], None
+    while True:
+        page = _blocked_page(client, session_id, ("id", "count", "hostname"), MAX_PAGE_SIZE, cursor)
+        rows.extend(page)
+        if len(page) < MAX_PAGE_SIZE:
+            return _summary_from_rows(rows)
+        cursor = page[-1]["id"]
+
+
+async def fetch_analytics(client, session_id: str, columns: Sequence[str] = DEFAULT_BLOCKED_ITEM_COLUMNS,
+                          limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[int] = None,
+                          include_items: bool = True, summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Metrics, session info, summary (unless already known) and one page of blocked items, queried concurrently"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    async def known_summary():
+        return summary
+
+    queries = [
+        asyncio.to_thread(_single, client, "user_metrics", session_id),
+        asyncio.to_thread(_single, client, "user_sessions", session_id),
+        known_summary() if summary is not None else asyncio.to_thread(_summary, client, session_id)
+    ]
+    if include_items:
+        # One extra row tells us whether there is a next page
+        queries.append(asyncio.to_thread(_blocked_page, client, session_id, columns, limit + 1, cursor))
+    metrics, session_info, summary, *page = await asyncio.gather(*queries)
+
+    data = {
+        "session_id": session_id,
+        "metrics": metrics,
+        "session_info": session_info,
+        "summary": summary
+    }
+    if include_items:
+        items = page[0]
+        data["blocked_items"] = items[:limit]
+        data["next_cursor"] = str(items[limit - 1]["id"]) if len(items) > limit else None
+    return data
+
+
+async def stream_analytics(client, session_id: str,
+                           columns: Sequence[str] = DEFAULT_BLOCKED_ITEM_COLUMNS,
+                           summary: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """The full analytics response as JSON text, streaming blocked items one page at a time"""
+    data = await fetch_analytics(client, session_id, include_items=False, summary=summary)
+    head = json.dumps({"success": True, "data": data}, default=str)
+    # Reopen the data object to append the items array
+    yield head[:-2] + ', "blocked_items": ['
+
+    cursor, first = None, True
+    while True:
+        page = await asyncio.to_thread(_blocked_page, client, session_id, columns, MAX_PAGE_SIZE, cursor)
+        if page:
+            rows = ",".join(json.dumps(row, default=str) for row in page)
+            yield rows if first else "," + rows
+            first = False
+        if len(page) < MAX_PAGE_SIZE:
+            break
+        cursor = page[-1]["id"]
+    yield "]}}"
@@ -0,0 +1,353 @@
+"""
+Per-session analytics rollups maintained on ingest.
+
+Each /api/blocked-items batch is folded into in-memory deltas as it arrives:
+record and item totals, items per day and items per hostname. Every
+flush_interval the deltas are added to rollup tables in the host-local SQLite
+file in one transaction, so all workers share them. Reading a session's
+summary touches only its rollup rows (one per day and per site), never its raw
+blocked_items history.
+
+Rollups only see rows ingested while they were running, so a session is only
+served from them when its rollup is known to be complete: it was backfilled,
+or the session was created after the rollup tables were (their epoch), so
+every batch it ever sent went through add(). Anything else returns None and
+the caller asks Supabase instead. The SQLite file lives under /tmp by
+default and does not survive a redeploy; point ANALYTICS_ROLLUP_PATH at a
+persistent disk, or rebuild after each deploy (and when enabling rollups on an
+existing database):
+
+    python analytics_rollups.py backfill [--session SESSION_ID] [--path FILE]
+"""
+
+import os
+import sys
+import time
+import heapq
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from shared_cache import DEFAULT_SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+TOP_SITES = 10
+DAILY_DAYS = 30
+
+
+def day_of(record: dict) -> str:
+    """UTC day (YYYY-MM-DD) of a blocked_items record: its timestamp, else created_at"""
+    for value in (record.get("timestamp"), record.get("created_at")):
+        if value is None or value == "":
+            continue
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            seconds = float(value)
+            # The extension sends Date.now() milliseconds
+            if seconds > 1e11:
+                seconds /= 1000
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%Y-%m-%d")
+        if isinstance(value, str) and len(value) >= 10 and value[4] == "-" and value[7] == "-":
+            return value[:10]
+    return datetime.now(tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def epoch_seconds(value: Any) -> Optional[float]:
+    """Unix seconds for a millisecond/second timestamp or an ISO-8601 string, None if unparseable"""
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        seconds = float(value)
+        return seconds / 1000 if seconds > 1e11 else seconds
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+class Rollup:
+    """Totals for one session (or a delta to add to them)"""
+
+    __slots__ = ("records", "blocked", "daily", "hosts")
+
+    def __init__(self):
+        self.records = 0
+        self.blocked = 0
+        self.daily: Dict[str, int] = {}
+        self.hosts: Dict[str, int] = {}
+
+    def add_records(self, records: Iterable[dict]):
+        for record in records:
+            count = int(record.get("count") or 0)
+            day = day_of(record)
+            hostname = record.get("hostname") or ""
+            self.records += 1
+            self.blocked += count
+            self.daily[day] = self.daily.get(day, 0) + count
+            self.hosts[hostname] = self.hosts.get(hostname, 0) + count
+
+    def merge(self, other: "Rollup"):
+        self.records += other.records
+        self.blocked += other.blocked
+        for day, count in other.daily.items():
+            self.daily[day] = self.daily.get(day, 0) + count
+        for hostname, count in other.hosts.items():
+            self.hosts[hostname] = self.hosts.get(hostname, 0) + count
+
+    def summary(self) -> Dict[str, Any]:
+        top = heapq.nlargest(TOP_SITES, self.hosts.items(), key=lambda item: item[1])
+        return {
+            "total_records": self.records,
+            "total_blocked": self.blocked,
+            "unique_sites": sum(1 for hostname in self.hosts if hostname),
+            "top_sites": [{"hostname": hostname or "Unknown", "count": count} for hostname, count in top],
+            "daily": [{"day": day, "count": self.daily[day]} for day in sorted(self.daily)[-DAILY_DAYS:]]
+        }
+
+
+class RollupStore:
+    """In-memory rollup deltas, periodically added to shared SQLite rollup tables"""
+
+    def __init__(self, path: str = DEFAULT_SHARED_CACHE_PATH, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Rollup] = {}
+        # One connection per thread: flushes run in a worker thread while reads stay on the loop
+        self._local = threading.local()
+        self.epoch: Optional[float] = None
+        self.ingested = 0
+        self.flushes = 0
+        self.reads = 0
+        self.incomplete = 0
+        self.errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Reopened if we find ourselves in a forked child
+        if getattr(self._local, "conn", None) is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup_sessions ("
+                "session_id TEXT PRIMARY KEY, records INTEGER NOT NULL, blocked INTEGER NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup_daily ("
+                "session_id TEXT NOT NULL, day TEXT NOT NULL, blocked INTEGER NOT NULL, "
+                "PRIMARY KEY (session_id, day))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup_hosts ("
+                "session_id TEXT NOT NULL, hostname TEXT NOT NULL, blocked INTEGER NOT NULL, "
+                "PRIMARY KEY (session_id, hostname))"
+            )
+            try:
+                conn.execute("ALTER TABLE rollup_sessions ADD COLUMN complete INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # Already there
+            # When these tables started seeing ingests; sessions created later are complete by construction
+            conn.execute("CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO rollup_meta (key, value) VALUES ('epoch', ?)", (time.time(),))
+            self.epoch = conn.execute("SELECT value FROM rollup_meta WHERE key = 'epoch'").fetchone()[0]
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def add(self, session_id: str, records: List[dict]):
+        """Fold an ingested blocked_items batch into this worker's deltas"""
+        if not records:
+            return
+        self._pending.setdefault(session_id, Rollup()).add_records(records)
+        self.ingested += len(records)
+
+    def start_session(self, session_id: str, created_at: Any):
+        """Mark a session complete if it was created after the rollups started, so every batch was seen"""
+        created = epoch_seconds(created_at)
+        try:
+            conn = self._connection()
+            if created is None or created < self.epoch:
+                return
+            conn.execute(
+                "INSERT INTO rollup_sessions (session_id, records, blocked, updated_at, complete) "
+                "VALUES (?, 0, 0, ?, 1) ON CONFLICT(session_id) DO UPDATE SET complete = 1",
+                (session_id, time.time())
+            )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Analytics rollup session start failed: {e}")
+
+    def _write(self, conn: sqlite3.Connection, rollups: Dict[str, Rollup], replace: bool = False):
+        """Add (or with replace, overwrite) rollups in one transaction"""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                for table in ("rollup_sessions", "rollup_daily", "rollup_hosts"):
+                    conn.executemany(f"DELETE FROM {table} WHERE session_id = ?", [(s,) for s in rollups])
+            # A backfill (replace) rebuilds the whole session, so it is complete from then on
+            conn.executemany(
+                "INSERT INTO rollup_sessions (session_id, records, blocked, updated_at, complete) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET records = records + excluded.records, "
+                "blocked = blocked + excluded.blocked, updated_at = excluded.updated_at, "
+                "complete = MAX(complete, excluded.complete)",
+                [(session_id, rollup.records, rollup.blocked, now, int(replace))
+                 for session_id, rollup in rollups.items()]
+            )
+            conn.executemany(
+                "INSERT INTO rollup_daily (session_id, day, blocked) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id, day) DO UPDATE SET blocked = blocked + excluded.blocked",
+                [(session_id, day, count) for session_id, rollup in rollups.items()
+                 for day, count in rollup.daily.items()]
+            )
+            conn.executemany(
+                "INSERT INTO rollup_hosts (session_id, hostname, blocked) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id, hostname) DO UPDATE SET blocked = blocked + excluded.blocked",
+                [(session_id, hostname, count) for session_id, rollup in rollups.items()
+                 for hostname, count in rollup.hosts.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write_pending(self, pending: Dict[str, Rollup]) -> bool:
+        try:
+            self._write(self._connection(), pending)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Analytics rollup flush failed, will retry: {e}")
+            return False
+        self.flushes += 1
+        return True
+
+    def _restore(self, pending: Dict[str, Rollup]):
+        # Put the deltas back underneath anything that arrived meanwhile
+        for session_id, rollup in pending.items():
+            self._pending.setdefault(session_id, Rollup()).merge(rollup)
+
+    def flush(self):
+        """Add this worker's deltas to the shared tables (blocking; for scripts and tests)"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        if not self._write_pending(pending):
+            self._restore(pending)
+
+    async def flush_async(self):
+        """flush() with the SQLite transaction in a worker thread, so waiting on the write lock can't stall the loop"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        written = False
+        try:
+            written = await asyncio.to_thread(self._write_pending, pending)
+        finally:
+            if not written:
+                self._restore(pending)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Summary for a session from its rollups (plus unflushed deltas), or None unless they are complete"""
+        self.reads += 1
+        rollup = Rollup()
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT records, blocked, complete FROM rollup_sessions WHERE session_id = ?",
+                               (session_id,)).fetchone()
+            if row is None or not row[2]:
+                # Never backfilled and older than the rollups: only part of its history went through add()
+                self.incomplete += 1
+                return None
+            rollup.records, rollup.blocked = row[0], row[1]
+            rollup.daily = dict(conn.execute("SELECT day, blocked FROM rollup_daily WHERE session_id = ?",
+                                             (session_id,)).fetchall())
+            rollup.hosts = dict(conn.execute("SELECT hostname, blocked FROM rollup_hosts WHERE session_id = ?",
+                                             (session_id,)).fetchall())
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Analytics rollup read failed: {e}")
+            return None
+        pending = self._pending.get(session_id)
+        if pending is not None:
+            rollup.merge(pending)
+        return rollup.summary()
+
+    async def run(self):
+        """Flush deltas every flush_interval"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                logger.error(f"Analytics rollup loop failed: {e}")
+
+    def backfill(self, client, session_id: Optional[str] = None, page_size: int = 1000) -> int:
+        """Rebuild rollups from the blocked_items table (one session, or all); returns rows read"""
+        rollups: Dict[str, Rollup] = {}
+        cursor, rows = None, 0
+        while True:
+            query = client.table("blocked_items").select("id,session_id,timestamp,created_at,count,hostname")
+            if session_id:
+                query = query.eq("session_id", session_id)
+            if cursor is not None:
+                query = query.gt("id", cursor)
+            page = query.order("id").limit(page_size).execute().data or []
+            for record in page:
+                rollups.setdefault(record["session_id"], Rollup()).add_records([record])
+            rows += len(page)
+            if len(page) < page_size:
+                break
+            cursor = page[-1]["id"]
+            print(f"  {rows} rows, {len(rollups)} sessions")
+
+        conn = self._connection()
+        if session_id is None:
+            # Full rebuild: sessions with no rows left shouldn't keep stale rollups
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ("rollup_sessions", "rollup_daily", "rollup_hosts"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        self._write(conn, rollups, replace=True)
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending_sessions': len(self._pending),
+            'ingested': self.ingested,
+            'flushes': self.flushes,
+            'reads': self.reads,
+            'incomplete': self.incomplete,
+            'errors': self.errors
+        }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    args = sys.argv[1:]
+    if not args or args[0] != "backfill":
+        print(__doc__)
+        sys.exit(1)
+
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    load_dotenv()
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
+    if not url or not key:
+        print("SUPABASE_URL and SUPABASE_ANON_KEY are required")
+        sys.exit(1)
+    path = option("--path", os.getenv("ANALYTICS_ROLLUP_PATH") or os.getenv("SHARED_CACHE_PATH", DEFAULT_SHARED_CACHE_PATH))
+    session = option("--session")
+
+    start = time.time()
+    rows = RollupStore(path).backfill(create_client(url, key), session)
+    print(f"Rebuilt rollups for {session or 'all sessions'} from {rows} rows in {time.time() - start:.1f}s -> {path}")
@@ -0,0 +1,272 @@
+"""
+Global blocked-items counter shared by every gunicorn worker.
+
+Reports only bump a pending total in the worker (O(1), no I/O). A background
+loop in each worker folds its pending total into one row of the host-local
+SQLite file with a single atomic UPDATE, then reads the row back; when the
+shared value has changed it calls on_change, so every worker's WebSocket
+clients see the same number. The SQLite row is the pub/sub channel: workers
+publish by incrementing it and subscribe by polling it once per interval.
+
+Durability: one worker at a time (whoever claims the snapshot lease in the
+row) writes the value to a JSON file and to a Supabase table. On startup the
+counter resumes from the largest of the shared row and both snapshots. The
+SQLite file and the default snapshot file live in the tempdir, so the Supabase
+table is the store that survives a deploy; without it (durable is False) the
+total resets whenever the host's disk does.
+
+SQLite work runs in a worker thread so waiting on the write lock never stalls
+the event loop; increments handed to a thread are tracked until it returns.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared_cache import DEFAULT_SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), "topaz-blocked-count.json")
+
+
+class BlockedCounter:
+    """Batched, host-wide counter with file and Supabase snapshots"""
+
+    def __init__(self, backend: str = "sqlite", path: str = DEFAULT_SHARED_CACHE_PATH,
+                 name: str = "blocked_items", flush_interval: float = 1.0,
+                 snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH, snapshot_interval: float = 60.0,
+                 supabase: Any = None, supabase_table: Optional[str] = None):
+        self.shared = (backend or "").lower() == "sqlite"
+        self.path = path
+        self.name = name
+        self.flush_interval = flush_interval
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.supabase = supabase
+        self.supabase_table = supabase_table
+
+        # Last value read from the shared row, plus increments not yet written to it (and being written)
+        self._value = 0
+        self._pending = 0
+        self._in_flight = 0
+        self._syncing: Optional[asyncio.Future] = None
+        self.last_updated = time.time()
+        self._last_snapshot = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        # The connection is shared by the worker threads running sync, the lease and the seed
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.snapshots = 0
+        self.errors = 0
+
+    @property
+    def count(self) -> int:
+        return self._value + self._pending + self._in_flight
+
+    @property
+    def durable(self) -> bool:
+        """Whether the count is snapshotted somewhere that outlives this host (the Supabase table)"""
+        return bool(self.supabase_table) and getattr(self.supabase, "configured", self.supabase is not None)
+
+    def add(self, items: int):
+        """Count items locally; they reach the shared row on the next flush"""
+        self._pending += items
+        self.last_updated = time.time()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; reopened if we find ourselves in a forked child
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL, updated_at REAL NOT NULL, "
+                "snapshot_at REAL NOT NULL DEFAULT 0)"
+            )
+            conn.execute("INSERT OR IGNORE INTO counters (name, value, updated_at) VALUES (?, 0, ?)",
+                         (self.name, time.time()))
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _write(self, pending: int, updated_at: float) -> Optional[Tuple[int, float]]:
+        """Add pending to the shared row and read it back (runs in a worker thread); None on failure"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                if pending:
+                    conn.execute("UPDATE counters SET value = value + ?, updated_at = ? WHERE name = ?",
+                                 (pending, updated_at, self.name))
+                    self.flushes += 1
+                return conn.execute("SELECT value, updated_at FROM counters WHERE name = ?",
+                                    (self.name,)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Blocked counter sync failed: {e}")
+            return None
+
+    def _take(self) -> int:
+        pending, self._pending = self._pending, 0
+        self._in_flight += pending
+        return pending
+
+    def _settle(self, pending: int, row: Optional[Tuple[int, float]]) -> bool:
+        before = self._value
+        self._in_flight -= pending
+        if row is None:
+            # Keep the increments and retry on the next tick
+            self._pending += pending
+            return False
+        self._value = row[0]
+        self.last_updated = max(self.last_updated, row[1])
+        return self._value != before
+
+    def sync(self) -> bool:
+        """Write pending increments to the shared row and read it back; True if the shared value changed"""
+        if not self.shared:
+            before = self._value
+            self._value, self._pending = self.count, 0
+            return self._value != before
+        pending = self._take()
+        return self._settle(pending, self._write(pending, self.last_updated))
+
+    async def sync_async(self) -> bool:
+        """sync() with the SQLite work in a worker thread"""
+        if not self.shared:
+            return self.sync()
+        pending = self._take()
+        future = asyncio.ensure_future(asyncio.to_thread(self._write, pending, self.last_updated))
+        self._syncing = future
+        settled = []
+
+        def settle(done: asyncio.Future):
+            row = done.result() if not done.cancelled() and done.exception() is None else None
+            settled.append(self._settle(pending, row))
+
+        # Settled even if we are cancelled meanwhile: the thread can't be stopped and may still commit
+        future.add_done_callback(settle)
+        await asyncio.shield(future)
+        await asyncio.sleep(0)  # Let the done callback run
+        return settled[0] if settled else False
+
+    def _claim_snapshot(self, force: bool) -> bool:
+        """Whether this worker should write the snapshot now (at most one worker per interval)"""
+        now = time.time()
+        if not self.shared:
+            if force or now - self._last_snapshot >= self.snapshot_interval:
+                self._last_snapshot = now
+                return True
+            return False
+        try:
+            with self._lock:
+                cursor = self._connection().execute(
+                    "UPDATE counters SET snapshot_at = ? WHERE name = ? AND snapshot_at <= ?",
+                    (now, self.name, now if force else now - self.snapshot_interval)
+                )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Blocked counter snapshot lease failed: {e}")
+            return False
+        return cursor.rowcount == 1
+
+    async def snapshot(self, force: bool = False):
+        """Persist the current value to the snapshot file and Supabase"""
+        if not await asyncio.to_thread(self._claim_snapshot, force):
+            return
+        count = self.count
+        if self.snapshot_path:
+            try:
+                # Write-then-rename so a crash never leaves a truncated snapshot
+                tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({"name": self.name, "count": count, "updated_at": self.last_updated}, f)
+                os.replace(tmp_path, self.snapshot_path)
+            except OSError as e:
+                self.errors += 1
+                logger.warning(f"Blocked counter snapshot to {self.snapshot_path} failed: {e}")
+        if self.supabase and self.supabase_table:
+            row = {"name": self.name, "value": count, "updated_at": self.last_updated}
+            try:
+                await asyncio.to_thread(
+                    lambda: self.supabase.table(self.supabase_table).upsert(row, on_conflict="name").execute()
+                )
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Blocked counter snapshot to Supabase failed: {e}")
+        self.snapshots += 1
+
+    async def restore(self):
+        """Resume from the largest of the shared row and the snapshots"""
+        restored = 0
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path) as f:
+                    restored = max(restored, int(json.load(f).get("count", 0)))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read blocked counter snapshot {self.snapshot_path}: {e}")
+        if self.supabase and self.supabase_table:
+            try:
+                result = await asyncio.to_thread(
+                    lambda: self.supabase.table(self.supabase_table).select("value").eq("name", self.name).execute()
+                )
+                if result.data:
+                    restored = max(restored, int(result.data[0].get("value") or 0))
+            except Exception as e:
+                logger.warning(f"Could not read blocked counter from Supabase: {e}")
+
+        if not self.shared:
+            self._value = max(self._value, restored)
+        else:
+            await asyncio.to_thread(self._seed, restored)
+            await self.sync_async()
+        logger.info(f"📊 Blocked items counter resumed at {self.count}")
+
+    def _seed(self, restored: int):
+        try:
+            # Every worker runs this at startup; MAX makes it idempotent
+            with self._lock:
+                self._connection().execute("UPDATE counters SET value = MAX(value, ?) WHERE name = ?",
+                                           (restored, self.name))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not seed shared blocked counter: {e}")
+
+    async def run(self, on_change: Callable[[int], None]):
+        """Flush and poll every flush_interval, calling on_change(count) when the global value moves"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if await self.sync_async():
+                    on_change(self.count)
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Blocked counter loop failed: {e}")
+
+    async def close(self):
+        """Flush whatever is pending and write a final snapshot"""
+        if self._syncing is not None and not self._syncing.done():
+            # A cancelled run() may still have a write in a thread
+            await asyncio.wait([self._syncing])
+            await asyncio.sleep(0)
+        await self.sync_async()
+        await self.snapshot(force=True)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'backend': 'sqlite' if self.shared else 'memory',
+            'count': self.count,
+            'pending': self._pending + self._in_flight,
+            'durable': self.durable,
+            'flushes': self.flushes,
+            'snapshots': self.snapshots,
+            'errors': self.errors
+        }
@@ -0,0 +1,124 @@
+"""
+In-process LRU cache with TTL and a byte budget.
+
+Entries live in an OrderedDict in recency order, so lookups, inserts and
+evictions are all O(1); nothing is ever sorted on insert. Memory is bounded by
+an estimate of the bytes held rather than by entry count.
+"""
+
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, floats)
+ENTRY_OVERHEAD_BYTES = 120
+
+
+def estimate_size(key: Hashable, value: Any) -> int:
+    """Approximate bytes held by one entry, using its compact JSON encoding"""
+    try:
+        value_size = len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        value_size = len(repr(value))
+    return len(str(key)) + value_size + ENTRY_OVERHEAD_BYTES
+
+
+class LRUCache:
+    """Ordered LRU with per-entry expiry, a byte budget and hit/miss/eviction counters"""
+
+    def __init__(self,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 max_age: float = 300,
+                 max_entries: Optional[int] = None,
+                 sizeof: Callable[[Hashable, Any], int] = estimate_size,
+                 name: str = "cache"):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if time.time() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, max_age: Optional[float] = None):
+        size = self.sizeof(key, value)
+        if size > self.max_bytes:
+            # Never let one oversized entry flush the whole cache
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        ttl = max_age if max_age is not None else self.max_age
+        self._entries[key] = (value, time.time() + ttl, size)
+        self.bytes += size
+        self._evict()
+
+    def delete(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def _evict(self):
+        now = time.time()
+        # Drop expired entries sitting at the cold end first
+        while self._entries:
+            key, (_, expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+        while self._entries and (self.bytes > self.max_bytes or
+                                 (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,116 @@
+"""
+Per-provider circuit breaker.
+
+Closed: calls flow and outcomes are recorded over a sliding time window.
+When the error rate over the window crosses the threshold (with enough calls
+to be meaningful), the breaker opens and calls are refused outright. After
+open_for seconds it goes half-open and lets a few probe calls through: a
+success closes it again, a failure re-opens it.
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker with half-open probing"""
+
+    def __init__(self, name: str = "upstream", window: float = 30.0, min_calls: int = 10,
+                 error_rate: float = 0.5, open_for: float = 15.0, probes: int = 1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_for = open_for
+        self.probes = probes
+
+        self.state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def available(self) -> bool:
+        """Whether a call could currently be let through (does not reserve a probe)"""
+        if self.state == OPEN:
+            return time.time() - self._opened_at >= self.open_for
+        if self.state == HALF_OPEN:
+            return self._probes_in_flight < self.probes
+        return True
+
+    def allow(self) -> bool:
+        """Reserve permission for one call; every allowed call must end in record_* or release"""
+        if self.state == OPEN and time.time() - self._opened_at >= self.open_for:
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"🔌 Circuit {self.name} half-open: probing")
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self._probes_in_flight < self.probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """The allowed call ended without an outcome (e.g. cancelled as a hedge loser)"""
+        if self.state == HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._probes_in_flight = 0
+            logger.info(f"✅ Circuit {self.name} closed")
+            return
+        self._record(True)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._record(False)
+
+    def _record(self, ok: bool):
+        now = time.time()
+        self._outcomes.append((now, ok))
+        self._trim(now)
+        if self.state != CLOSED or len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for _, outcome in self._outcomes if not outcome)
+        if failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.time()
+        self._probes_in_flight = 0
+        self._outcomes.clear()
+        self.times_opened += 1
+        logger.warning(f"🚨 Circuit {self.name} opened for {self.open_for:.0f}s")
+
+    def stats(self) -> Dict[str, object]:
+        self._trim(time.time())
+        failures = sum(1 for _, outcome in self._outcomes if not outcome)
+        return {
+            'state': self.state,
+            'window_calls': len(self._outcomes),
+            'window_errors': failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
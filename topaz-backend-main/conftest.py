@@ -0,0 +1,2 @@
+# routing_test.py is a manual latency script against a running server (and doesn't compile), not a test module
+collect_ignore = ["routing_test.py"]
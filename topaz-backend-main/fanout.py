@@ -0,0 +1,59 @@
+"""
+Helpers for fanning a large grid out to the LLM as concurrent chunks.
+
+AdaptiveChunkSizer picks how many children go into each chunk from the
+latency we actually observe upstream: chunks shrink when calls run slower than
+the target and grow back when there is headroom.
+"""
+
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveChunkSizer:
+    """AIMD controller over chunk size driven by an EWMA of upstream latency"""
+
+    def __init__(self,
+                 initial: int = 15,
+                 minimum: int = 5,
+                 maximum: int = 40,
+                 target_latency: float = 1.5,
+                 alpha: float = 0.2):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.alpha = alpha
+        self._size = float(max(minimum, min(maximum, initial)))
+        self._ewma_latency = None
+
+    @property
+    def chunk_size(self) -> int:
+        return int(self._size)
+
+    def observe(self, latency: float, children: int):
+        """Record one upstream call of `children` items that took `latency` seconds"""
+        if children <= 0:
+            return
+
+        if self._ewma_latency is None:
+            self._ewma_latency = latency
+        else:
+            self._ewma_latency = self.alpha * latency + (1 - self.alpha) * self._ewma_latency
+
+        # Only calls near the current size say anything about that size
+        if children < self._size * 0.5:
+            return
+
+        if self._ewma_latency > self.target_latency:
+            self._size = max(self.minimum, self._size * 0.75)
+        elif self._ewma_latency < self.target_latency * 0.6:
+            self._size = min(self.maximum, self._size + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'chunk_size': self.chunk_size,
+            'ewma_latency': round(self._ewma_latency, 3) if self._ewma_latency is not None else None,
+            'target_latency': self.target_latency
+        }
@@ -0,0 +1,40 @@
+"""
+JSON encoding on the hot paths.
+
+Uses orjson when it is installed (several times faster than the stdlib for
+the response and NDJSON event sizes we produce) and falls back to json with
+compact separators otherwise, so the output is the same either way.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=str).encode("utf-8")
+
+
+def dumps(content: Any) -> str:
+    return dumps_bytes(content).decode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
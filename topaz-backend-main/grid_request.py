@@ -0,0 +1,209 @@
+"""
+One-pass decoding of grid analysis requests.
+
+The extension's grid payloads are large (every grid repeats its children's
+text in gridText), so the body may arrive gzip- or zstd-encoded. It is
+decompressed with a size cap, validated against typed structs (msgspec when
+installed, a hand-written check over orjson/json output otherwise) and
+converted to the plain dicts the rest of the pipeline uses in a single walk
+that also records every child ID in document order and each child's full
+text. Handlers use those instead of re-walking gridStructure.
+"""
+
+import zlib
+from typing import Dict, List, Optional
+
+from fast_json import loads
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class RequestDecodeError(ValueError):
+    """Body could not be decoded; status_code is what the client should get"""
+
+    def __init__(self, detail: str, status_code: int = 422):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class GridRequest:
+    """Decoded /fetch_distracting_chunks body plus the per-child indexes built while decoding"""
+
+    __slots__ = ("gridStructure", "currentUrl", "whitelist", "blacklist", "visitorId", "child_ids", "child_texts")
+
+    def __init__(self, gridStructure: dict, currentUrl: str, visitorId: str,
+                 whitelist: Optional[List[str]] = None, blacklist: Optional[List[str]] = None,
+                 child_ids: Optional[List[str]] = None, child_texts: Optional[Dict[str, str]] = None):
+        self.gridStructure = gridStructure
+        self.currentUrl = currentUrl
+        self.visitorId = visitorId
+        self.whitelist = whitelist or []
+        self.blacklist = blacklist or []
+        if child_ids is None or child_texts is None:
+            child_ids, child_texts = index_children(gridStructure)
+        self.child_ids = child_ids
+        self.child_texts = child_texts
+
+
+def index_children(grid_structure: dict):
+    """Child IDs in document order and full text by ID, for a grid structure built elsewhere"""
+    child_ids, child_texts = [], {}
+    for grid in (grid_structure or {}).get('grids', []) or []:
+        for child in grid.get('children', []) or []:
+            child_id = child.get('id')
+            if child_id:
+                child_ids.append(child_id)
+                child_texts[child_id] = child.get('text', '') or ''
+    return child_ids, child_texts
+
+
+def decompress(body: bytes, content_encoding: Optional[str], max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> bytes:
+    """Undo Content-Encoding (identity, gzip, zstd), refusing to inflate past max_bytes"""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        data = body
+    elif encoding in ("gzip", "x-gzip", "deflate"):
+        # wbits=47 auto-detects gzip or zlib headers
+        inflater = zlib.decompressobj(47)
+        try:
+            data = inflater.decompress(body, max_bytes + 1)
+        except zlib.error as e:
+            raise RequestDecodeError(f"Invalid {encoding} body: {e}", status_code=400)
+    elif encoding == "zstd":
+        if zstandard is None:
+            raise RequestDecodeError("zstd request bodies are not supported on this server", status_code=415)
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(max_bytes + 1)
+        except zstandard.ZstdError as e:
+            raise RequestDecodeError(f"Invalid zstd body: {e}", status_code=400)
+    else:
+        raise RequestDecodeError(f"Unsupported Content-Encoding: {encoding}", status_code=415)
+
+    if len(data) > max_bytes:
+        raise RequestDecodeError(f"Request body larger than {max_bytes} bytes", status_code=413)
+    return data
+
+
+if msgspec is not None:
+    class _Child(msgspec.Struct):
+        id: Optional[str] = None
+        text: Optional[str] = ""
+        priority: Optional[float] = None
+
+    class _Grid(msgspec.Struct):
+        id: Optional[str] = None
+        gridText: Optional[str] = None
+        totalChildren: Optional[int] = None
+        children: List[_Child] = []
+
+    class _GridStructure(msgspec.Struct):
+        timestamp: Optional[str] = None
+        totalGrids: int = 0
+        searchQuery: Optional[str] = None
+        grids: List[_Grid] = []
+
+    class _Request(msgspec.Struct):
+        gridStructure: _GridStructure
+        currentUrl: str
+        visitorId: str
+        whitelist: List[str] = []
+        blacklist: List[str] = []
+
+    _decoder = msgspec.json.Decoder(_Request)
+
+
+def _from_struct(decoded) -> GridRequest:
+    structure = decoded.gridStructure
+    child_ids, child_texts, grids = [], {}, []
+    for grid in structure.grids:
+        children = []
+        for child in grid.children:
+            entry = {'id': child.id, 'text': child.text}
+            if child.priority is not None:
+                entry['priority'] = child.priority
+            children.append(entry)
+            if child.id:
+                child_ids.append(child.id)
+                child_texts[child.id] = child.text or ''
+        entry = {'id': grid.id, 'children': children}
+        if grid.gridText is not None:
+            entry['gridText'] = grid.gridText
+        if grid.totalChildren is not None:
+            entry['totalChildren'] = grid.totalChildren
+        grids.append(entry)
+
+    grid_structure = {'totalGrids': structure.totalGrids, 'grids': grids}
+    if structure.timestamp is not None:
+        grid_structure['timestamp'] = structure.timestamp
+    if structure.searchQuery is not None:
+        grid_structure['searchQuery'] = structure.searchQuery
+    return GridRequest(grid_structure, decoded.currentUrl, decoded.visitorId,
+                       decoded.whitelist, decoded.blacklist, child_ids, child_texts)
+
+
+def _expect(value, types, where: str):
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise RequestDecodeError(f"Invalid value for {where}")
+    return value
+
+
+def _from_dict(data) -> GridRequest:
+    _expect(data, dict, "body")
+    for field in ("gridStructure", "currentUrl", "visitorId"):
+        if field not in data:
+            raise RequestDecodeError(f"Missing field: {field}")
+    structure = _expect(data["gridStructure"], dict, "gridStructure")
+    current_url = _expect(data["currentUrl"], str, "currentUrl")
+    visitor_id = _expect(data["visitorId"], str, "visitorId")
+    lists = {}
+    for field in ("whitelist", "blacklist"):
+        values = _expect(data.get(field, []), list, field)
+        lists[field] = [_expect(value, str, field) for value in values]
+
+    # Same walk as _from_struct: the dicts are reused as-is, only checked and indexed
+    child_ids, child_texts = [], {}
+    for grid in _expect(structure.get('grids', []), list, "gridStructure.grids"):
+        children = grid.get('children', []) if type(grid) is dict else None
+        if type(children) is not list:
+            raise RequestDecodeError("Invalid value for grid.children")
+        for child in children:
+            child_id = child.get('id') if type(child) is dict else None
+            if not child_id:
+                continue
+            text = child.get('text') or ''
+            if type(child_id) is not str or type(text) is not str:
+                raise RequestDecodeError("Invalid value for child.id or child.text")
+            child_ids.append(child_id)
+            child_texts[child_id] = text
+    return GridRequest(structure, current_url, visitor_id, lists["whitelist"], lists["blacklist"],
+                       child_ids, child_texts)
+
+
+def decode_grid_request(body: bytes, content_encoding: Optional[str] = None,
+                        max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> GridRequest:
+    """Decompress, validate and index a grid analysis request body"""
+    data = decompress(body, content_encoding, max_bytes)
+    if msgspec is not None:
+        try:
+            return _from_struct(_decoder.decode(data))
+        except msgspec.ValidationError as e:
+            raise RequestDecodeError(str(e))
+        except msgspec.DecodeError as e:
+            raise RequestDecodeError(f"Invalid JSON: {e}", status_code=400)
+    try:
+        parsed = loads(data)
+    except ValueError as e:
+        raise RequestDecodeError(f"Invalid JSON: {e}", status_code=400)
+    return _from_dict(parsed)
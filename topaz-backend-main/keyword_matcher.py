@@ -0,0 +1,129 @@
+"""
+Compiled multi-pattern keyword matching (Aho-Corasick).
+
+One automaton is built per distinct blacklist/whitelist and cached, so
+matching a child costs one pass over its text regardless of how many keywords
+the profile has. Patterns and text are NFKC-normalized, accent-stripped and
+case-folded, so "Café", "CAFE" and "café" all match each other.
+"""
+
+import re
+import unicodedata
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fold_text(text: str) -> str:
+    """Unicode- and case-fold text for matching"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    # Runs of whitespace (including line breaks) match a single space in a keyword phrase
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", stripped).casefold())
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over folded patterns; search reports which patterns occur"""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = [fold_text(pattern).strip() for pattern in patterns]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # Breadth-first pass to wire failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def search(self, text: str, whole_words: bool = False, folded: bool = False) -> Set[int]:
+        """Indices of patterns found in text (optionally only at word boundaries)"""
+        if not folded:
+            text = fold_text(text)
+        found: Set[int] = set()
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for index in self._output[state]:
+                if index in found:
+                    continue
+                if whole_words:
+                    start = position - len(self.patterns[index]) + 1
+                    before = text[start - 1] if start > 0 else " "
+                    after = text[position + 1] if position + 1 < len(text) else " "
+                    if before.isalnum() or after.isalnum():
+                        continue
+                found.add(index)
+        return found
+
+
+class KeywordMatcher:
+    """Blacklist/whitelist matcher where any whitelist hit vetoes blacklist hits"""
+
+    def __init__(self, blacklist: Tuple[str, ...], whitelist: Tuple[str, ...]):
+        self.blacklist = blacklist
+        self.whitelist = whitelist
+        self._blacklist = AhoCorasick(list(blacklist))
+        self._whitelist = AhoCorasick(list(whitelist))
+
+    def blacklist_hits(self, text: str, whole_words: bool = True) -> List[str]:
+        """Blacklist keywords found in text, or [] when a whitelist keyword is present"""
+        if not self.blacklist:
+            return []
+        folded = fold_text(text)
+        hits = self._blacklist.search(folded, whole_words=whole_words, folded=True)
+        if not hits:
+            return []
+        if self.whitelist and self._whitelist.search(folded, whole_words=whole_words, folded=True):
+            return []
+        return [self.blacklist[index] for index in sorted(hits)]
+
+    def should_hide(self, text: str, whole_words: bool = True) -> bool:
+        return bool(self.blacklist_hits(text, whole_words=whole_words))
+
+
+@lru_cache(maxsize=256)
+def _compiled_matcher(blacklist: Tuple[str, ...], whitelist: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(blacklist, whitelist)
+
+
+def get_keyword_matcher(blacklist: Optional[List[str]], whitelist: Optional[List[str]] = None) -> KeywordMatcher:
+    """Matcher for this blacklist/whitelist, built once and reused across requests"""
+    return _compiled_matcher(
+        tuple(sorted(set(blacklist or []))),
+        tuple(sorted(set(whitelist or [])))
+    )
+
+
+def matcher_stats() -> Dict[str, int]:
+    info = _compiled_matcher.cache_info()
+    return {'compiled': info.currsize, 'hits': info.hits, 'misses': info.misses}
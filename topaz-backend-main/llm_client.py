@@ -0,0 +1,153 @@
+"""
+Async upstream client for OpenAI-compatible chat completion endpoints.
+
+One pooled httpx.AsyncClient is shared by every request handled by the worker,
+so LLM calls never block the event loop and keep-alive connections are reused.
+"""
+
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Optional, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (installed via httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamError(Exception):
+    """Raised when the upstream LLM call fails, times out or returns a non-200"""
+
+    def __init__(self, detail: str, status_code: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class UpstreamTimeout(UpstreamError):
+    """The upstream call ran out of time (connect/read timeout or the total deadline)"""
+
+
+class LLMClient:
+    """Shared keep-alive connection pool with per-call connect/read/total timeouts"""
+
+    def __init__(self,
+                 max_connections: int = 200,
+                 max_keepalive_connections: int = 50,
+                 keepalive_expiry: float = 30.0,
+                 connect_timeout: float = 5.0,
+                 read_timeout: float = 20.0,
+                 total_timeout: float = 30.0,
+                 http2: Optional[bool] = None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.http2 = http2_available() if http2 is None else http2
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool is bound to the worker's running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self._timeout()
+            )
+            logger.info(f"🔌 LLM client pool created (http2={self.http2}, "
+                        f"max_connections={self.limits.max_connections})")
+        return self._client
+
+    def _timeout(self, connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None) -> httpx.Timeout:
+        connect = connect_timeout if connect_timeout is not None else self.connect_timeout
+        read = read_timeout if read_timeout is not None else self.read_timeout
+        return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+    async def chat_completion(self,
+                              url: str,
+                              headers: Dict[str, str],
+                              payload: Dict[str, Any],
+                              connect_timeout: Optional[float] = None,
+                              read_timeout: Optional[float] = None,
+                              total_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST a chat completion and return the decoded JSON body"""
+        client = self._get_client()
+        total = total_timeout if total_timeout is not None else self.total_timeout
+
+        try:
+            response = await asyncio.wait_for(
+                client.post(url, headers=headers, json=payload,
+                            timeout=self._timeout(connect_timeout, read_timeout)),
+                timeout=total
+            )
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(f"Upstream timed out after {total:.1f}s")
+        except httpx.TimeoutException as e:
+            raise UpstreamTimeout(f"Upstream timeout: {e.__class__.__name__}")
+        except httpx.HTTPError as e:
+            raise UpstreamError(f"Upstream connection error: {e}")
+
+        if response.status_code != 200:
+            raise UpstreamError(f"OpenAI API error: {response.status_code} - {response.text}",
+                                status_code=response.status_code)
+
+        return response.json()
+
+    async def stream_chat_completion(self,
+                                     url: str,
+                                     headers: Dict[str, str],
+                                     payload: Dict[str, Any],
+                                     connect_timeout: Optional[float] = None,
+                                     read_timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """POST a chat completion with stream=True and yield content deltas as they arrive
+
+        The caller bounds the total time (e.g. with asyncio.wait_for around the consumer).
+        """
+        client = self._get_client()
+        body = dict(payload, stream=True)
+
+        try:
+            async with client.stream("POST", url, headers=headers, json=body,
+                                     timeout=self._timeout(connect_timeout, read_timeout)) as response:
+                if response.status_code != 200:
+                    error_text = (await response.aread()).decode(errors="replace")
+                    raise UpstreamError(f"OpenAI API error: {response.status_code} - {error_text}",
+                                        status_code=response.status_code)
+
+                # Server-sent events: "data: {...}" lines terminated by "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    choices = event.get('choices') or [{}]
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException as e:
+            raise UpstreamTimeout(f"Upstream timeout: {e.__class__.__name__}")
+        except httpx.HTTPError as e:
+            raise UpstreamError(f"Upstream connection error: {e}")
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
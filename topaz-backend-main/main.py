@@ -8,18 +8,48 @@ from typing import Dict, Optional, Any, Union, List
 
 from datetime import datetime
 
+# Started before the third-party imports so the "imports" phase covers them
+from startup import LazyClient, StartupTimer
+startup_timer = StartupTimer()
+
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic import BaseModel, Field
 # from starlette.middleware.sessions import SessionMiddleware
 # from authlib.integrations.starlette_client import OAuth, OAuthError
-from supabase import create_client, Client
 
-# HTTP requests
-import requests
+# Async upstream LLM client
+from llm_client import LLMClient, UpstreamError
+from providers import ProviderPool, providers_from_env
+from fanout import AdaptiveChunkSizer
+from singleflight import SingleFlight
+from microbatch import MicroBatcher
+from streaming import ChildIdStreamParser, hide_event, ndjson_line
+from payload_format import get_payload_format
+from token_budget import budget_grid_structure
+from keyword_matcher import get_keyword_matcher, matcher_stats
+
+# URL -> prompt routing
+from prompt_router import PromptRouter, extract_search_query
+
+# Per-child hide/keep verdicts
+from cache import LRUCache
+from shared_cache import DEFAULT_SHARED_CACHE_PATH, build_cache
+from rate_limiter import RateLimitResult, build_rate_limiter
+from verdict_cache import VerdictCache, profile_key
+from simhash_index import SimHashIndex
+from verdict_classifier import VerdictClassifier
+from ws_fanout import ConnectionManager, counter_message
+from blocked_counter import DEFAULT_SNAPSHOT_PATH, BlockedCounter
+from write_behind import DEFAULT_SPOOL_DIR, WriteBehindBuffer
+from analytics import DEFAULT_PAGE_SIZE, fetch_analytics, parse_columns, stream_analytics
+from analytics_rollups import RollupStore
+from static_assets import AssetBundle
+from fast_json import FastJSONResponse
+from grid_request import DEFAULT_MAX_BODY_BYTES, GridRequest, RequestDecodeError, decode_grid_request
 
 # Configure logging
 logging.basicConfig(
@@ -28,6 +58,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup_timer.mark("imports")
+
 # Load environment variables
 load_dotenv('.env.local')
 
@@ -47,48 +79,92 @@ except Exception as e:
     logger.error(f"Error loading prompts: {e}")
     prompts_data = {}
 
+# Compile URL patterns once and index them by hostname
+prompt_router = PromptRouter(prompts_data)
+startup_timer.mark("prompts")
+
 # Rate limiting infrastructure
-rate_limit_data = {
-    'ip_counts': {},  # IP -> request count
-    'last_reset': time.time()  # timestamp of last reset
-}
-
-# Global counter for blocked items
-blocked_items_counter = {
-    'count': 0,
-    'last_updated': time.time()
-}
-
-# Simple in-memory cache for API responses
-api_cache = {
-    'responses': {},  # hash -> response
-    'max_size': 100,  # Maximum number of cached responses
-    'max_age': 300    # Cache expires after 5 minutes
-}
-
-def reset_rate_limit_if_needed():
-    """Reset rate limit counters if an hour has passed"""
-    current_time = time.time()
-    if current_time - rate_limit_data['last_reset'] >= 3600:  # 3600 seconds = 1 hour
-        rate_limit_data['ip_counts'].clear()
-        rate_limit_data['last_reset'] = current_time
-        #logger.info("🔄 Rate limit counters reset after 1 hour")
-
-def track_ip_request(ip_address: str):
-    """Track a request from the given IP address"""
-    reset_rate_limit_if_needed()
-
-    ip_counts = rate_limit_data['ip_counts']
-    if ip_address not in ip_counts:
-        ip_counts[ip_address] = 0
-
-    ip_counts[ip_address] += 1
-    request_count = ip_counts[ip_address]
-
-    #logger.info(f"📊 IP {ip_address} has made {request_count} requests this hour")
-    return request_count
-
-app = FastAPI(title="Doom Blocker Backend", version="1.0.0")
+# Cache backend: "sqlite" shares entries across all workers on the host, "memory" is per-process only
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", DEFAULT_SHARED_CACHE_PATH)
+# Seconds a shared-cache lookup or rate-limit check may wait on another worker's write lock before it
+# falls back to this worker's L1 cache or token buckets
+SHARED_CACHE_BUSY_TIMEOUT = float(os.getenv("SHARED_CACHE_BUSY_TIMEOUT", "0.02"))
+
+# LRU cache for API responses (bounded by bytes, not entry count); per-worker L1 in front of the shared tier
+response_cache = build_cache(
+    CACHE_BACKEND,
+    LRUCache(
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        max_age=float(os.getenv("RESPONSE_CACHE_MAX_AGE", "300")),  # Cache expires after 5 minutes
+        name="responses"
+    ),
+    path=SHARED_CACHE_PATH,
+    max_bytes=int(os.getenv("SHARED_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    busy_timeout=SHARED_CACHE_BUSY_TIMEOUT
+)
+
+# Cache keys whose analysis just failed upstream; retries within the TTL degrade to keyword matching
+negative_cache = LRUCache(
+    max_bytes=4 * 1024 * 1024,
+    max_age=float(os.getenv("NEGATIVE_CACHE_TTL", "10")),
+    name="failures"
+)
+
+# Per-child verdict cache so only unseen children go upstream
+verdict_cache = VerdictCache(
+    max_entries=int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "20000")),
+    max_age=float(os.getenv("VERDICT_CACHE_MAX_AGE", "3600")),
+    backend=CACHE_BACKEND,
+    path=SHARED_CACHE_PATH,
+    busy_timeout=SHARED_CACHE_BUSY_TIMEOUT,
+    # Reuse verdicts for near-identical children (same item, different view count or age)
+    near_duplicates=SimHashIndex(
+        max_distance=int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "3")),
+        max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "50000")),
+        max_age=float(os.getenv("VERDICT_CACHE_MAX_AGE", "3600"))
+    ) if os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true" else None
+)
+
+# Per-profile models distilled from LLM verdicts answer the children they are confident about
+CLASSIFIER_ENABLED = os.getenv("VERDICT_CLASSIFIER_ENABLED", "true").lower() == "true"
+CLASSIFIER_TRAIN_INTERVAL = float(os.getenv("VERDICT_CLASSIFIER_TRAIN_INTERVAL", "300"))
+verdict_classifier = VerdictClassifier(
+    threshold=float(os.getenv("VERDICT_CLASSIFIER_THRESHOLD", "0.95")),
+    min_examples=int(os.getenv("VERDICT_CLASSIFIER_MIN_EXAMPLES", "300")),
+    min_precision=float(os.getenv("VERDICT_CLASSIFIER_MIN_PRECISION", "0.97"))
+)
+classifier_task: Optional[asyncio.Task] = None
+
+async def train_verdict_classifier_periodically():
+    """Retrain profiles with new examples off the event loop"""
+    while True:
+        await asyncio.sleep(CLASSIFIER_TRAIN_INTERVAL)
+        try:
+            await asyncio.to_thread(verdict_classifier.train_pending)
+        except Exception as e:
+            logger.error(f"Verdict classifier training failed: {e}")
+
+# Token buckets per client, shared by all workers on the host when CACHE_BACKEND=sqlite
+RATE_LIMIT_KEY = os.getenv("RATE_LIMIT_KEY", "ip").lower()  # "ip" or "visitor"
+rate_limiter = build_rate_limiter(
+    CACHE_BACKEND,
+    limit=int(os.getenv("RATE_LIMIT_REQUESTS", "3000")),
+    window=float(os.getenv("RATE_LIMIT_WINDOW", "3600")),
+    max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")),
+    path=SHARED_CACHE_PATH,
+    busy_timeout=SHARED_CACHE_BUSY_TIMEOUT
+)
+
+def track_request(request: Request, visitor_id: Optional[str] = None) -> RateLimitResult:
+    """Take one token from the caller's bucket (keyed on visitor ID or IP address)"""
+    if RATE_LIMIT_KEY == "visitor" and visitor_id:
+        key = f"visitor:{visitor_id}"
+    else:
+        key = f"ip:{request.client.host if request.client else 'unknown'}"
+    return rate_limiter.hit(key)
+
+app = FastAPI(title="Doom Blocker Backend", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Add startup event for debugging
 @app.on_event("startup")
@@ -96,103 +172,99 @@ async def startup_event():
     logger.info("🚀 Doom Blocker Backend starting up...")
     logger.info(f"📁 Current working directory: {os.getcwd()}")
     logger.info(f"📄 Prompts loaded: {len(prompts_data)} patterns")
-    logger.info(f"🔑 OpenAI configured: {OPENAI_HEADERS is not None}")
-    logger.info(f"🗄️ Supabase configured: {supabase is not None}")
+    logger.info(f"🔑 LLM providers: {', '.join(llm_providers.stats()['order']) or 'none'}")
+    logger.info(f"🗄️ Supabase configured: {supabase.configured} (init: {SUPABASE_INIT})")
+    if CLASSIFIER_ENABLED and verdict_classifier.enabled:
+        global classifier_task
+        classifier_task = asyncio.create_task(train_verdict_classifier_periodically())
+    global counter_task
+    if not blocked_counter.durable:
+        logger.error("❌ Blocked items counter has no durable snapshot (needs Supabase and BLOCKED_COUNTER_TABLE): "
+                     f"the total only survives in {blocked_counter.snapshot_path or 'memory'} and resets on redeploy")
+    await blocked_counter.restore()
+    counter_task = asyncio.create_task(blocked_counter.run(manager.publish_counter))
+    if supabase.configured:
+        global writer_task
+        writer_task = asyncio.create_task(supabase_writer.run())
+    if ANALYTICS_ROLLUPS_ENABLED:
+        global rollup_task
+        rollup_task = asyncio.create_task(analytics_rollups.run())
+    if supabase.configured and (SUPABASE_INIT == "background" or supabase.failures):
+        # Runs once the worker is serving and keeps retrying a failed build in the background;
+        # requests arriving first build the client themselves (in their worker threads)
+        global warmup_task
+        warmup_task = asyncio.create_task(warm_up_supabase())
+    startup_timer.mark("server startup")
+    logger.info(f"⏱️ Startup phases: {startup_timer.report()}")
     logger.info("✅ Startup complete!")
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket client connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket client disconnected. Total connections: {len(self.active_connections)}")
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+async def warm_up_supabase():
+    if await supabase.warm(SUPABASE_WARMUP_DELAY):
+        startup_timer.record("supabase (background)", supabase.init_seconds)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if classifier_task is not None:
+        classifier_task.cancel()
+    if counter_task is not None:
+        counter_task.cancel()
+    await blocked_counter.close()
+    if writer_task is not None:
+        writer_task.cancel()
+        await supabase_writer.close()
+        logger.info("💾 Supabase write buffer flushed")
+    if rollup_task is not None:
+        rollup_task.cancel()
+        await analytics_rollups.flush_async()
+    manager.close()
+    await llm_client.aclose()
+    logger.info("👋 LLM client pool closed")
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {e}")
-
-    async def broadcast_counter_update(self, count: int):
-        """Broadcast counter update to all connected WebSocket clients"""
-        message = json.dumps({
-            "type": "counter_update",
-            "count": count,
-            "timestamp": time.time()
-        })
-        await self.broadcast(message)
-        logger.info(f"Broadcasted counter update: {count}")
-
-manager = ConnectionManager()
+# WebSocket connection manager
+# Per-connection send queues; counter updates are coalesced into one broadcast per tick
+manager = ConnectionManager(
+    max_queue=int(os.getenv("WS_SEND_QUEUE_SIZE", "32")),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "5")),
+    counter_tick=float(os.getenv("COUNTER_BROADCAST_INTERVAL", "0.25"))
+)
 
 def increment_blocked_counter(items_blocked: int):
     """Increment the global blocked items counter and broadcast update"""
-    blocked_items_counter['count'] += items_blocked
-    blocked_items_counter['last_updated'] = time.time()
-    
-    # Schedule broadcast if there are active connections
-    if manager.active_connections:
-        asyncio.create_task(manager.broadcast_counter_update(blocked_items_counter['count']))
-    
-    logger.info(f"Blocked items counter updated: {blocked_items_counter['count']} (+{items_blocked})")
+    # Batched: reaches the shared counter, and every worker's clients, on the next flush
+    blocked_counter.add(items_blocked)
 
-def get_cache_key(grid_structure, url, whitelist, blacklist):
-    """Generate a cache key for the request"""
+    logger.info(f"Blocked items counter updated: {blocked_counter.count} (+{items_blocked})")
+
+def get_cache_key(cleaned_grid, profile, keyword_hidden=()):
+    """Generate a cache key from the child IDs and text actually sent to the model"""
     import hashlib
-    # Create a hash of the request parameters
+    # Create a hash of the filtering profile and every (id, text) pair
     key_data = {
-        'url': url,
-        'whitelist': sorted(whitelist) if whitelist else [],
-        'blacklist': sorted(blacklist) if blacklist else [],
-        'grid_ids': [grid.get('id') for grid in grid_structure.get('grids', [])],
-        'total_children': sum(grid.get('totalChildren', 0) for grid in grid_structure.get('grids', []))
+        'profile': profile,
+        'children': [
+            [child.get('id'), child.get('text', '')]
+            for grid in cleaned_grid.get('grids', [])
+            for child in grid.get('children', [])
+        ]
     }
-    key_string = json.dumps(key_data, sort_keys=True)
+    if keyword_hidden:
+        # Children decided locally never reach the model but are part of the result
+        key_data['keyword_hidden'] = list(keyword_hidden)
+    key_string = json.dumps(key_data, sort_keys=True, separators=(',', ':'))
     return hashlib.md5(key_string.encode()).hexdigest()
 
 def get_cached_response(cache_key):
     """Get cached response if available and not expired"""
-    current_time = time.time()
-    
-    if cache_key in api_cache['responses']:
-        cached_data = api_cache['responses'][cache_key]
-        if current_time - cached_data['timestamp'] < api_cache['max_age']:
-            logger.info(f"🎯 Cache hit for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            # Remove expired cache entry
-            del api_cache['responses'][cache_key]
-    
-    return None
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"🎯 Cache hit for key: {cache_key[:8]}...")
+    return cached
 
 def cache_response(cache_key, response):
     """Cache the response"""
-    current_time = time.time()
-    
-    # Clean up old cache entries if we're at max size
-    if len(api_cache['responses']) >= api_cache['max_size']:
-        # Remove oldest entries
-        oldest_keys = sorted(api_cache['responses'].keys(), 
-                           key=lambda k: api_cache['responses'][k]['timestamp'])[:10]
-        for key in oldest_keys:
-            del api_cache['responses'][key]
-    
-    api_cache['responses'][cache_key] = {
-        'response': response,
-        'timestamp': current_time
-    }
+    response_cache.set(cache_key, response)
     logger.info(f"💾 Cached response for key: {cache_key[:8]}...")
 
 # Add session middleware
@@ -209,6 +281,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Deferred-Children", "X-RateLimit-Limit", "X-RateLimit-Remaining",
+                    "X-RateLimit-Reset", "Retry-After"],
 )
 
 # AUTH0_CLIENT_ID = os.getenv("AUTH0_CLIENT_ID")
@@ -220,17 +294,64 @@ app.add_middleware(
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 
+# "background" builds the Supabase client (and imports supabase-py) after the worker starts serving,
+# "lazy" on the first request that needs it, "eager" while importing main as before
+SUPABASE_INIT = os.getenv("SUPABASE_INIT", "background").lower()
+SUPABASE_WARMUP_DELAY = float(os.getenv("SUPABASE_WARMUP_DELAY", "1"))
+# Seconds before retrying a failed client build (doubles on each failure, up to 10 minutes); Supabase
+# endpoints answer as if it were not configured meanwhile
+SUPABASE_RETRY_INTERVAL = float(os.getenv("SUPABASE_RETRY_INTERVAL", "30"))
+
+def create_supabase_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
 # Initialize Supabase client only if credentials are provided and valid
 if SUPABASE_URL and SUPABASE_KEY and not SUPABASE_URL.startswith("https://dummy"):
-    try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("Supabase client initialized successfully")
-    except Exception as e:
-        logger.warning(f"Failed to initialize Supabase client: {e}")
-        supabase = None
+    supabase = LazyClient("Supabase", create_supabase_client, retry_interval=SUPABASE_RETRY_INTERVAL)
+    if SUPABASE_INIT == "eager":
+        try:
+            supabase.get()
+        except Exception:
+            pass  # Logged by LazyClient; retried in the background after startup
 else:
     logger.warning("Supabase disabled (dummy/missing credentials)")
-    supabase = None
+    supabase = LazyClient("Supabase", None)
+warmup_task: Optional[asyncio.Task] = None
+
+# Global counter for blocked items, shared by all workers on the host and snapshotted for restarts
+# (the Supabase table is the only snapshot that survives a deploy; set BLOCKED_COUNTER_TABLE= to opt out)
+blocked_counter = BlockedCounter(
+    backend=CACHE_BACKEND,
+    path=SHARED_CACHE_PATH,
+    flush_interval=float(os.getenv("BLOCKED_COUNTER_FLUSH_INTERVAL", "1")),
+    snapshot_path=os.getenv("BLOCKED_COUNTER_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH) or None,
+    snapshot_interval=float(os.getenv("BLOCKED_COUNTER_SNAPSHOT_INTERVAL", "60")),
+    supabase=supabase,
+    supabase_table=os.getenv("BLOCKED_COUNTER_TABLE", "global_counters") or None
+)
+counter_task: Optional[asyncio.Task] = None
+
+# Session, metrics and blocked-item rows are batched to Supabase off the request path
+supabase_writer = WriteBehindBuffer(
+    supabase,
+    batch_size=int(os.getenv("SUPABASE_WRITE_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("SUPABASE_WRITE_FLUSH_INTERVAL", "2")),
+    spool_dir=os.getenv("SUPABASE_SPOOL_DIR", DEFAULT_SPOOL_DIR) or None,
+    max_spool_bytes=int(os.getenv("SUPABASE_SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+writer_task: Optional[asyncio.Task] = None
+
+# Per-session analytics rollups, updated as blocked items arrive. Only sessions created after the rollup
+# tables (or backfilled) are served from them; keep ANALYTICS_ROLLUP_PATH on a disk that survives deploys,
+# or run `python analytics_rollups.py backfill` after each one
+ANALYTICS_ROLLUPS_ENABLED = os.getenv("ANALYTICS_ROLLUPS_ENABLED", "true").lower() == "true"
+analytics_rollups = RollupStore(
+    path=os.getenv("ANALYTICS_ROLLUP_PATH", SHARED_CACHE_PATH),
+    flush_interval=float(os.getenv("ANALYTICS_ROLLUP_FLUSH_INTERVAL", "5"))
+)
+rollup_task: Optional[asyncio.Task] = None
+startup_timer.mark("caches and stores")
 
 async def update_visitor_telemetry(visitor_id: str):
     """Update visitor telemetry in Supabase asynchronously - DISABLED for performance"""
@@ -248,25 +369,88 @@ async def update_visitor_telemetry(visitor_id: str):
 #     server_metadata_url=f"https://{AUTH0_DOMAIN}/.well-known/openid-configuration",
 # )
 
-logger.info("Initializing OpenAI API configuration...")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.warning("OPENAI_API_KEY not found - AI analysis will be disabled")
-    OPENAI_HEADERS = None
+logger.info("Initializing LLM provider configuration...")
+# Comma-separated, in priority order; each needs <NAME>_API_KEY (and <NAME>_BASE_URL/<NAME>_MODEL if not built in)
+LLM_PROVIDERS = providers_from_env(os.getenv("LLM_PROVIDERS", "openai,groq"))
+if not LLM_PROVIDERS:
+    logger.warning("No LLM provider API key found - AI analysis will be disabled")
 else:
-    OPENAI_URL = "https://api.openai.com/v1/chat/completions"
-    OPENAI_HEADERS = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    logger.info("OpenAI client initialized successfully")
+    logger.info(f"LLM providers initialized successfully: {', '.join(p.name for p in LLM_PROVIDERS)}")
+
+# Coalesces concurrent requests with the same cache key into one analysis
+single_flight = SingleFlight()
+
+# Fan-out mode: large grids are split into chunks analyzed concurrently, so they get a bigger token budget
+FANOUT_ENABLED = os.getenv("LLM_FANOUT_ENABLED", "true").lower() == "true"
+FANOUT_TOKEN_BUDGET = int(os.getenv("LLM_FANOUT_TOKEN_BUDGET", "6000"))
+
+# Token budget for the children sent to the LLM per request (serial mode) and per child text
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "1200"))
+LLM_MAX_CHILD_TOKENS = int(os.getenv("LLM_MAX_CHILD_TOKENS", "48"))
+DEFERRED_CHILDREN_HEADER = "X-Deferred-Children"
+
+# Children whose full text hits a blacklist keyword (and no whitelist keyword) are hidden without the LLM
+KEYWORD_PREFILTER_ENABLED = os.getenv("KEYWORD_PREFILTER_ENABLED", "true").lower() == "true"
+llm_semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
+chunk_sizer = AdaptiveChunkSizer(
+    initial=int(os.getenv("LLM_CHUNK_SIZE", "15")),
+    minimum=int(os.getenv("LLM_CHUNK_SIZE_MIN", "5")),
+    maximum=int(os.getenv("LLM_CHUNK_SIZE_MAX", "40")),
+    target_latency=float(os.getenv("LLM_CHUNK_TARGET_LATENCY", "1.5"))
+)
+
+# Wire format for the grid sent to the LLM ("compact" id<TAB>text lines, or the original "json")
+llm_payload_format = get_payload_format(os.getenv("LLM_PAYLOAD_FORMAT", "compact"))
+
+# Shared upstream connection pool (limits and timeouts are configurable per deployment)
+llm_client = LLMClient(
+    max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "200")),
+    max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "50")),
+    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "20")),
+    total_timeout=float(os.getenv("LLM_TOTAL_TIMEOUT", "30"))
+)
+
+# Primary provider first; a second one is raced in when the primary is slower than its p90
+llm_providers = ProviderPool(
+    LLM_PROVIDERS,
+    llm_client,
+    hedge=os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true",
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9")),
+    hedge_default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0")),
+    # Per-call timeout follows each provider's p99 (capped by LLM_TOTAL_TIMEOUT)
+    timeout_multiplier=float(os.getenv("LLM_TIMEOUT_MULTIPLIER", "3.0")),
+    timeout_min=float(os.getenv("LLM_TIMEOUT_MIN", "2.0")),
+    breaker_window=float(os.getenv("LLM_BREAKER_WINDOW", "30")),
+    breaker_min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+    breaker_error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+    breaker_open_for=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+)
 
-class GridAnalysisRequest(BaseModel):
-    gridStructure: dict
-    currentUrl: str
-    whitelist: list[str] = []
-    blacklist: list[str] = []
-    visitorId: str
+# Optional: merge concurrent grids that share a rendered prompt into one completion. With fan-out on, a
+# batch holds at most one chunk per request, so requests share calls without undoing each other's split;
+# streamed analyses always go upstream on their own.
+micro_batcher = MicroBatcher(
+    lambda prompt, grid: request_llm_verdicts(prompt, grid),
+    max_wait=float(os.getenv("LLM_MICROBATCH_WAIT_MS", "10")) / 1000,
+    max_children=int(os.getenv("LLM_MICROBATCH_MAX_CHILDREN", "40"))
+) if os.getenv("LLM_MICROBATCH_ENABLED", "false").lower() == "true" else None
+
+def upstream_degraded(cache_key: str) -> bool:
+    """Skip the LLM when every provider's circuit is open or this exact request just failed"""
+    return not llm_providers.accepting() or negative_cache.get(cache_key) is not None
+
+# Grid analysis bodies are decoded by grid_request (optionally gzip/zstd encoded) instead of pydantic
+GRID_REQUEST_MAX_BYTES = int(os.getenv("GRID_REQUEST_MAX_BYTES", str(DEFAULT_MAX_BODY_BYTES)))
+
+async def read_grid_request(request: Request) -> GridRequest:
+    """Decode, validate and index the grid analysis body in one pass"""
+    try:
+        return decode_grid_request(await request.body(), request.headers.get("content-encoding"),
+                                   GRID_REQUEST_MAX_BYTES)
+    except RequestDecodeError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 class AnalysisResult(BaseModel):
     """
@@ -324,66 +508,17 @@ class UserMetricsRequest(BaseModel):
 #         raise HTTPException(status_code=401, detail="Not authenticated")
 #     return user
 
-def get_prompt_for_url(url: str, whitelist: list[str] = None, blacklist: list[str] = None) -> str:
-    """Get the appropriate prompt based on URL regex matching"""
-    # Detect YouTube search URL and extract search query
-    youtube_search_match = re.match(r"https?://(www\.)?youtube\.com/results\?(.+)", url)
-    search_query = None
-    if youtube_search_match:
-        # Extract the search_query parameter from the URL
-        from urllib.parse import parse_qs, urlparse
-        qs = parse_qs(urlparse(url).query)
-        search_query = qs.get("search_query", [None])[0]
-
-    for pattern, config in prompts_data.items():
-        if re.match(pattern, url):
-            prompt = config["prompt"]
-
-            # Replace blacklist and whitelist tags
-            if blacklist and len(blacklist) > 0:
-                blacklist_items = "\n".join(["- %s" % item for item in blacklist])
-                prompt = prompt.replace("<BLACKLIST>", "<BLACKLIST>\n%s" % blacklist_items)
-            else:
-                prompt = prompt.replace("<BLACKLIST>", "")
-
-            if whitelist and len(whitelist) > 0:
-                whitelist_items = "\n".join(["- %s" % item for item in whitelist])
-                prompt = prompt.replace("<WHITELIST>", "<WHITELIST>\n%s" % whitelist_items)
-            else:
-                prompt = prompt.replace("<WHITELIST>", "")
-
-            # If YouTube search, add the search query to the prompt
-            if search_query:
-                prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
-
-
+def get_prompt_pattern_for_url(url: str) -> Optional[str]:
+    """Return the prompts_data pattern that get_prompt_for_url would use for this URL"""
+    return prompt_router.resolve(url)
 
-            return prompt
+def get_verdict_profile(url: str, whitelist: list[str] = None, blacklist: list[str] = None) -> str:
+    """Profile key for the per-child verdict cache"""
+    return profile_key(get_prompt_pattern_for_url(url), whitelist, blacklist, extract_search_query(url))
 
-    # Default fallback (shouldn't happen with proper config)
-    logger.warning("No matching pattern found for URL: %s" % url)
-    base_prompt = list(prompts_data.values())[0]["prompt"]
-
-    # Apply same replacement logic for fallback
-    if blacklist and len(blacklist) > 0:
-        blacklist_items = "\n".join(["- %s" % item for item in blacklist])
-        base_prompt = base_prompt.replace("<BLACKLIST>", "<BLACKLIST>\n%s" % blacklist_items)
-    else:
-        base_prompt = base_prompt.replace("<BLACKLIST>", "")
-
-    if whitelist and len(whitelist) > 0:
-        whitelist_items = "\n".join(["- %s" % item for item in whitelist])
-        base_prompt = base_prompt.replace("<WHITELIST>", "<WHITELIST>\n%s" % whitelist_items)
-    else:
-        base_prompt = base_prompt.replace("<WHITELIST>", "")
-
-    # If YouTube search, add the search query to the fallback prompt
-    if search_query:
-        base_prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
-
-
-
-    return base_prompt
+def get_prompt_for_url(url: str, whitelist: list[str] = None, blacklist: list[str] = None) -> str:
+    """Get the appropriate prompt based on URL regex matching (compiled, host-indexed, memoized)"""
+    return prompt_router.render(url, whitelist, blacklist)
 
 # WebSocket endpoint
 @app.websocket("/ws")
@@ -392,12 +527,7 @@ async def websocket_endpoint(websocket: WebSocket):
     
     # Send current counter value to newly connected client
     try:
-        initial_message = json.dumps({
-            "type": "counter_update",
-            "count": blocked_items_counter['count'],
-            "timestamp": time.time()
-        })
-        await manager.send_personal_message(initial_message, websocket)
+        await manager.send_personal_message(counter_message(blocked_counter.count), websocket)
     except Exception as e:
         logger.error(f"Error sending initial counter: {e}")
     
@@ -410,12 +540,7 @@ async def websocket_endpoint(websocket: WebSocket):
             try:
                 message = json.loads(data)
                 if message.get("type") == "get_counter":
-                    counter_message = json.dumps({
-                        "type": "counter_update",
-                        "count": blocked_items_counter['count'],
-                        "timestamp": time.time()
-                    })
-                    await manager.send_personal_message(counter_message, websocket)
+                    await manager.send_personal_message(counter_message(blocked_counter.count), websocket)
             except json.JSONDecodeError:
                 # Handle plain text messages
                 await manager.send_personal_message(f"Echo: {data}", websocket)
@@ -438,7 +563,8 @@ async def root():
             "health": "/health",
             "docs": "/docs",
             "blocked_count": "/api/blocked-count",
-            "ai_analysis": "/fetch_distracting_chunks"
+            "ai_analysis": "/fetch_distracting_chunks",
+            "ai_analysis_stream": "/fetch_distracting_chunks/stream"
         }
     }
 
@@ -449,7 +575,26 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "openai_configured": OPENAI_HEADERS is not None
+        "openai_configured": any(p.name == "openai" for p in llm_providers.providers),
+        "llm_providers": llm_providers.stats(),
+        "cache": {
+            "responses": response_cache.stats(),
+            "failures": negative_cache.stats(),
+            "verdicts": verdict_cache.stats()
+        },
+        "fanout": chunk_sizer.stats(),
+        "singleflight": single_flight.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "websockets": manager.stats(),
+        "blocked_counter": blocked_counter.stats(),
+        "supabase_writes": supabase_writer.stats(),
+        "analytics_rollups": analytics_rollups.stats(),
+        "microbatch": micro_batcher.stats() if micro_batcher is not None else None,
+        "prompts": prompt_router.stats(),
+        "keyword_matchers": matcher_stats(),
+        "classifier": verdict_classifier.stats(),
+        "supabase": supabase.stats(),
+        "startup": startup_timer.stats()
     }
 
 # REST endpoint to get current counter (optional)
@@ -457,8 +602,8 @@ async def health_check():
 async def get_blocked_count():
     """Get the current count of blocked items"""
     return {
-        "count": blocked_items_counter['count'],
-        "last_updated": blocked_items_counter['last_updated']
+        "count": blocked_counter.count,
+        "last_updated": blocked_counter.last_updated
     }
 
 @app.post("/api/report-blocked-items")
@@ -522,7 +667,9 @@ async def report_blocked_items(request: Request):
 async def create_user_session(session_request: UserSessionRequest, request: Request):
     """Create or update user session in Supabase"""
     try:
-        if not supabase:
+        # Only an unconfigured Supabase disables tracking: while the client is backing off after a
+        # failed build, the write-behind buffer spools the rows and replays them once it is back
+        if not supabase.configured:
             logger.warning("Supabase not configured, session not saved")
             return {"success": True, "message": "Session tracking disabled"}
 
@@ -537,13 +684,13 @@ async def create_user_session(session_request: UserSessionRequest, request: Requ
             "last_active": datetime.now().isoformat()
         }
 
-        # Upsert session data
-        result = supabase.table("user_sessions").upsert(
-            session_data,
-            on_conflict="session_id"
-        ).execute()
+        # Upsert session data (written behind; later updates to the same session replace this one)
+        supabase_writer.upsert("user_sessions", session_data, on_conflict="session_id")
+        if ANALYTICS_ROLLUPS_ENABLED:
+            await asyncio.to_thread(analytics_rollups.start_session, session_request.session_id,
+                                    session_request.created_at)
 
-        logger.info(f"✅ User session saved: {session_request.session_id}")
+        logger.info(f"✅ User session queued: {session_request.session_id}")
 
         return {
             "success": True,
@@ -562,7 +709,7 @@ async def create_user_session(session_request: UserSessionRequest, request: Requ
 async def save_blocked_items(blocked_request: BlockedItemsRequest, request: Request):
     """Save blocked items data to Supabase"""
     try:
-        if not supabase:
+        if not supabase.configured:
             logger.warning("Supabase not configured, blocked items not saved")
             return {"success": True, "message": "Blocked items tracking disabled"}
 
@@ -580,10 +727,12 @@ async def save_blocked_items(blocked_request: BlockedItemsRequest, request: Requ
             }
             blocked_records.append(record)
 
-        # Insert blocked items data
+        # Insert blocked items data (written behind in batches)
         if blocked_records:
-            result = supabase.table("blocked_items").insert(blocked_records).execute()
-            logger.info(f"✅ Saved {len(blocked_records)} blocked items for session {blocked_request.session_id}")
+            supabase_writer.insert("blocked_items", blocked_records)
+            if ANALYTICS_ROLLUPS_ENABLED:
+                analytics_rollups.add(blocked_request.session_id, blocked_records)
+            logger.info(f"✅ Queued {len(blocked_records)} blocked items for session {blocked_request.session_id}")
 
         return {
             "success": True,
@@ -602,7 +751,7 @@ async def save_blocked_items(blocked_request: BlockedItemsRequest, request: Requ
 async def save_user_metrics(metrics_request: UserMetricsRequest, request: Request):
     """Save user metrics to Supabase"""
     try:
-        if not supabase:
+        if not supabase.configured:
             logger.warning("Supabase not configured, metrics not saved")
             return {"success": True, "message": "Metrics tracking disabled"}
 
@@ -617,13 +766,10 @@ async def save_user_metrics(metrics_request: UserMetricsRequest, request: Reques
             "updated_at": datetime.now().isoformat()
         }
 
-        # Upsert metrics data
-        result = supabase.table("user_metrics").upsert(
-            metrics_data,
-            on_conflict="session_id"
-        ).execute()
+        # Upsert metrics data (written behind; later updates to the same session replace this one)
+        supabase_writer.upsert("user_metrics", metrics_data, on_conflict="session_id")
 
-        logger.info(f"✅ User metrics saved for session {metrics_request.session_id}")
+        logger.info(f"✅ User metrics queued for session {metrics_request.session_id}")
 
         return {
             "success": True,
@@ -639,8 +785,12 @@ async def save_user_metrics(metrics_request: UserMetricsRequest, request: Reques
         )
 
 @app.get("/api/analytics/{session_id}")
-async def get_user_analytics(session_id: str):
-    """Get analytics data for a specific user session"""
+async def get_user_analytics(session_id: str, request: Request):
+    """Get analytics data for a specific user session
+
+    Query parameters: limit and cursor page through blocked_items (newest first, follow next_cursor),
+    fields picks its columns, and stream=1 returns the whole history as one streamed JSON document.
+    """
     try:
         if not supabase:
             return JSONResponse(
@@ -648,26 +798,23 @@ async def get_user_analytics(session_id: str):
                 content={"success": False, "error": "Analytics service unavailable"}
             )
 
-        # Get user metrics
-        metrics_result = supabase.table("user_metrics").select("*").eq("session_id", session_id).execute()
+        params = request.query_params
+        try:
+            columns = parse_columns(params.get("fields"))
+            limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+            cursor = int(params["cursor"]) if params.get("cursor") else None
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
 
-        # Get blocked items data
-        blocked_result = supabase.table("blocked_items").select("*").eq("session_id", session_id).execute()
+        # Rollups answer the summary without touching blocked_items; None means fall back to Supabase
+        summary = analytics_rollups.get(session_id) if ANALYTICS_ROLLUPS_ENABLED else None
 
-        # Get session info
-        session_result = supabase.table("user_sessions").select("*").eq("session_id", session_id).execute()
+        if params.get("stream", "").lower() in ("1", "true"):
+            return StreamingResponse(stream_analytics(supabase, session_id, columns, summary),
+                                     media_type="application/json")
 
-        analytics_data = {
-            "session_id": session_id,
-            "metrics": metrics_result.data[0] if metrics_result.data else None,
-            "blocked_items": blocked_result.data,
-            "session_info": session_result.data[0] if session_result.data else None,
-            "summary": {
-                "total_records": len(blocked_result.data),
-                "total_blocked": sum(item.get("count", 0) for item in blocked_result.data),
-                "unique_sites": len(set(item.get("hostname", "") for item in blocked_result.data if item.get("hostname")))
-            }
-        }
+        # Metrics, session info, summary and the page of blocked items are queried concurrently
+        analytics_data = await fetch_analytics(supabase, session_id, columns, limit, cursor, summary=summary)
 
         return {
             "success": True,
@@ -681,508 +828,448 @@ async def get_user_analytics(session_id: str):
             content={"success": False, "error": str(e)}
         )
 
+# The analytics page and its CSS/JS are read, hashed and compressed once at startup
+analytics_bundle = AssetBundle(
+    os.path.join(os.path.dirname(__file__), "static", "analytics"),
+    page="index.html",
+    prefix="/analytics/assets"
+)
+startup_timer.mark("static assets")
+
 @app.get("/analytics")
 async def analytics_frontend(request: Request):
-    """Serve the analytics frontend page"""
-    from fastapi.responses import HTMLResponse
-
-    # Get session ID from query parameter
-    session_id = request.query_params.get("session")
-
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Doom Blocker Analytics</title>
-        <style>
-            * {{
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }}
-
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                background: #1a1a1a;
-                color: #fff;
-                line-height: 1.6;
-            }}
-
-            .container {{
-                max-width: 1200px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-
-            .header {{
-                text-align: center;
-                margin-bottom: 40px;
-                padding: 20px 0;
-                border-bottom: 1px solid #333;
-            }}
-
-            .header h1 {{
-                color: #ff9823;
-                font-size: 2.5rem;
-                margin-bottom: 10px;
-            }}
-
-            .header p {{
-                color: #ccc;
-                font-size: 1.1rem;
-            }}
-
-            .stats-grid {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                gap: 20px;
-                margin-bottom: 40px;
-            }}
-
-            .stat-card {{
-                background: #252525;
-                border-radius: 12px;
-                padding: 24px;
-                border: 1px solid #333;
-                transition: transform 0.2s ease;
-            }}
-
-            .stat-card:hover {{
-                transform: translateY(-2px);
-                border-color: #ff9823;
-            }}
-
-            .stat-number {{
-                font-size: 2.5rem;
-                font-weight: bold;
-                color: #ff9823;
-                margin-bottom: 8px;
-            }}
-
-            .stat-label {{
-                color: #ccc;
-                font-size: 1rem;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-            }}
-
-            .loading {{
-                text-align: center;
-                padding: 60px 20px;
-                color: #ccc;
-                font-size: 1.2rem;
-            }}
-
-            .error {{
-                text-align: center;
-                padding: 60px 20px;
-                color: #ff6b6b;
-                font-size: 1.2rem;
-            }}
-
-            .activity-section {{
-                background: #252525;
-                border-radius: 12px;
-                padding: 24px;
-                border: 1px solid #333;
-                margin-bottom: 20px;
-            }}
-
-            .section-title {{
-                color: #ff9823;
-                font-size: 1.5rem;
-                margin-bottom: 20px;
-                padding-bottom: 10px;
-                border-bottom: 1px solid #333;
-            }}
-
-            .activity-item {{
-                padding: 12px 0;
-                border-bottom: 1px solid #333;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-            }}
-
-            .activity-item:last-child {{
-                border-bottom: none;
-            }}
-
-            .activity-text {{
-                color: #ccc;
-                flex: 1;
-            }}
-
-            .activity-count {{
-                color: #ff9823;
-                font-weight: bold;
-                margin-left: 10px;
-            }}
-
-            .session-info {{
-                background: #252525;
-                border-radius: 12px;
-                padding: 24px;
-                border: 1px solid #333;
-                margin-bottom: 20px;
-            }}
-
-            .info-row {{
-                display: flex;
-                justify-content: space-between;
-                padding: 8px 0;
-                border-bottom: 1px solid #333;
-            }}
-
-            .info-row:last-child {{
-                border-bottom: none;
-            }}
-
-            .info-label {{
-                color: #999;
-            }}
-
-            .info-value {{
-                color: #fff;
-                font-weight: 500;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>📊 Doom Blocker Analytics</h1>
-                <p>Your content filtering insights and statistics</p>
-            </div>
-
-            <div id="content">
-                <div class="loading">
-                    Loading your analytics data...
-                </div>
-            </div>
-        </div>
-
-        <script>
-            const sessionId = "{session_id or ''}";
-
-            async function loadAnalytics() {{
-                try {{
-                    if (!sessionId) {{
-                        document.getElementById('content').innerHTML = `
-                            <div class="error">
-                                No session ID provided. Please access analytics through the extension.
-                            </div>
-                        `;
-                        return;
-                    }}
-
-                    const response = await fetch(`/api/analytics/${{sessionId}}`);
-                    const result = await response.json();
-
-                    if (!result.success) {{
-                        throw new Error(result.error || 'Failed to load analytics');
-                    }}
-
-                    const data = result.data;
-                    renderAnalytics(data);
-
-                }} catch (error) {{
-                    console.error('Error loading analytics:', error);
-                    document.getElementById('content').innerHTML = `
-                        <div class="error">
-                            Failed to load analytics: ${{error.message}}
-                        </div>
-                    `;
-                }}
-            }}
-
-            function renderAnalytics(data) {{
-                const metrics = data.metrics || {{}};
-                const summary = data.summary || {{}};
-                const sessionInfo = data.session_info || {{}};
-                const blockedItems = data.blocked_items || [];
-
-                // Group blocked items by hostname
-                const siteStats = {{}};
-                blockedItems.forEach(item => {{
-                    const hostname = item.hostname || 'Unknown';
-                    if (!siteStats[hostname]) {{
-                        siteStats[hostname] = 0;
-                    }}
-                    siteStats[hostname] += item.count || 0;
-                }});
-
-                const sortedSites = Object.entries(siteStats)
-                    .sort(([,a], [,b]) => b - a)
-                    .slice(0, 10);
-
-                document.getElementById('content').innerHTML = `
-                    <div class="stats-grid">
-                        <div class="stat-card">
-                            <div class="stat-number">${{metrics.total_blocked || 0}}</div>
-                            <div class="stat-label">Total Blocked</div>
-                        </div>
-                        <div class="stat-card">
-                            <div class="stat-number">${{metrics.blocked_today || 0}}</div>
-                            <div class="stat-label">Blocked Today</div>
-                        </div>
-                        <div class="stat-card">
-                            <div class="stat-number">${{summary.unique_sites || 0}}</div>
-                            <div class="stat-label">Sites Protected</div>
-                        </div>
-                        <div class="stat-card">
-                            <div class="stat-number">${{blockedItems.length}}</div>
-                            <div class="stat-label">Filter Events</div>
-                        </div>
-                    </div>
-
-                    <div class="session-info">
-                        <h2 class="section-title">Session Information</h2>
-                        <div class="info-row">
-                            <span class="info-label">Session ID:</span>
-                            <span class="info-value">${{data.session_id.substring(0, 8)}}...</span>
-                        </div>
-                        <div class="info-row">
-                            <span class="info-label">Extension Version:</span>
-                            <span class="info-value">${{sessionInfo.extension_version || 'Unknown'}}</span>
-                        </div>
-                        <div class="info-row">
-                            <span class="info-label">Created:</span>
-                            <span class="info-value">${{new Date(sessionInfo.created_at || Date.now()).toLocaleDateString()}}</span>
-                        </div>
-                        <div class="info-row">
-                            <span class="info-label">First Install:</span>
-                            <span class="info-value">${{sessionInfo.first_install ? 'Yes' : 'No'}}</span>
-                        </div>
-                    </div>
-
-                    <div class="activity-section">
-                        <h2 class="section-title">Top Sites by Blocked Content</h2>
-                        ${{sortedSites.length > 0 ? sortedSites.map(([site, count]) => `
-                            <div class="activity-item">
-                                <span class="activity-text">${{site}}</span>
-                                <span class="activity-count">${{count}} items</span>
-                            </div>
-                        `).join('') : '<div class="activity-text">No data available</div>'}}
-                    </div>
-
-                    <div class="activity-section">
-                        <h2 class="section-title">All Blocked Items (${{blockedItems.length}} total)</h2>
-                        <div style="max-height: 400px; overflow-y: auto; border: 1px solid #333; border-radius: 8px; padding: 10px;">
-                        ${{blockedItems.map(item => `
-                            <div class="activity-item">
-                                <div class="activity-text">
-                                    <div style="font-weight: 500; margin-bottom: 4px;">
-                                        ${{new Date(item.timestamp).toLocaleString()}} - ${{item.hostname || 'Unknown'}}
-                                    </div>
-                                    ${{item.blocked_items && item.blocked_items.length > 0 ? `
-                                        <div style="font-size: 0.9em; color: #999; margin-left: 20px;">
-                                            ${{'• ' + item.blocked_items.slice(0, 3).map(blockedItem =>
-                                                typeof blockedItem === 'string' ? blockedItem :
-                                                (blockedItem.text || blockedItem.title || 'Blocked content')
-                                            ).join('<br>• ')}}
-                                            ${{item.blocked_items.length > 3 ? `<br>• ...and ${{item.blocked_items.length - 3}} more` : ''}}
-                                        </div>
-                                    ` : ''}}
-                                </div>
-                                <span class="activity-count">${{item.count}} blocked</span>
-                            </div>
-                        `).join('')}}
-                        </div>
-                    </div>
-                `;
-            }}
-
-            // Load analytics on page load
-            loadAnalytics();
-        </script>
-    </body>
-    </html>
+    """Serve the analytics frontend page (the session ID stays in the query string for the page's JS)"""
+    return analytics_bundle.page.response(request)
+
+@app.get("/analytics/assets/{name}")
+async def analytics_asset(name: str, request: Request):
+    """Content-hashed CSS/JS for the analytics page"""
+    asset = analytics_bundle.asset(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(request)
+
+def get_valid_child_ids(cleaned):
+    ids = []
+    for grid in cleaned.get('grids', []):
+        for child in grid.get('children', []):
+            cid = child.get('id')
+            if cid:
+                ids.append(cid)
+    return ids
+
+def build_system_prompt(base_prompt: str, cleaned: dict) -> str:
+    """Build strong system prompt with explicit output rules for the active payload format"""
+    return f"{base_prompt}{llm_payload_format.rules(cleaned)}"
+
+def sanitize_llm_response(text: str, cleaned: dict) -> str:
+    """Extract only valid child IDs present in the cleaned grid from arbitrary model text."""
+    try:
+        # Collect valid IDs set
+        valid = set(get_valid_child_ids(cleaned))
+        # Regex to find tokens like g12c3 etc.
+        ids = re.findall(r"g\d+c\d+", text or "")
+        # Filter to only valid ids and deduplicate preserving order
+        seen = set()
+        filtered = []
+        for cid in ids:
+            if cid in valid and cid not in seen:
+                filtered.append(cid)
+                seen.add(cid)
+        return "\n".join(filtered)
+    except Exception:
+        return ""
+
+def build_llm_payload(base_system_instruction: str, cleaned_grid: dict) -> dict:
+    """Chat completion payload for one cleaned grid (or chunk)"""
+    system_instruction = build_system_prompt(base_system_instruction, cleaned_grid)
+    content = llm_payload_format.encode(cleaned_grid)
+
+    logger.info(f"🔍 DEBUG: Grid structure has {len(cleaned_grid.get('grids', []))} grids")
+    logger.info(f"🔍 DEBUG: System instruction length: {len(system_instruction)} chars")
+
+    return {
+        "model": "gpt-4o-mini",  # Each provider substitutes its configured model
+        "messages": [
+            {
+                "role": "system",
+                "content": system_instruction
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        "max_tokens": 256,  # Much smaller for faster response
+        "temperature": 0.6  # Deterministic for consistent results
+    }
+
+async def analyze_grid_with_llm(base_system_instruction: str, cleaned_grid: dict, owner: Optional[object] = None) -> str:
+    """Send a cleaned grid upstream and return the sanitized newline-separated IDs to hide
+
+    owner identifies the request a fan-out chunk belongs to; its chunks are never batched together.
     """
+    if micro_batcher is not None:
+        # Shares one completion with other requests for the same prompt that arrive within the window
+        return await micro_batcher.submit(base_system_instruction, cleaned_grid, owner)
+    return await request_llm_verdicts(base_system_instruction, cleaned_grid)
 
-    return HTMLResponse(content=html_content)
+async def request_llm_verdicts(base_system_instruction: str, cleaned_grid: dict) -> str:
+    """One upstream completion for a cleaned grid, sanitized to its valid child IDs"""
+    payload = build_llm_payload(base_system_instruction, cleaned_grid)
 
-@app.post("/fetch_distracting_chunks")
-async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, request: Request): # user: Dict = Depends(require_auth)):
-    # Configuration - process entire grid structure in one call
+    try:
+        api_result = await llm_providers.chat_completion(payload)
+    except UpstreamError as e:
+        raise HTTPException(status_code=500, detail=e.detail)
 
-    # Track the request by IP address
-    client_ip = request.client.host if request.client else "unknown"
-    request_count = track_ip_request(client_ip)
+    response_content = api_result['choices'][0]['message']['content'].strip()
 
-    # DISABLED: Update visitor telemetry in Supabase (fire and forget)
-    # asyncio.create_task(update_visitor_telemetry(analysis_request.visitorId))
+    # DEBUG: Log what the AI returned
+    logger.info(f"🔍 DEBUG: AI response length: {len(response_content)} chars")
+    logger.info(f"🔍 DEBUG: AI response preview: {response_content[:200]}...")
+
+    # Sanitize before the caller converts
+    return sanitize_llm_response(response_content, cleaned_grid)
+
+async def analyze_grid_fanout(base_system_instruction: str, cleaned_grid: dict, profile: str) -> List[str]:
+    """
+    Split a cleaned grid into chunks, analyze them concurrently and merge with combine_chunk_results.
+
+    Returns the hidden child IDs. If any chunk fails, verdicts from the chunks that
+    succeeded are still recorded so a retry only resends the failed children.
+    """
+    chunk_size = chunk_sizer.chunk_size
+    chunks = split_grid_into_chunks(cleaned_grid, chunk_size)
+    logger.info(f"🪓 Fan-out: {len(get_valid_child_ids(cleaned_grid))} children in {len(chunks)} chunk(s) of <= {chunk_size}")
+    owner = object()
+
+    async def analyze_chunk(chunk):
+        async with llm_semaphore:
+            chunk_start = time.time()
+            try:
+                # May share a micro-batch with other requests' chunks, never with this request's own
+                sanitized = await analyze_grid_with_llm(base_system_instruction, chunk, owner)
+            except Exception as e:
+                return {'success': False, 'error': getattr(e, 'detail', str(e))}
+            chunk_sizer.observe(time.time() - chunk_start, len(get_valid_child_ids(chunk)))
+            return {'success': True, 'data': sanitized}
+
+    chunk_results = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+    combined = combine_chunk_results(chunk_results)
+
+    if not combined['success']:
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            if chunk_result.get('success'):
+                await verdict_cache.record(chunk, chunk_result['data'].split('\n'), profile)
+        raise HTTPException(status_code=500, detail=combined['error'])
+
+    return [child_id for entry in combined['data'] for ids in entry.values() for child_id in ids]
+
+async def run_grid_analysis(analysis_request: GridRequest, cleaned_grid: dict, profile: str,
+                            cache_key: str, start_time: float, keyword_hidden: List[str] = None):
+    """Analyze a cleaned grid after a response cache miss and cache the result"""
+    # Answer children already judged for this profile from the verdict cache
+    cached_hidden, miss_grid, miss_count = verdict_cache.partition(cleaned_grid, profile)
+    logger.info(f"🧩 Verdict cache: {len(get_valid_child_ids(cleaned_grid)) - miss_count} cached, {miss_count} to analyze")
+
+    model_hidden = []
+    if CLASSIFIER_ENABLED and miss_count > 0:
+        # Confident local verdicts skip the upstream call; uncertain children still go to the LLM
+        model_hidden, miss_grid, uncertain_count = verdict_classifier.partition(miss_grid, profile)
+        if uncertain_count < miss_count:
+            logger.info(f"🧠 Classifier decided {miss_count - uncertain_count} children locally")
+        miss_count = uncertain_count
+
+    api_duration = 0.0
+    fresh_hidden = []
+    degraded = False
+    if miss_count > 0:
+        # Check if an LLM provider is configured
+        if not llm_providers.available:
+            raise HTTPException(
+                status_code=503,
+                detail="AI_SERVICE_UNAVAILABLE: no LLM provider configured"
+            )
+
+        degraded = upstream_degraded(cache_key)
+        if not degraded:
+            prompt_start = time.time()
+            base_system_instruction = get_prompt_for_url(analysis_request.currentUrl, analysis_request.whitelist, analysis_request.blacklist)
+            logger.info(f"📋 Base system instruction loaded ({time.time() - prompt_start:.3f}s)")
+
+            # DEBUG: Log what we're sending to the AI
+            logger.info(f"🔍 DEBUG: Sending to AI - URL: {analysis_request.currentUrl}")
+            logger.info(f"🔍 DEBUG: Whitelist: {analysis_request.whitelist}")
+            logger.info(f"🔍 DEBUG: Blacklist: {analysis_request.blacklist}")
+
+            # Only the unseen children go upstream
+            api_start = time.time()
+            try:
+                if FANOUT_ENABLED:
+                    fresh_hidden = await analyze_grid_fanout(base_system_instruction, miss_grid, profile)
+                else:
+                    sanitized = await analyze_grid_with_llm(base_system_instruction, miss_grid)
+                    fresh_hidden = [child_id for child_id in sanitized.split('\n') if child_id.strip()]
+            except HTTPException:
+                # Remember the failure so immediate retries don't queue up on a failing upstream
+                negative_cache.set(cache_key, True)
+                if llm_providers.accepting():
+                    raise
+                degraded = True
+            else:
+                api_duration = time.time() - api_start
+                logger.info(f"✅ OpenAI API call completed ({api_duration:.3f}s)")
+
+                # Every answer the LLM actually gave is training data, keep-all (empty) ones included;
+                # keyword fallbacks, negative-cache skips and provider errors never get here
+                verdict_classifier.record(miss_grid, fresh_hidden, profile)
+                if not fresh_hidden:
+                    # FALLBACK: If AI returns empty, try simple keyword matching
+                    logger.warning("🤖 AI returned empty response, trying fallback keyword matching")
+                    fresh_hidden = keyword_fallback_ids(analysis_request, miss_grid)
+                    logger.info(f"🔄 Fallback found {len(fresh_hidden)} items to remove")
+
+                await verdict_cache.record(miss_grid, fresh_hidden, profile)
+
+        if degraded:
+            # Upstream is down (or this request just failed): answer now from keywords instead of queueing
+            fresh_hidden = keyword_fallback_ids(analysis_request, miss_grid)
+            logger.warning(f"⚡ Upstream unavailable, degraded to keyword matching ({len(fresh_hidden)} items to remove)")
+
+    # Merge keyword, cached and fresh verdicts back into document order
+    parse_start = time.time()
+    hidden = set(keyword_hidden or ()) | set(cached_hidden) | set(model_hidden) | set(fresh_hidden)
+    hidden_ids = [child_id for child_id in analysis_request.child_ids if child_id in hidden]
+    result = convert_newline_format_to_json("\n".join(hidden_ids))
+    total_children_to_remove = len(hidden_ids)
+
+    parse_duration = time.time() - parse_start
+    logger.info(f"🎯 Found {total_children_to_remove} children to remove ({parse_duration:.3f}s)")
+
+    total_duration = time.time() - start_time
+    logger.info(f"✅ Request completed successfully - Total time: {total_duration:.3f}s")
+    logger.info(f"⏱️  Breakdown: API={api_duration:.3f}s, Other={total_duration-api_duration:.3f}s")
+
+    # REMOVED: Don't count as blocked until extension confirms they were actually hidden
+    # increment_blocked_counter(total_children_to_remove)
+
+    # Cache the response for future requests (degraded answers are not worth keeping)
+    if not degraded:
+        cache_response(cache_key, result)
+
+    return result
+
+def enforce_rate_limit(request: Request, visitor_id: Optional[str] = None) -> Dict[str, str]:
+    """Reject the request once its bucket is empty; returns the X-RateLimit-* headers for the response"""
+    result = track_request(request, visitor_id)
 
     # Check rate limit
-    if request_count > 3000:
+    if not result.allowed:
 
         raise HTTPException(
             status_code=429,
-            detail="RATE_LIMIT_EXCEEDED"
+            detail="RATE_LIMIT_EXCEEDED",
+            headers=result.headers()
         )
+    return result.headers()
 
-    start_time = time.time()
+def prepare_grid_analysis(analysis_request: GridRequest):
+    """
+    Clean the grid and derive the verdict profile and response cache key.
 
-    # Log grid structure details
+    Also returns the IDs of children that did not fit in the token budget, so the
+    extension can send them in a follow-up call, and the IDs already hidden by an
+    exact blacklist keyword hit, which are never sent upstream.
+    """
     grid_structure = analysis_request.gridStructure
-    total_grids = grid_structure.get('totalGrids', 0)
-    total_children = sum(grid.get('totalChildren', 0) for grid in grid_structure.get('grids', []))
 
-    # Check cache first
-    cache_key = get_cache_key(grid_structure, analysis_request.currentUrl, 
-                             analysis_request.whitelist, analysis_request.blacklist)
-    cached_response = get_cached_response(cache_key)
-    
-    if cached_response is not None:
-        logger.info(f"⚡ Returning cached response - Total time: {time.time() - start_time:.3f}s")
-        return cached_response
+    keyword_hidden = []
+    if KEYWORD_PREFILTER_ENABLED:
+        # Decided locally before budgeting, so they don't use up the LLM's token budget either
+        keyword_hidden, grid_structure = keyword_prefilter(grid_structure, analysis_request.blacklist,
+                                                           analysis_request.whitelist)
 
-    try:
-        prompt_start = time.time()
-        base_system_instruction = get_prompt_for_url(analysis_request.currentUrl, analysis_request.whitelist, analysis_request.blacklist)
-        logger.info(f"📋 Base system instruction loaded ({time.time() - prompt_start:.3f}s)")
+    # Clean grid data before sending to LLM
+    budgeted = budget_llm_input(grid_structure)
+    cleaned_grid = budgeted.cleaned
+    profile = get_verdict_profile(analysis_request.currentUrl, analysis_request.whitelist, analysis_request.blacklist)
+    cache_key = get_cache_key(cleaned_grid, profile, keyword_hidden)
+    return cleaned_grid, profile, cache_key, budgeted.dropped, keyword_hidden
 
-        # Check if OpenAI API is configured
-        if not OPENAI_HEADERS:
-            raise HTTPException(
-                status_code=503,
-                detail="AI_SERVICE_UNAVAILABLE: OpenAI API not configured"
-            )
+@app.post("/fetch_distracting_chunks")
+async def fetch_distracting_chunks(request: Request, analysis_request: GridRequest = Depends(read_grid_request)): # user: Dict = Depends(require_auth)):
+    # Configuration - process entire grid structure in one call
 
-        # Process entire grid structure in one API call
-        api_start = time.time()
-
-        # Clean grid data before sending to LLM
-        cleaned_grid = clean_grid_structure_for_llm(grid_structure)
-
-        # Build strong system prompt with explicit schema and valid IDs to avoid hallucinations
-        def get_valid_child_ids(cleaned):
-            ids = []
-            for grid in cleaned.get('grids', []):
-                for child in grid.get('children', []):
-                    cid = child.get('id')
-                    if cid:
-                        ids.append(cid)
-            return ids
-
-        def build_system_prompt(base_prompt: str, cleaned: dict) -> str:
-            valid_ids = get_valid_child_ids(cleaned)
-            ids_block = "\n".join(valid_ids)
-            rules = (
-                "\n\nSTRICT OUTPUT RULES:\n"
-                "- Output ONLY a newline-separated list of child IDs to hide (e.g., g1c0, g1c5).\n"
-                "- Do NOT include any explanations, JSON, code fences, or extra text.\n"
-                "- If nothing should be hidden, return an empty string.\n"
-                "- You MUST only return IDs from the VALID_CHILD_IDS list below. Never invent IDs.\n"
-                "- Prefer to hide content matching blacklist terms and unrelated to whitelist intent.\n"
-                "\nVALID_CHILD_IDS:\n" + ids_block + "\n"
-            )
-            return f"{base_prompt}{rules}"
+    # Returned as a FastJSONResponse directly, which skips FastAPI's jsonable_encoder pass
+    headers = enforce_rate_limit(request, analysis_request.visitorId)
 
-        system_instruction = build_system_prompt(base_system_instruction, cleaned_grid)
-        content = json.dumps(cleaned_grid, indent=2)
-        
-        # DEBUG: Log what we're sending to the AI
-        logger.info(f"🔍 DEBUG: Sending to AI - URL: {analysis_request.currentUrl}")
-        logger.info(f"🔍 DEBUG: Whitelist: {analysis_request.whitelist}")
-        logger.info(f"🔍 DEBUG: Blacklist: {analysis_request.blacklist}")
-        logger.info(f"🔍 DEBUG: Grid structure has {len(cleaned_grid.get('grids', []))} grids")
-        logger.info(f"🔍 DEBUG: Total children: {sum(grid.get('totalChildren', 0) for grid in cleaned_grid.get('grids', []))}")
-        logger.info(f"🔍 DEBUG: System instruction length: {len(system_instruction)} chars")
-
-
-        payload = {
-            "model": "gpt-4o-mini",  # Use a valid OpenAI model
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_instruction
-                },
-                {
-                    "role": "user",
-                    "content": content
-                }
-            ],
-            "max_tokens": 256,  # Much smaller for faster response
-            "temperature": 0.6  # Deterministic for consistent results
-        }
+    # DISABLED: Update visitor telemetry in Supabase (fire and forget)
+    # asyncio.create_task(update_visitor_telemetry(analysis_request.visitorId))
 
-        response = requests.post(OPENAI_URL, headers=OPENAI_HEADERS, json=payload, timeout=30)
+    start_time = time.time()
 
-        if response.status_code != 200:
+    cleaned_grid, profile, cache_key, deferred, keyword_hidden = prepare_grid_analysis(analysis_request)
+    if deferred:
+        # Over budget children are not lost: the extension can resend them in a follow-up call
+        headers[DEFERRED_CHILDREN_HEADER] = ",".join(deferred)
 
-            raise HTTPException(status_code=500, detail=f"OpenAI API error: {response.status_code} - {response.text}")
+    # Check cache first
+    cached_response = get_cached_response(cache_key)
 
-        api_result = response.json()
-        response_content = api_result['choices'][0]['message']['content'].strip()
+    if cached_response is not None:
+        logger.info(f"⚡ Returning cached response - Total time: {time.time() - start_time:.3f}s")
+        return FastJSONResponse(cached_response, headers=headers)
 
-        api_duration = time.time() - api_start
-        logger.info(f"✅ OpenAI API call completed ({api_duration:.3f}s)")
-        
-        # DEBUG: Log what the AI returned
-        logger.info(f"🔍 DEBUG: AI response length: {len(response_content)} chars")
-        logger.info(f"🔍 DEBUG: AI response preview: {response_content[:200]}...")
+    try:
+        # Identical requests already in flight share one analysis instead of each calling upstream
+        result = await single_flight.do(
+            cache_key,
+            lambda: run_grid_analysis(analysis_request, cleaned_grid, profile, cache_key, start_time, keyword_hidden)
+        )
+        return FastJSONResponse(result, headers=headers)
+
+    except Exception as e:
+        error_duration = time.time() - start_time
+        logger.error("Request failed after %.3fs: %s" % (error_duration, str(e)))
 
-        # Parse and sanitize the result
-        parse_start = time.time()
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_grid_analysis(analysis_request: GridRequest, cleaned_grid: dict, profile: str,
+                               cache_key: str, start_time: float, deferred: List[str] = None,
+                               keyword_hidden: List[str] = None):
+    """
+    NDJSON event stream: one {"type": "hide"} line per child ID as soon as it is known,
+    then a final {"type": "done"} line carrying the usual grouped result.
+
+    Children left out by the token budget are announced first in a {"type": "deferred"} line.
+    """
+    if deferred:
+        yield ndjson_line({"type": "deferred", "ids": deferred})
 
-        def sanitize_llm_response(text: str, cleaned: dict) -> str:
-            """Extract only valid child IDs present in the cleaned grid from arbitrary model text."""
+    cached_response = get_cached_response(cache_key)
+    if cached_response is not None:
+        cached_ids = [child_id for entry in cached_response for ids in entry.values() for child_id in ids]
+        for child_id in cached_ids:
+            yield hide_event(child_id, "cache")
+        yield ndjson_line({"type": "done", "count": len(cached_ids), "result": cached_response})
+        return
+
+    # Keyword hits and verdict cache hits can be flushed before anything goes upstream
+    for child_id in keyword_hidden or ():
+        yield hide_event(child_id, "keyword")
+    cached_hidden, miss_grid, miss_count = verdict_cache.partition(cleaned_grid, profile)
+    for child_id in cached_hidden:
+        yield hide_event(child_id, "cache")
+
+    model_hidden = []
+    if CLASSIFIER_ENABLED and miss_count > 0:
+        model_hidden, miss_grid, miss_count = verdict_classifier.partition(miss_grid, profile)
+        for child_id in model_hidden:
+            yield hide_event(child_id, "model")
+
+    fresh_hidden = []
+    degraded = False
+    if miss_count > 0:
+        if not llm_providers.available:
+            yield ndjson_line({"type": "error", "error": "AI_SERVICE_UNAVAILABLE: no LLM provider configured"})
+            return
+
+        degraded = upstream_degraded(cache_key)
+        if not degraded:
+            base_system_instruction = get_prompt_for_url(analysis_request.currentUrl, analysis_request.whitelist, analysis_request.blacklist)
+            chunks = split_grid_into_chunks(miss_grid, chunk_sizer.chunk_size) if FANOUT_ENABLED else [miss_grid]
+            queue: asyncio.Queue = asyncio.Queue()
+
+            async def stream_chunk(chunk):
+                parser = ChildIdStreamParser(get_valid_child_ids(chunk))
+
+                async def consume(deadline):
+                    payload = build_llm_payload(base_system_instruction, chunk)
+                    async for delta in llm_providers.stream_chat_completion(payload, deadline):
+                        for child_id in parser.feed(delta):
+                            queue.put_nowait(("hide", child_id))
+                    for child_id in parser.close():
+                        queue.put_nowait(("hide", child_id))
+
+                try:
+                    async with llm_semaphore:
+                        chunk_start = time.time()
+                        deadline = asyncio.get_running_loop().time() + llm_client.total_timeout
+                        await asyncio.wait_for(consume(deadline), llm_client.total_timeout)
+                        chunk_sizer.observe(time.time() - chunk_start, len(parser.valid))
+                    await verdict_cache.record(chunk, parser.emitted, profile)
+                    verdict_classifier.record(chunk, parser.emitted, profile)
+                except Exception as e:
+                    queue.put_nowait(("error", getattr(e, 'detail', str(e)) or e.__class__.__name__))
+                finally:
+                    queue.put_nowait(("finished", None))
+
+            tasks = [asyncio.create_task(stream_chunk(chunk)) for chunk in chunks]
+            errors = []
+            pending = len(tasks)
             try:
-                # Collect valid IDs set
-                valid = set()
-                for grid in cleaned.get('grids', []):
-                    for child in grid.get('children', []):
-                        cid = child.get('id')
-                        if cid:
-                            valid.add(cid)
-                # Regex to find tokens like g12c3 etc.
-                ids = re.findall(r"g\d+c\d+", text or "")
-                # Filter to only valid ids and deduplicate preserving order
-                seen = set()
-                filtered = []
-                for cid in ids:
-                    if cid in valid and cid not in seen:
-                        filtered.append(cid)
-                        seen.add(cid)
-                return "\n".join(filtered)
-            except Exception:
-                return ""
-
-        # Sanitize first, then convert
-        sanitized = sanitize_llm_response(response_content, cleaned_grid)
-        if sanitized and sanitized.strip():
-            result = convert_newline_format_to_json(sanitized)
-            total_children_to_remove = len([child for child in sanitized.split('\n') if child.strip()])
-        else:
-            # FALLBACK: If AI returns empty, try simple keyword matching
-            logger.warning("🤖 AI returned empty response, trying fallback keyword matching")
-            result = fallback_keyword_matching(cleaned_grid, analysis_request.blacklist)
-            total_children_to_remove = len(result)
-            logger.info(f"🔄 Fallback found {total_children_to_remove} items to remove")
-
-        parse_duration = time.time() - parse_start
-        logger.info(f"🎯 Found {total_children_to_remove} children to remove ({parse_duration:.3f}s)")
-
-        total_duration = time.time() - start_time
-        logger.info(f"✅ Request completed successfully - Total time: {total_duration:.3f}s")
-        logger.info(f"⏱️  Breakdown: API={api_duration:.3f}s, Other={total_duration-api_duration:.3f}s")
-
-        # REMOVED: Don't count as blocked until extension confirms they were actually hidden
-        # increment_blocked_counter(total_children_to_remove)
-
-        # Cache the response for future requests
+                while pending:
+                    kind, value = await queue.get()
+                    if kind == "hide":
+                        if not fresh_hidden:
+                            logger.info(f"⚡ First streamed ID after {time.time() - start_time:.3f}s")
+                        fresh_hidden.append(value)
+                        yield hide_event(value, "llm")
+                    elif kind == "error":
+                        errors.append(value)
+                    else:
+                        pending -= 1
+            finally:
+                # Client went away mid-stream: stop paying for upstream tokens
+                for task in tasks:
+                    task.cancel()
+
+            if errors:
+                # Remember the failure so immediate retries don't queue up on a failing upstream
+                negative_cache.set(cache_key, True)
+                if llm_providers.accepting():
+                    logger.error(f"Streaming analysis failed after {time.time() - start_time:.3f}s: {errors[0]}")
+                    yield ndjson_line({"type": "error", "error": errors[0]})
+                    return
+                degraded = True
+            elif not fresh_hidden:
+                # FALLBACK: If AI returns empty, try simple keyword matching
+                fresh_hidden = keyword_fallback_ids(analysis_request, miss_grid)
+                for child_id in fresh_hidden:
+                    yield hide_event(child_id, "fallback")
+                await verdict_cache.record(miss_grid, fresh_hidden, profile)
+
+        if degraded:
+            # Upstream is down (or this request just failed): answer now from keywords instead of queueing
+            streamed = set(fresh_hidden)
+            for child_id in keyword_fallback_ids(analysis_request, miss_grid):
+                if child_id not in streamed:
+                    fresh_hidden.append(child_id)
+                    yield hide_event(child_id, "fallback")
+
+    hidden = set(keyword_hidden or ()) | set(cached_hidden) | set(model_hidden) | set(fresh_hidden)
+    hidden_ids = [child_id for child_id in analysis_request.child_ids if child_id in hidden]
+    result = convert_newline_format_to_json("\n".join(hidden_ids))
+    if not degraded:
         cache_response(cache_key, result)
 
-        return result
+    logger.info(f"✅ Streaming request completed - Total time: {time.time() - start_time:.3f}s")
+    yield ndjson_line({"type": "done", "count": len(hidden_ids), "result": result})
 
-    except Exception as e:
-        error_duration = time.time() - start_time
-        logger.error("Request failed after %.3fs: %s" % (error_duration, str(e)))
+@app.post("/fetch_distracting_chunks/stream")
+async def fetch_distracting_chunks_stream(request: Request, analysis_request: GridRequest = Depends(read_grid_request)):
+    """Streaming variant of /fetch_distracting_chunks (NDJSON, one child ID per line as it is produced)"""
+    rate_limit_headers = enforce_rate_limit(request, analysis_request.visitorId)
 
-        raise HTTPException(status_code=500, detail=str(e))
+    start_time = time.time()
+    cleaned_grid, profile, cache_key, deferred, keyword_hidden = prepare_grid_analysis(analysis_request)
+
+    return StreamingResponse(
+        stream_grid_analysis(analysis_request, cleaned_grid, profile, cache_key, start_time, deferred, keyword_hidden),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **rate_limit_headers}
+    )
 
 
 def split_grid_into_chunks(grid_structure, chunk_size):
@@ -1202,7 +1289,7 @@ def split_grid_into_chunks(grid_structure, chunk_size):
                 all_children_with_grid_info.append({
                     'child': child,
                     'gridId': grid['id'],
-                    'gridText': grid['gridText']
+                    'gridText': grid.get('gridText', '')
                 })
 
     # If total children <= chunk size, return original structure
@@ -1237,77 +1324,82 @@ def split_grid_into_chunks(grid_structure, chunk_size):
     return chunks
 
 
-def clean_grid_structure_for_llm(grid_structure):
+def clean_grid_structure_for_llm(grid_structure, token_budget=None, max_child_tokens=None):
     """
     Optimize grid structure for LLM by removing unnecessary data and limiting content
+
+    Children are kept in priority order until the token budget is spent; use
+    budget_llm_input directly to also get the IDs that were left out.
     """
-    cleaned_structure = {
-        'totalGrids': grid_structure.get('totalGrids', 0),
-        'grids': []
-    }
+    return budget_llm_input(grid_structure, token_budget, max_child_tokens).cleaned
 
-    if 'grids' in grid_structure:
-        for grid in grid_structure['grids']:
-            # Limit to essential data only
-            cleaned_grid = {
-                'id': grid.get('id'),
-                'totalChildren': grid.get('totalChildren', 0),
-                'children': []
-            }
-            
-            # Add grid text if available (truncated for performance)
-            if 'gridText' in grid:
-                grid_text = grid['gridText']
-                # Truncate grid text to prevent huge payloads
-                if len(grid_text) > 500:
-                    grid_text = grid_text[:500] + "..."
-                cleaned_grid['gridText'] = grid_text
-
-            # Process children with size limits - PRIORITIZE VISIBLE CONTENT
-            if 'children' in grid:
-                children = grid['children']
-                # Limit to only the first 10 children (most visible) for faster processing
-                max_children = 10  # Further reduced for speed
-                if len(children) > max_children:
-                    children = children[:max_children]
-                
-                for child in children:
-                    cleaned_child = {
-                        'id': child.get('id'),
-                        'text': child.get('text', '')
-                    }
-                    # Truncate child text to prevent huge payloads
-                    if len(cleaned_child['text']) > 50:  # Further reduced to 50 chars
-                        cleaned_child['text'] = cleaned_child['text'][:50] + "..."
-                    cleaned_grid['children'].append(cleaned_child)
-
-            cleaned_structure['grids'].append(cleaned_grid)
-
-    return cleaned_structure
-
-def fallback_keyword_matching(cleaned_grid, blacklist):
+def budget_llm_input(grid_structure, token_budget=None, max_child_tokens=None):
+    """Budgeted cleaning with the configured defaults (larger budget in fan-out mode)"""
+    if token_budget is None:
+        token_budget = FANOUT_TOKEN_BUDGET if FANOUT_ENABLED else LLM_INPUT_TOKEN_BUDGET
+    if max_child_tokens is None:
+        max_child_tokens = LLM_MAX_CHILD_TOKENS
+    return budget_grid_structure(grid_structure, token_budget, max_child_tokens)
+
+def keyword_prefilter(grid_structure, blacklist, whitelist=None):
+    """
+    Hide children whose full text contains a blacklist keyword as a whole word.
+
+    A whitelist keyword in the same text vetoes the hit and leaves the child to the LLM.
+    Returns the hidden IDs and the grid structure without them.
+    """
+    if not blacklist or not grid_structure or not grid_structure.get('grids'):
+        return [], grid_structure
+
+    matcher = get_keyword_matcher(blacklist, whitelist)
+    hidden = []
+    remaining_grids = []
+    for grid in grid_structure.get('grids', []):
+        children = grid.get('children', []) or []
+        kept = []
+        for child in children:
+            if child.get('id') and matcher.should_hide(child.get('text', '') or ''):
+                hidden.append(child.get('id'))
+            else:
+                kept.append(child)
+        remaining_grids.append(dict(grid, children=kept) if len(kept) != len(children) else grid)
+
+    if not hidden:
+        return [], grid_structure
+
+    logger.info(f"🔑 Keyword prefilter hid {len(hidden)} children without the LLM")
+    return hidden, dict(grid_structure, grids=remaining_grids)
+
+def keyword_fallback_ids(analysis_request: GridRequest, cleaned_grid: dict) -> List[str]:
+    """Child IDs from fallback_keyword_matching over the request's full child texts"""
+    fallback = fallback_keyword_matching(cleaned_grid, analysis_request.blacklist, analysis_request.whitelist,
+                                         analysis_request.child_texts)
+    return [child_id for entry in fallback for ids in entry.values() for child_id in ids]
+
+def fallback_keyword_matching(cleaned_grid, blacklist, whitelist=None, full_texts=None):
     """
     Fallback keyword matching when AI returns empty response
+
+    Uses the compiled matcher for this blacklist/whitelist (substring matches, whitelist
+    vetoes) over each child's full text when full_texts is given.
     """
     if not blacklist or not cleaned_grid.get('grids'):
         return []
-    
+
     result = []
-    blacklist_lower = [keyword.lower() for keyword in blacklist]
-    
+    matcher = get_keyword_matcher(blacklist, whitelist)
+    full_texts = full_texts or {}
+
     for grid in cleaned_grid.get('grids', []):
         for child in grid.get('children', []):
-            child_text = child.get('text', '').lower()
             child_id = child.get('id')
-            
-            # Check if any blacklist keyword is in the child text
-            for keyword in blacklist_lower:
-                if keyword in child_text:
-                    # Convert to the format expected by the frontend
-                    grid_id = child_id.split('c')[0] if 'c' in child_id else grid.get('id', 'g1')
-                    result.append({grid_id: [child_id]})
-                    break  # Only add once per child
-    
+            child_text = full_texts.get(child_id) or child.get('text', '')
+
+            if child_id and matcher.should_hide(child_text, whole_words=False):
+                # Convert to the format expected by the frontend
+                grid_id = child_id.split('c')[0] if 'c' in child_id else grid.get('id', 'g1')
+                result.append({grid_id: [child_id]})
+
     return result
 
 def convert_newline_format_to_json(newline_format):
@@ -1603,6 +1695,7 @@ def combine_chunk_results(chunk_results):
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
 logger.info("Prompts loaded successfully")
+startup_timer.mark("routes")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,158 @@
+"""
+Cross-request micro-batching of LLM calls.
+
+Grids submitted with the same rendered prompt within max_wait seconds (or until
+max_children is reached) are merged into one completion. Each request's grids
+are renumbered into their own block of grid IDs (g1, g2, ... so the model
+still sees ordinary gNcM IDs), and the sanitized IDs in the combined answer
+are mapped back to the request that owns them.
+
+Fan-out chunks are submitted with an owner (the request they were split
+from), and a batch takes at most one chunk per owner, so chunks of different
+requests share completions while each request's own chunks stay in separate,
+parallel calls. Several batches per prompt can therefore be open at once.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _child_count(cleaned_grid: dict) -> int:
+    return sum(len(grid.get('children', [])) for grid in cleaned_grid.get('grids', []))
+
+
+class _Batch:
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.entries: List[Tuple[dict, asyncio.Future]] = []
+        self.owners: Set[Hashable] = set()
+        self.children = 0
+        self.timer = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent grids that share a prompt into a single upstream call"""
+
+    def __init__(self, analyze: Callable[[str, dict], Awaitable[str]],
+                 max_wait: float = 0.01, max_children: int = 40):
+        # analyze(prompt, cleaned_grid) -> sanitized newline-separated IDs to hide
+        self.analyze = analyze
+        self.max_wait = max_wait
+        self.max_children = max_children
+        # Open batches per prompt hash, oldest first
+        self._pending: Dict[str, List[_Batch]] = {}
+        self.calls = 0
+        self.batched_requests = 0
+        self.saved_calls = 0
+
+    async def submit(self, prompt: str, cleaned_grid: dict, owner: Optional[Hashable] = None) -> str:
+        """Sanitized newline-separated IDs to hide for this grid, answered as part of a batch
+
+        Grids with the same owner (chunks of one fanned-out request) never share a batch.
+        """
+        key = hashlib.md5(prompt.encode()).hexdigest()
+        size = _child_count(cleaned_grid)
+
+        batch = None
+        for candidate in list(self._pending.get(key, ())):
+            if owner is not None and owner in candidate.owners:
+                continue
+            if candidate.children + size > self.max_children:
+                # Doesn't fit: send what's waiting
+                self._flush(key, candidate)
+                continue
+            batch = candidate
+            break
+        if batch is None:
+            batch = _Batch(prompt)
+            self._pending.setdefault(key, []).append(batch)
+            batch.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush, key, batch)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.entries.append((cleaned_grid, future))
+        batch.children += size
+        if owner is not None:
+            batch.owners.add(owner)
+        if batch.children >= self.max_children:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: str, batch: _Batch):
+        batches = self._pending.get(key)
+        if not batches or batch not in batches:
+            return
+        batches.remove(batch)
+        if not batches:
+            del self._pending[key]
+        batch.timer.cancel()
+        asyncio.ensure_future(self._run(batch.prompt, batch))
+
+    async def _run(self, prompt: str, batch: _Batch):
+        self.calls += 1
+        self.batched_requests += len(batch.entries)
+        self.saved_calls += len(batch.entries) - 1
+
+        if len(batch.entries) == 1:
+            cleaned_grid, future = batch.entries[0]
+            try:
+                result = await self.analyze(prompt, cleaned_grid)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+            return
+
+        combined, owners = self._combine(batch.entries)
+        logger.info(f"📦 Micro-batch: {len(batch.entries)} requests, {batch.children} children in one call")
+        try:
+            sanitized = await self.analyze(prompt, combined)
+        except Exception as e:
+            for _, future in batch.entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        routed: List[List[str]] = [[] for _ in batch.entries]
+        for batch_id in sanitized.split("\n"):
+            owner = owners.get(batch_id.strip())
+            if owner is not None:
+                routed[owner[0]].append(owner[1])
+        for (_, future), ids in zip(batch.entries, routed):
+            if not future.done():
+                future.set_result("\n".join(ids))
+
+    @staticmethod
+    def _combine(entries: List[Tuple[dict, asyncio.Future]]):
+        """Merge grids under batch-unique IDs; returns the grid and batch ID -> (entry index, original ID)"""
+        combined = {'totalGrids': 0, 'grids': []}
+        owners: Dict[str, Tuple[int, str]] = {}
+        grid_number = 0
+        for index, (cleaned_grid, _) in enumerate(entries):
+            for grid in cleaned_grid.get('grids', []):
+                grid_number += 1
+                grid_id = f"g{grid_number}"
+                children = []
+                for position, child in enumerate(grid.get('children', [])):
+                    batch_id = f"{grid_id}c{position}"
+                    owners[batch_id] = (index, child.get('id'))
+                    children.append(dict(child, id=batch_id))
+                entry = {key: value for key, value in grid.items() if key != 'children'}
+                entry['id'] = grid_id
+                entry['children'] = children
+                combined['grids'].append(entry)
+        combined['totalGrids'] = grid_number
+        return combined, owners
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'calls': self.calls,
+            'batched_requests': self.batched_requests,
+            'saved_calls': self.saved_calls,
+            'pending_batches': sum(len(batches) for batches in self._pending.values())
+        }
@@ -0,0 +1,131 @@
+"""
+Wire formats for the grid payload sent to the LLM.
+
+"json" is the original indented JSON document plus a VALID_CHILD_IDS list in
+the system prompt. "compact" sends one `id<TAB>text` line per child and no
+separate ID list, which costs far fewer input tokens for the same content.
+Formats are looked up by name via get_payload_format.
+"""
+
+import re
+import json
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+_LINE_BREAK_RE = re.compile(r"\s*\n\s*")
+_SPACE_RE = re.compile(r"[ \t\r\f\v]+")
+# Rough BPE behaviour: Latin words split every ~4 chars, digits in groups of 3, everything else per char
+_TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+_tiktoken_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count for text: exact with tiktoken if installed, otherwise a local approximation"""
+    global _tiktoken_encoding
+    if _tiktoken_encoding is None:
+        try:
+            import tiktoken
+            _tiktoken_encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _tiktoken_encoding = False
+    if _tiktoken_encoding:
+        return len(_tiktoken_encoding.encode(text or ""))
+
+    count = 0
+    for piece in _TOKEN_PIECE_RE.findall(text or ""):
+        count += (len(piece) + 3) // 4 if piece[0].isalpha() and piece.isascii() else 1
+    return count
+
+
+def _child_ids(cleaned_grid: dict) -> List[str]:
+    return [child.get('id') for grid in cleaned_grid.get('grids', [])
+            for child in grid.get('children', []) if child.get('id')]
+
+
+class JsonPayloadFormat:
+    """Original format: indented JSON grid, valid IDs repeated in the system prompt"""
+
+    name = "json"
+
+    def encode(self, cleaned_grid: dict) -> str:
+        return json.dumps(cleaned_grid, indent=2)
+
+    def rules(self, cleaned_grid: dict) -> str:
+        ids_block = "\n".join(_child_ids(cleaned_grid))
+        return (
+            "\n\nSTRICT OUTPUT RULES:\n"
+            "- Output ONLY a newline-separated list of child IDs to hide (e.g., g1c0, g1c5).\n"
+            "- Do NOT include any explanations, JSON, code fences, or extra text.\n"
+            "- If nothing should be hidden, return an empty string.\n"
+            "- You MUST only return IDs from the VALID_CHILD_IDS list below. Never invent IDs.\n"
+            "- Prefer to hide content matching blacklist terms and unrelated to whitelist intent.\n"
+            "\nVALID_CHILD_IDS:\n" + ids_block + "\n"
+        )
+
+
+class CompactPayloadFormat:
+    """One `id<TAB>text` line per child; the IDs starting each line are the valid set"""
+
+    name = "compact"
+
+    @staticmethod
+    def _flatten(text: str) -> str:
+        text = _LINE_BREAK_RE.sub(" | ", (text or "").strip())
+        return _SPACE_RE.sub(" ", text)
+
+    def encode(self, cleaned_grid: dict) -> str:
+        lines = []
+        for grid in cleaned_grid.get('grids', []):
+            grid_id = grid.get('id') or ''
+            children = grid.get('children', [])
+            # Child IDs already carry their grid (g6c0 -> g6); a header is only needed when one doesn't
+            if any(not str(child.get('id', '')).startswith(f"{grid_id}c") for child in children):
+                lines.append(f"[{grid_id}]")
+            for child in children:
+                lines.append(f"{child.get('id')}\t{self._flatten(child.get('text', ''))}")
+        return "\n".join(lines)
+
+    def rules(self, cleaned_grid: dict) -> str:
+        return (
+            "\n\nINPUT FORMAT:\n"
+            "- One item per line: <child ID><TAB><visible text>. \" | \" separates lines within an item's text.\n"
+            "\nSTRICT OUTPUT RULES:\n"
+            "- Output ONLY a newline-separated list of child IDs to hide (e.g., g1c0, g1c5).\n"
+            "- Do NOT include any explanations, JSON, code fences, or extra text.\n"
+            "- If nothing should be hidden, return an empty string.\n"
+            "- You MUST only return IDs that start an input line. Never invent IDs.\n"
+            "- Prefer to hide content matching blacklist terms and unrelated to whitelist intent.\n"
+        )
+
+
+PAYLOAD_FORMATS = {
+    JsonPayloadFormat.name: JsonPayloadFormat(),
+    CompactPayloadFormat.name: CompactPayloadFormat(),
+}
+
+
+def get_payload_format(name: str):
+    payload_format = PAYLOAD_FORMATS.get((name or "").lower())
+    if payload_format is None:
+        logger.warning(f"Unknown LLM payload format '{name}', using json")
+        payload_format = PAYLOAD_FORMATS[JsonPayloadFormat.name]
+    return payload_format
+
+
+def format_report(cleaned_grid: dict, base_prompt: str = "") -> Dict[str, Dict[str, int]]:
+    """Input size (chars and tokens) of every registered format for one cleaned grid"""
+    report = {}
+    for name, payload_format in PAYLOAD_FORMATS.items():
+        system = base_prompt + payload_format.rules(cleaned_grid)
+        user = payload_format.encode(cleaned_grid)
+        report[name] = {
+            'system_chars': len(system),
+            'user_chars': len(user),
+            'system_tokens': estimate_tokens(system),
+            'user_tokens': estimate_tokens(user),
+            'total_tokens': estimate_tokens(system) + estimate_tokens(user)
+        }
+    return report
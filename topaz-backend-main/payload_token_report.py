@@ -0,0 +1,27 @@
+# Compare LLM input size of the payload formats on a sample grid
+# Usage: python payload_token_report.py [gridstructure.json] [url]
+import os
+import sys
+import json
+
+from main import clean_grid_structure_for_llm, get_prompt_for_url
+from payload_format import format_report
+
+grid_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "gridstructure.json")
+url = sys.argv[2] if len(sys.argv) > 2 else "https://www.youtube.com/"
+
+with open(grid_path) as f:
+    grid_structure = json.load(f)
+
+base_prompt = get_prompt_for_url(url, ["electronic"], ["music", "shorts"])
+
+for label, token_budget in [("1200-token budget", 1200), ("6000-token budget", 6000)]:
+    cleaned = clean_grid_structure_for_llm(grid_structure, token_budget=token_budget)
+    report = format_report(cleaned, base_prompt)
+    baseline = report["json"]["total_tokens"]
+
+    print(f"\n{label} ({sum(len(g['children']) for g in cleaned['grids'])} children)")
+    print(f"{'format':<10}{'system tok':>12}{'user tok':>10}{'total tok':>11}{'vs json':>9}")
+    for name, row in report.items():
+        change = (row["total_tokens"] - baseline) / baseline * 100 if baseline else 0
+        print(f"{name:<10}{row['system_tokens']:>12}{row['user_tokens']:>10}{row['total_tokens']:>11}{change:>8.1f}%")
@@ -0,0 +1,161 @@
+"""
+URL -> prompt routing with precompiled patterns and memoized rendering.
+
+Patterns from prompts_simplified.json are compiled once and indexed by the
+hostnames they mention, so a lookup is a dict hit on the URL's host (and its
+parent domains) followed by the few regexes registered for it. Rendered
+prompts are cached per (pattern, blacklist, whitelist, search query).
+
+Patterns are assumed to anchor on the hostnames they spell out; a pattern with
+no recognisable hostname literal is checked against every URL. A lookalike
+host such as twitter.com.evil.io is therefore never offered twitter's prompt,
+even where the bare regex (".*" after the host) would accept it.
+"""
+
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Escaped hostname literals inside a pattern, e.g. youtube\.com or x\.com
+_HOST_LITERAL_RE = re.compile(r"[a-z0-9-]+(?:\\\.[a-z0-9-]+)+", re.IGNORECASE)
+_HOSTNAME_RE = re.compile(r"(?:[a-z][a-z0-9+.-]*://)?(?:[^@/?#]*@)?([^/:?#]+)", re.IGNORECASE)
+_YOUTUBE_SEARCH_RE = re.compile(r"https?://(www\.)?youtube\.com/results\?(.+)")
+
+
+def extract_search_query(url: str) -> Optional[str]:
+    """Detect YouTube search URL and extract search query"""
+    if not _YOUTUBE_SEARCH_RE.match(url):
+        return None
+    # Extract the search_query parameter from the URL
+    qs = parse_qs(urlsplit(url).query)
+    return qs.get("search_query", [None])[0]
+
+
+def url_hostname(url: str) -> str:
+    # Patterns accept scheme-less URLs, so the scheme is optional here too
+    match = _HOSTNAME_RE.match(url)
+    return match.group(1).lower() if match else ""
+
+
+def pattern_hostnames(pattern: str) -> List[str]:
+    return sorted({literal.replace("\\.", ".").lower() for literal in _HOST_LITERAL_RE.findall(pattern)})
+
+
+class PromptRouter:
+    """Compiled, host-indexed router from URL to prompts_data entry"""
+
+    def __init__(self, prompts_data: Dict[str, dict], render_cache_bytes: int = 16 * 1024 * 1024,
+                 max_hosts: int = 4096):
+        self.prompts_data = prompts_data
+        self._compiled: List[Tuple[str, "re.Pattern"]] = []
+        self._by_host: Dict[str, List[int]] = {}
+        self._generic: List[int] = []
+
+        for pattern in prompts_data:
+            try:
+                self._compiled.append((pattern, re.compile(pattern)))
+            except re.error as e:
+                logger.error(f"Invalid prompt pattern {pattern!r}: {e}")
+                continue
+            position = len(self._compiled) - 1
+            hosts = pattern_hostnames(pattern)
+            if not hosts:
+                self._generic.append(position)
+            for host in hosts:
+                self._by_host.setdefault(host, []).append(position)
+
+        # host -> candidate positions; bounded by simply starting over when full
+        self._host_candidates: Dict[str, Tuple[int, ...]] = {}
+        self.max_hosts = max_hosts
+
+        # Prompts never change at runtime, so rendered entries only leave by LRU pressure
+        self._rendered = LRUCache(max_bytes=render_cache_bytes, max_age=24 * 3600, name="prompts")
+
+    def _candidates(self, url: str) -> Tuple[int, ...]:
+        host = url_hostname(url)
+        candidates = self._host_candidates.get(host)
+        if candidates is not None:
+            return candidates
+
+        positions = set(self._generic)
+        # m.youtube.com -> youtube.com -> com
+        labels = host.split(".") if host else []
+        for i in range(len(labels)):
+            positions.update(self._by_host.get(".".join(labels[i:]), ()))
+        # Keep the file's order so the first matching pattern still wins
+        candidates = tuple(sorted(positions))
+
+        if len(self._host_candidates) >= self.max_hosts:
+            self._host_candidates.clear()
+        self._host_candidates[host] = candidates
+        return candidates
+
+    def match(self, url: str) -> Optional[str]:
+        """Return the first prompts_data pattern matching the URL, or None"""
+        for position in self._candidates(url):
+            pattern, compiled = self._compiled[position]
+            if compiled.match(url):
+                return pattern
+        return None
+
+    def default_pattern(self) -> Optional[str]:
+        return self._compiled[0][0] if self._compiled else None
+
+    def resolve(self, url: str) -> Optional[str]:
+        """Matching pattern, falling back to the first configured one"""
+        pattern = self.match(url)
+        if pattern is None:
+            # Default fallback (shouldn't happen with proper config)
+            logger.warning("No matching pattern found for URL: %s" % url)
+            pattern = self.default_pattern()
+        return pattern
+
+    def render(self, url: str, whitelist: List[str] = None, blacklist: List[str] = None) -> str:
+        """Prompt for the URL with blacklist/whitelist (and YouTube search query) substituted"""
+        pattern = self.resolve(url)
+        if pattern is None:
+            logger.error("No prompts configured")
+            return ""
+
+        search_query = extract_search_query(url)
+        key = (pattern, tuple(blacklist or ()), tuple(whitelist or ()), search_query)
+        prompt = self._rendered.get(key)
+        if prompt is None:
+            prompt = self._render(self.prompts_data[pattern]["prompt"], whitelist, blacklist, search_query)
+            self._rendered.set(key, prompt)
+        return prompt
+
+    @staticmethod
+    def _render(prompt: str, whitelist: Optional[List[str]], blacklist: Optional[List[str]],
+                search_query: Optional[str]) -> str:
+        # Replace blacklist and whitelist tags
+        if blacklist and len(blacklist) > 0:
+            blacklist_items = "\n".join(["- %s" % item for item in blacklist])
+            prompt = prompt.replace("<BLACKLIST>", "<BLACKLIST>\n%s" % blacklist_items)
+        else:
+            prompt = prompt.replace("<BLACKLIST>", "")
+
+        if whitelist and len(whitelist) > 0:
+            whitelist_items = "\n".join(["- %s" % item for item in whitelist])
+            prompt = prompt.replace("<WHITELIST>", "<WHITELIST>\n%s" % whitelist_items)
+        else:
+            prompt = prompt.replace("<WHITELIST>", "")
+
+        # If YouTube search, add the search query to the prompt
+        if search_query:
+            prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
+
+        return prompt
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'patterns': len(self._compiled),
+            'indexed_hosts': len(self._by_host),
+            'generic_patterns': len(self._generic),
+            'rendered': self._rendered.stats()
+        }
@@ -0,0 +1,336 @@
+"""
+OpenAI-compatible LLM providers with hedged requests.
+
+Each provider has its own chat completions URL, API key and model. Calls go to
+the first provider in the configured order; if it hasn't answered within its
+observed p90 latency, the same request is fired at the next provider and
+whichever answers first wins (the other is cancelled). A failed call falls
+over to the next provider immediately.
+
+Every provider sits behind a circuit breaker, and once enough latencies have
+been observed its timeout follows its own p99 instead of the fixed maximum.
+A call that times out (or is cut off by the caller's deadline) counts as a
+failure and its elapsed time as a latency sample, so a hung provider trips
+its breaker and pushes its own timeout and hedge delay up; only hedge losers
+and callers that went away are left out of both.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+import httpx
+
+from llm_client import LLMClient, UpstreamError, UpstreamTimeout
+from circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# A cancellation this close to the caller's deadline is taken to be that deadline firing
+DEADLINE_SLACK = 0.05
+
+# Defaults for providers we know; anything else needs <NAME>_BASE_URL and <NAME>_MODEL
+KNOWN_PROVIDERS = {
+    "openai": {
+        "url": "https://api.openai.com/v1/chat/completions",
+        "model": "gpt-4o-mini"
+    },
+    "groq": {
+        "url": "https://api.groq.com/openai/v1/chat/completions",
+        "model": "llama-3.3-70b-versatile"
+    },
+}
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling upstream when every provider's breaker is open"""
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls, for percentile estimates"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def observe(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Provider:
+    """One OpenAI-compatible chat completions endpoint"""
+
+    def __init__(self, name: str, url: str, api_key: str, model: str):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.latency = LatencyWindow()
+        self.breaker = CircuitBreaker(name)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedges_won = 0
+
+    def prepare(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(payload, model=self.model)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'model': self.model,
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'hedges_won': self.hedges_won,
+            'p50': self.latency.percentile(0.5),
+            'p90': self.latency.percentile(0.9),
+            'p99': self.latency.percentile(0.99),
+            'breaker': self.breaker.stats()
+        }
+
+
+def providers_from_env(names: str, env=os.environ) -> List[Provider]:
+    """Providers listed in names (comma-separated, in priority order) that have an API key"""
+    providers = []
+    for name in [name.strip().lower() for name in (names or "").split(",") if name.strip()]:
+        prefix = name.upper()
+        defaults = KNOWN_PROVIDERS.get(name, {})
+        api_key = env.get(f"{prefix}_API_KEY")
+        url = env.get(f"{prefix}_BASE_URL", defaults.get("url"))
+        model = env.get(f"{prefix}_MODEL", defaults.get("model"))
+        if not api_key:
+            logger.warning(f"{prefix}_API_KEY not found - provider '{name}' disabled")
+            continue
+        if not url or not model:
+            logger.warning(f"Provider '{name}' needs {prefix}_BASE_URL and {prefix}_MODEL - disabled")
+            continue
+        providers.append(Provider(name, url, api_key, model))
+    return providers
+
+
+class ProviderPool:
+    """Routes chat completions across providers with hedging and failover"""
+
+    def __init__(self, providers: List[Provider], client: LLMClient,
+                 hedge: bool = True, hedge_percentile: float = 0.9,
+                 hedge_default_delay: float = 2.0, hedge_min_delay: float = 0.1,
+                 hedge_min_samples: int = 20, timeout_multiplier: float = 3.0,
+                 timeout_min: float = 2.0, breaker_window: float = 30.0,
+                 breaker_min_calls: int = 10, breaker_error_rate: float = 0.5,
+                 breaker_open_for: float = 15.0):
+        self.providers = providers
+        self.client = client
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.timeout_min = timeout_min
+        self.hedged = 0
+        # Tasks cancelled because another provider answered first
+        self._hedge_losers = weakref.WeakSet()
+
+        for provider in providers:
+            provider.breaker = CircuitBreaker(provider.name, window=breaker_window, min_calls=breaker_min_calls,
+                                              error_rate=breaker_error_rate, open_for=breaker_open_for)
+
+    @property
+    def available(self) -> bool:
+        """At least one provider is configured"""
+        return bool(self.providers)
+
+    def accepting(self) -> bool:
+        """At least one provider's breaker would let a call through right now"""
+        return any(provider.breaker.available() for provider in self.providers)
+
+    def timeout_for(self, provider: Provider) -> float:
+        """Total timeout for one call: a multiple of the provider's p99, within [timeout_min, client maximum]"""
+        if len(provider.latency) < self.hedge_min_samples:
+            return self.client.total_timeout
+        adaptive = provider.latency.percentile(0.99) * self.timeout_multiplier
+        return min(self.client.total_timeout, max(self.timeout_min, adaptive))
+
+    def hedge_delay(self, provider: Provider) -> float:
+        """How long to wait on provider before also asking the next one"""
+        if len(provider.latency) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, provider.latency.percentile(self.hedge_percentile))
+
+    def _timed_out(self, provider: Provider, start: float):
+        """Count a call that ran out of time as a failure, and how long it took as a latency sample"""
+        provider.errors += 1
+        provider.timeouts += 1
+        provider.breaker.record_failure()
+        provider.latency.observe(time.time() - start)
+
+    @staticmethod
+    def _past(deadline: Optional[float]) -> bool:
+        return deadline is not None and asyncio.get_running_loop().time() >= deadline - DEADLINE_SLACK
+
+    async def _call(self, provider: Provider, payload: Dict[str, Any],
+                    deadline: Optional[float] = None) -> Dict[str, Any]:
+        start = time.time()
+        provider.calls += 1
+        try:
+            result = await self.client.chat_completion(provider.url, provider.headers, provider.prepare(payload),
+                                                       total_timeout=self.timeout_for(provider))
+        except UpstreamTimeout:
+            self._timed_out(provider, start)
+            raise
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            self._timed_out(provider, start)
+            raise UpstreamTimeout(f"Provider {provider.name} timed out: {e.__class__.__name__}") from e
+        except UpstreamError:
+            provider.errors += 1
+            provider.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            if asyncio.current_task() not in self._hedge_losers and self._past(deadline):
+                # Cut off by the caller's deadline: as much a timeout as our own
+                self._timed_out(provider, start)
+            else:
+                # Hedge loser or caller gone: no verdict on the provider's health
+                provider.breaker.release()
+            raise
+        except BaseException:
+            provider.breaker.release()
+            raise
+        provider.breaker.record_success()
+        provider.latency.observe(time.time() - start)
+        return result
+
+    async def chat_completion(self, payload: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Decoded chat completion from the first provider to answer successfully
+
+        deadline (event loop time) is when the caller will give up, if it wraps this call in a timeout.
+        """
+        if not self.providers:
+            raise UpstreamError("No LLM provider configured", status_code=503)
+
+        remaining = list(self.providers)
+        running: Dict[asyncio.Task, Provider] = {}
+        last_error: Optional[UpstreamError] = None
+        answered = False
+
+        def launch() -> Optional[Provider]:
+            # Next provider whose breaker lets the call through; open ones are skipped without waiting
+            while remaining:
+                provider = remaining.pop(0)
+                if provider.breaker.allow():
+                    running[asyncio.ensure_future(self._call(provider, payload, deadline))] = provider
+                    return provider
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise CircuitOpenError("All LLM providers are unavailable (circuit open)", status_code=503)
+        try:
+            while running:
+                # Only hedge while something is still in flight and a backup is left
+                timeout = self.hedge_delay(primary) if self.hedge and remaining and len(running) == 1 else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    backup = launch()
+                    if backup is None:
+                        continue
+                    self.hedged += 1
+                    logger.info(f"🏁 Hedging: {primary.name} slower than p{int(self.hedge_percentile * 100)}, "
+                                f"also asking {backup.name}")
+                    continue
+
+                for task in done:
+                    provider = running.pop(task)
+                    try:
+                        result = task.result()
+                    except UpstreamError as e:
+                        last_error = e
+                        logger.warning(f"Provider {provider.name} failed: {e.detail}")
+                        continue
+                    if provider is not primary:
+                        provider.hedges_won += 1
+                    answered = True
+                    return result
+
+                if not running and remaining:
+                    # Everything in flight failed: fail over right away
+                    primary = launch() or primary
+        finally:
+            # Cancel the loser(s) so we stop paying for the slower answer
+            for task in running:
+                if answered:
+                    self._hedge_losers.add(task)
+                task.cancel()
+
+        raise last_error or UpstreamError("All LLM providers failed")
+
+    async def stream_chat_completion(self, payload: Dict[str, Any],
+                                     deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream content deltas, failing over to the next provider until one produces output
+
+        The caller bounds the total time; deadline (event loop time) is when it gives up, so a
+        cancellation at that point is recorded as the provider timing out.
+        """
+        if not self.providers:
+            raise UpstreamError("No LLM provider configured", status_code=503)
+
+        last_error: Optional[UpstreamError] = None
+        for provider in self.providers:
+            if not provider.breaker.allow():
+                continue
+            started = False
+            start = time.time()
+            provider.calls += 1
+            try:
+                async for delta in self.client.stream_chat_completion(provider.url, provider.headers,
+                                                                      provider.prepare(payload)):
+                    started = True
+                    yield delta
+            except UpstreamError as e:
+                if isinstance(e, UpstreamTimeout):
+                    self._timed_out(provider, start)
+                else:
+                    provider.errors += 1
+                    provider.breaker.record_failure()
+                # Once IDs have been streamed to the caller, retrying elsewhere would duplicate them
+                if started:
+                    raise
+                last_error = e
+                logger.warning(f"Provider {provider.name} failed before streaming: {e.detail}")
+                continue
+            except asyncio.CancelledError:
+                if self._past(deadline):
+                    self._timed_out(provider, start)
+                else:
+                    provider.breaker.release()
+                raise
+            except BaseException:
+                provider.breaker.release()
+                raise
+            provider.breaker.record_success()
+            return
+
+        raise last_error or CircuitOpenError("All LLM providers are unavailable (circuit open)", status_code=503)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'order': [provider.name for provider in self.providers],
+            'hedged': self.hedged,
+            'providers': {provider.name: provider.stats() for provider in self.providers}
+        }
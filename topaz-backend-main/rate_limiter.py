@@ -0,0 +1,201 @@
+"""
+Token-bucket rate limiting with bounded memory.
+
+Each key (client IP or visitor ID) gets a bucket of `limit` tokens that refills
+continuously at limit/window per second, so there is no reset instant that
+lets a burst through. SQLiteRateLimiter keeps the buckets in the host-local
+SQLite file shared by every gunicorn worker, so the configured limit is the
+real per-host limit rather than one per worker.
+
+hit() runs on the event loop for every analysis request, so it only waits a
+few milliseconds for the SQLite write lock; when another worker holds it
+longer, that request is counted against the per-worker bucket instead.
+"""
+
+import os
+import math
+import time
+import sqlite3
+import logging
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from shared_cache import DEFAULT_BUSY_TIMEOUT, DEFAULT_SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the bucket is full again, and until the next request would be allowed
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def take_token(tokens: float, updated_at: float, now: float, limit: int, window: float,
+               cost: float = 1.0) -> Tuple[float, RateLimitResult]:
+    """Refill a bucket to now and try to take cost tokens; returns (new token count, result)"""
+    rate = limit / window
+    tokens = min(float(limit), tokens + max(0.0, now - updated_at) * rate)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    result = RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=int(tokens),
+        reset_after=(limit - tokens) / rate,
+        retry_after=0.0 if allowed else (cost - tokens) / rate
+    )
+    return tokens, result
+
+
+class TokenBucketLimiter:
+    """Per-process token buckets, LRU-bounded to max_keys"""
+
+    def __init__(self, limit: int = 3000, window: float = 3600, max_keys: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.rejected = 0
+
+    def hit(self, key: str, cost: float = 1.0) -> RateLimitResult:
+        now = time.time()
+        tokens, updated_at = self._buckets.pop(key, (float(self.limit), now))
+        tokens, result = take_token(tokens, updated_at, now, self.limit, self.window, cost)
+        self._buckets[key] = (tokens, now)
+        # An evicted key just starts again with a full bucket
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if not result.allowed:
+            self.rejected += 1
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {'backend': 'memory', 'keys': len(self._buckets), 'rejected': self.rejected,
+                'limit': self.limit, 'window': self.window}
+
+
+class SQLiteRateLimiter:
+    """Token buckets in the shared SQLite file; falls back to a local limiter if SQLite fails"""
+
+    def __init__(self, limit: int = 3000, window: float = 3600, max_keys: int = 100000,
+                 path: str = DEFAULT_SHARED_CACHE_PATH, prune_every: int = 512,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.path = path
+        self.prune_every = prune_every
+        self.busy_timeout = busy_timeout
+        self._fallback = TokenBucketLimiter(limit, window, max_keys)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._hits = 0
+        self.rejected = 0
+        self.errors = 0
+        self.busy = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; reopened if we find ourselves in a forked child
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rate_limit_updated ON rate_limit (updated_at)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def hit(self, key: str, cost: float = 1.0) -> RateLimitResult:
+        now = time.time()
+        try:
+            conn = self._connection()
+            # IMMEDIATE takes the write lock up front so concurrent workers can't both spend the same token
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_limit WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row is not None else (float(self.limit), now)
+                tokens, result = take_token(tokens, updated_at, now, self.limit, self.window, cost)
+                conn.execute("INSERT OR REPLACE INTO rate_limit (key, tokens, updated_at) VALUES (?, ?, ?)",
+                             (key, tokens, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                self.errors += 1
+                logger.warning(f"Shared rate limiter failed, using per-worker buckets: {e}")
+            else:
+                # Another worker holds the write lock: don't stall the loop waiting for it
+                self.busy += 1
+            return self._fallback.hit(key, cost)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared rate limiter failed, using per-worker buckets: {e}")
+            return self._fallback.hit(key, cost)
+
+        self._hits += 1
+        if self._hits % self.prune_every == 0:
+            self.prune()
+        if not result.allowed:
+            self.rejected += 1
+        return result
+
+    def prune(self):
+        """Drop buckets that have refilled completely, then the least recently used beyond max_keys"""
+        try:
+            conn = self._connection()
+            # A bucket untouched for a whole window is full again, same as having no row
+            conn.execute("DELETE FROM rate_limit WHERE updated_at <= ?", (time.time() - self.window,))
+            conn.execute(
+                "DELETE FROM rate_limit WHERE key IN ("
+                "SELECT key FROM rate_limit ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_keys,)
+            )
+        except sqlite3.Error as e:
+            if "locked" in str(e):
+                self.busy += 1
+                return
+            self.errors += 1
+            logger.warning(f"Shared rate limiter prune failed: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        try:
+            keys = self._connection().execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+        except sqlite3.Error:
+            keys = None
+        return {'backend': 'sqlite', 'keys': keys, 'rejected': self.rejected, 'errors': self.errors,
+                'busy': self.busy, 'local_fallback_keys': len(self._fallback._buckets), 'limit': self.limit, 'window': self.window}
+
+
+def build_rate_limiter(backend: str, limit: int, window: float, max_keys: int = 100000,
+                       path: str = DEFAULT_SHARED_CACHE_PATH, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+    """Shared SQLite limiter for backend="sqlite", otherwise per-process buckets"""
+    if (backend or "").lower() == "sqlite":
+        limiter = SQLiteRateLimiter(limit, window, max_keys, path, busy_timeout=busy_timeout)
+        try:
+            limiter._connection()
+            return limiter
+        except sqlite3.Error as e:
+            logger.warning(f"Shared rate limiter unavailable at {path}, using per-worker buckets: {e}")
+    return TokenBucketLimiter(limit, window, max_keys)
@@ -0,0 +1,96 @@
+# Per-request CPU cost of decoding a grid analysis request and encoding its response
+# Usage: python serialization_benchmark.py [gridstructure.json] [--iterations 2000]
+#
+# "before" is the old path: stdlib json.loads (plus pydantic validation when pydantic is
+# installed), four separate walks over gridStructure (total children, cache key IDs,
+# valid IDs for the result, full texts for the fallback) and a stdlib json.dumps response.
+# "after" is grid_request.decode_grid_request (msgspec/orjson when installed) plus
+# FastJSONResponse rendering. Gzip and zstd rows add decompressing the body.
+import os
+import sys
+import json
+import gzip
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fast_json
+import grid_request
+from fast_json import dumps_bytes
+from grid_request import decode_grid_request
+
+args = sys.argv[1:]
+iterations = 2000
+if "--iterations" in args:
+    position = args.index("--iterations")
+    iterations = int(args[position + 1])
+    del args[position:position + 2]
+path = args[0] if args else os.path.join(os.path.dirname(os.path.abspath(__file__)), "gridstructure.json")
+
+with open(path) as f:
+    grid_structure = json.load(f)
+body = json.dumps({
+    "gridStructure": grid_structure,
+    "currentUrl": "https://www.youtube.com/",
+    "whitelist": ["electronic"],
+    "blacklist": ["music videos", "shorts", "clickbait"],
+    "visitorId": "benchmark"
+}).encode()
+
+try:
+    from pydantic import BaseModel
+
+    class GridAnalysisRequest(BaseModel):
+        gridStructure: dict
+        currentUrl: str
+        whitelist: List[str] = []
+        blacklist: List[str] = []
+        visitorId: str
+except ImportError:
+    GridAnalysisRequest = None
+
+
+def before(raw: bytes):
+    data = json.loads(raw)
+    structure = GridAnalysisRequest(**data).gridStructure if GridAnalysisRequest is not None else data["gridStructure"]
+    grids = structure.get("grids", [])
+    sum(len(grid.get("children", [])) for grid in grids)
+    [[child.get("id"), child.get("text", "")] for grid in grids for child in grid.get("children", [])]
+    ids = [child.get("id") for grid in grids for child in grid.get("children", []) if child.get("id")]
+    {child.get("id"): child.get("text", "") or "" for grid in grids for child in grid.get("children", [])
+     if child.get("id")}
+    return json.dumps({"children_to_remove": ids[::3]}).encode()
+
+
+def after(raw: bytes, encoding=None):
+    request = decode_grid_request(raw, encoding)
+    return dumps_bytes({"children_to_remove": request.child_ids[::3]})
+
+
+def measure(label, function, *function_args):
+    function(*function_args)
+    start = time.process_time()
+    for _ in range(iterations):
+        function(*function_args)
+    per_request = (time.process_time() - start) / iterations
+    print(f"{label:<28} {per_request * 1e6:9.1f} us/request")
+    return per_request
+
+
+print(f"body {len(body)} bytes, {iterations} iterations")
+print(f"orjson: {fast_json.orjson is not None}  msgspec: {grid_request.msgspec is not None}  "
+      f"zstandard: {grid_request.zstandard is not None}  pydantic: {GridAnalysisRequest is not None}")
+
+baseline = measure("before (json)", before, body)
+fast = measure("after (identity)", after, body)
+
+gzipped = gzip.compress(body)
+print(f"gzip body {len(gzipped)} bytes ({len(gzipped) / len(body):.0%})")
+measure("after (gzip)", after, gzipped, "gzip")
+if grid_request.zstandard is not None:
+    zstd_body = grid_request.zstandard.ZstdCompressor(level=3).compress(body)
+    print(f"zstd body {len(zstd_body)} bytes ({len(zstd_body) / len(body):.0%})")
+    measure("after (zstd)", after, zstd_body, "zstd")
+
+print(f"speedup (identity): {baseline / fast:.1f}x")
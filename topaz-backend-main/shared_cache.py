@@ -0,0 +1,266 @@
+"""
+Host-local cache tier shared by every gunicorn worker.
+
+SQLiteCache stores JSON-encoded values in a WAL-mode SQLite file, so all
+workers on the host read and write the same entries without a network hop.
+TieredCache puts a worker's in-process LRUCache (L1) in front of it (L2).
+Both expose the same get/set/delete/stats interface as cache.LRUCache.
+
+Lookups run on the event loop, so the SQLite busy timeout is kept to a few
+milliseconds: when another worker holds the write lock for longer, a read is
+answered as an L1-only miss and a write only lands in L1, instead of
+stalling every request on this worker.
+"""
+
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARED_CACHE_PATH = os.path.join(tempfile.gettempdir(), "topaz-cache.sqlite3")
+DEFAULT_BUSY_TIMEOUT = 0.02
+
+
+class SQLiteCache:
+    """SQLite-WAL backed key/value store with TTL and a byte budget"""
+
+    def __init__(self,
+                 path: str = DEFAULT_SHARED_CACHE_PATH,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 max_age: float = 300,
+                 name: str = "cache",
+                 prune_every: int = 256,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.name = name
+        self.table = "cache_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+        self.prune_every = prune_every
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self.busy = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (the event loop and worker threads never share a transaction);
+        # reopened if we find ourselves in a forked child
+        if getattr(self._local, "conn", None) is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _failed(self, action: str, error: sqlite3.Error):
+        # Lock contention is expected under load and only costs this lookup its L2 tier
+        if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+            self.busy += 1
+            logger.debug(f"Shared cache {action} skipped, database busy")
+            return
+        self.errors += 1
+        logger.warning(f"Shared cache {action} failed: {error}")
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, expires_at) or None"""
+        try:
+            row = self._connection().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return None
+
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: Any, max_age: Optional[float] = None):
+        encoded = json.dumps(value, separators=(',', ':'))
+        size = len(key) + len(encoded)
+        ttl = max_age if max_age is not None else self.max_age
+        try:
+            self._connection().execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, size) VALUES (?, ?, ?, ?)",
+                (key, encoded, time.time() + ttl, size)
+            )
+        except sqlite3.Error as e:
+            self._failed("write", e)
+            return
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def set_many(self, items: List[Tuple[str, Any]], max_age: Optional[float] = None, busy_timeout: float = 1.0):
+        """Write many entries in one transaction; meant for worker threads, so it may wait busy_timeout"""
+        if not items:
+            return
+        expires_at = time.time() + (max_age if max_age is not None else self.max_age)
+        rows = []
+        for key, value in items:
+            encoded = json.dumps(value, separators=(',', ':'))
+            rows.append((key, encoded, expires_at, len(key) + len(encoded)))
+        conn = None
+        try:
+            conn = self._connection()
+            conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, size) VALUES (?, ?, ?, ?)", rows
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            self._failed("batch write", e)
+            return
+        finally:
+            if conn is not None:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+
+        writes, self._writes = self._writes, self._writes + len(rows)
+        if writes // self.prune_every != self._writes // self.prune_every:
+            self.prune()
+
+    def delete(self, key: str):
+        try:
+            self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def prune(self):
+        """Drop expired rows, then the soonest-to-expire rows until under the byte budget"""
+        try:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            # Trim to 90% so we don't prune again on the very next write
+            excess = total - int(self.max_bytes * 0.9)
+            removed = 0
+            doomed = []
+            for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY expires_at"):
+                doomed.append((key,))
+                removed += size
+                if removed >= excess:
+                    break
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+            self.evictions += len(doomed)
+        except sqlite3.Error as e:
+            self._failed("prune", e)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, total = self._connection().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'busy': self.busy,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class TieredCache:
+    """Per-worker L1 LRUCache in front of a host-shared L2"""
+
+    def __init__(self, l1: LRUCache, l2: SQLiteCache):
+        self.l1 = l1
+        self.l2 = l2
+
+    def __len__(self):
+        return len(self.l1)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+
+        entry = self.l2.get_entry(key)
+        if entry is None:
+            return None
+
+        # Promote into L1 without outliving the shared copy
+        value, expires_at = entry
+        self.l1.set(key, value, max_age=min(self.l1.max_age, expires_at - time.time()))
+        return value
+
+    def set(self, key: str, value: Any, max_age: Optional[float] = None):
+        self.l1.set(key, value, max_age=max_age)
+        self.l2.set(key, value, max_age=max_age)
+
+    async def set_many(self, items: List[Tuple[str, Any]], max_age: Optional[float] = None):
+        """Visible in this worker's L1 at once; the shared copy is one transaction in a worker thread"""
+        for key, value in items:
+            self.l1.set(key, value, max_age=max_age)
+        await asyncio.to_thread(self.l2.set_many, items, max_age)
+
+    def delete(self, key: str):
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'l1': self.l1.stats(),
+            'l2': self.l2.stats()
+        }
+
+
+def build_cache(backend: str, l1: LRUCache, path: str = DEFAULT_SHARED_CACHE_PATH,
+                max_bytes: int = 256 * 1024 * 1024, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+    """Return l1 alone for the "memory" backend, or l1 in front of a shared SQLite tier"""
+    if backend == "memory":
+        return l1
+    if backend != "sqlite":
+        logger.warning(f"Unknown cache backend '{backend}', using in-process memory only")
+        return l1
+
+    l2 = SQLiteCache(path=path, max_bytes=max_bytes, max_age=l1.max_age, name=l1.name,
+                     busy_timeout=busy_timeout)
+    try:
+        l2._connection()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache unavailable at {path} ({e}), using in-process memory only")
+        return l1
+    return TieredCache(l1, l2)
@@ -0,0 +1,97 @@
+# Evaluate the SimHash near-duplicate index on grid samples
+# Usage: python simhash_eval.py [gridstructure.json ...] [--distance N] [--variants N]
+#
+# Hit rate: re-rendered copies of each child (different view counts, ages, durations)
+# should find the original. False matches: pairs of distinct children within the distance.
+# Rates come with 95% Wilson intervals. The bundled gridstructure.json has only 20 children,
+# which is far too few to pin either rate down (re-renders of one child are not independent,
+# so the hit-rate interval is optimistic); pass grid structures captured from real feeds.
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+
+from simhash_index import SimHashIndex, hamming_distance
+
+args = sys.argv[1:]
+distance = 3
+if "--distance" in args:
+    position = args.index("--distance")
+    distance = int(args[position + 1])
+    del args[position:position + 2]
+variants_per_child = 20
+if "--variants" in args:
+    position = args.index("--variants")
+    variants_per_child = int(args[position + 1])
+    del args[position:position + 2]
+paths = args or [os.path.join(os.path.dirname(__file__), "gridstructure.json")]
+
+texts = []
+for path in paths:
+    with open(path) as f:
+        grid_structure = json.load(f)
+    for grid in grid_structure.get("grids", []):
+        texts.extend(child.get("text", "") for child in grid.get("children", []) if child.get("text"))
+texts = list(dict.fromkeys(texts))
+
+
+def wilson(successes: int, trials: int, z: float = 1.96) -> str:
+    """successes/trials as a rate with its 95% Wilson score interval"""
+    if not trials:
+        return "n/a"
+    rate = successes / trials
+    centre = (rate + z * z / (2 * trials)) / (1 + z * z / trials)
+    margin = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / (1 + z * z / trials)
+    return f"{rate:.1%} [{max(0.0, centre - margin):.1%}, {min(1.0, centre + margin):.1%}]"
+
+random.seed(7)
+_NUMBER_RE = re.compile(r"\d+(\.\d+)?")
+_AGE_RE = re.compile(r"\b(second|minute|hour|day|week|month|year)s?\b")
+
+
+def rerender(text: str) -> str:
+    """The same item as a later page load would show it"""
+    text = _NUMBER_RE.sub(lambda m: str(random.randint(1, 999)), text)
+    text = _AGE_RE.sub(lambda m: random.choice(["day", "weeks", "month", "years"]), text)
+    if random.random() < 0.5:
+        text = ("Now playing\n" + text) if "Now playing" not in text else text.replace("Now playing\n", "")
+    return text
+
+
+index = SimHashIndex(max_distance=distance)
+start = time.time()
+for position, text in enumerate(texts):
+    # Alternate verdicts so a false match is visible as a wrong verdict too
+    index.add("eval", text, position % 2 == 0)
+indexed = len(index)
+add_ms = (time.time() - start) * 1000 / max(1, len(texts))
+
+# Near duplicates: every re-render should resolve to its original's verdict
+hits = wrong = 0
+variants = 0
+start = time.time()
+for position, text in enumerate(texts):
+    for _ in range(variants_per_child):
+        variants += 1
+        verdict = index.lookup("eval", rerender(text))
+        if verdict is not None:
+            hits += 1
+            wrong += verdict != (position % 2 == 0)
+lookup_ms = (time.time() - start) * 1000 / max(1, variants)
+
+# Distinct items: every pair of indexable children close enough to share a verdict is a false match
+# (banding guarantees the index finds every pair within the distance, so this is what lookup would do)
+fingerprints = [fingerprint for fingerprint in map(index.fingerprint, texts) if fingerprint is not None]
+pairs = false_matches = 0
+for position, fingerprint in enumerate(fingerprints):
+    for other in fingerprints[position + 1:]:
+        pairs += 1
+        false_matches += hamming_distance(fingerprint, other) <= distance
+
+print(f"children: {len(texts)} ({indexed} long enough to index), max distance: {distance}")
+print(f"near-duplicate hit rate: {hits}/{variants} {wilson(hits, variants)}, wrong verdicts: {wrong}")
+print(f"false matches between distinct children: {false_matches}/{pairs} pairs {wilson(false_matches, pairs)}")
+print(f"add: {add_ms:.3f} ms/child, lookup: {lookup_ms:.3f} ms/child")
@@ -0,0 +1,214 @@
+"""
+Near-duplicate verdict lookup with 64-bit SimHash and LSH banding.
+
+Feed items are re-rendered with changing counters ("1.9M views · 2 months
+ago"), so exact text hashes rarely repeat. A child whose SimHash is within a
+small Hamming distance of an already-judged child for the same profile reuses
+that verdict instead of going to the LLM.
+
+Fingerprints are split into bands; two fingerprints within max_distance bits
+share at least one whole band when bands > max_distance (pigeonhole), so a
+lookup only compares against the items in its own band buckets.
+
+Fingerprinting runs on the request path for every child, so the 64 per-bit
+votes are summed with NumPy when it is installed (unpacked hash bits, one
+column per bit); the pure-Python loop gives the same fingerprints without it.
+"""
+
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_DIGITS_RE = re.compile(r"\d+")
+# Feed metadata that differs between renders of the same item and says nothing about its content
+_BOILERPLATE_WORDS = {
+    "num", "views", "view", "ago", "now", "playing", "watching", "streamed",
+    "second", "seconds", "minute", "minutes", "hour", "hours", "day", "days",
+    "week", "weeks", "month", "months", "year", "years", "k", "m", "b",
+}
+
+
+def simhash_tokens(text: str) -> List[str]:
+    """Lowercased words with punctuation, numbers and feed boilerplate removed"""
+    text = _PUNCTUATION_RE.sub(" ", (text or "").lower())
+    text = _DIGITS_RE.sub(" num ", text)
+    return [word for word in _WHITESPACE_RE.split(text)
+            if word and word not in _BOILERPLATE_WORDS]
+
+
+def _digest64(feature: str) -> bytes:
+    return hashlib.blake2b(feature.encode(), digest_size=8).digest()
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(_digest64(feature), "big")
+
+
+def simhash(text: str, shingle_size: int = 2) -> Optional[int]:
+    """64-bit SimHash over word shingles, or None when there is too little text to fingerprint"""
+    return simhash_words(simhash_tokens(text), shingle_size)
+
+
+def simhash_words(words: List[str], shingle_size: int = 2) -> Optional[int]:
+    if not words:
+        return None
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    # Single words too, so short titles still get enough votes per bit
+    features = shingles + words
+
+    if np is not None:
+        # Row per feature, column per bit (most significant first, as the big-endian digest unpacks)
+        bits = np.unpackbits(np.frombuffer(b"".join(map(_digest64, features)), dtype=np.uint8).reshape(-1, 8),
+                             axis=1)
+        # A bit is set when more features vote for it than against: ones > len / 2
+        majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(features)
+        return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+    votes = [0] * 64
+    for feature in features:
+        value = _hash64(feature)
+        for bit in range(64):
+            votes[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit in range(64):
+        if votes[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """Bounded, TTL'd index of (profile, fingerprint) -> hide verdict with banded candidate lookup"""
+
+    def __init__(self, max_distance: int = 3, bands: Optional[int] = None, max_entries: int = 50000,
+                 max_age: float = 3600, min_words: int = 3):
+        bands = bands or max_distance + 1
+        if bands <= max_distance:
+            logger.warning(f"SimHash index with {bands} bands can miss matches at distance {max_distance}")
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # Very short texts ("Mix", "Shorts") collide too easily to share verdicts
+        self.min_words = min_words
+
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[bool, float]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, int], Set[int]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.ambiguous = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, profile: str, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield (profile, band, (fingerprint >> (band * self.band_bits)) & mask)
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        words = simhash_tokens(text)
+        if len(words) < self.min_words:
+            return None
+        return simhash_words(words)
+
+    def add(self, profile: str, text: str, hide: bool):
+        fingerprint = self.fingerprint(text)
+        if fingerprint is None:
+            return
+        key = (profile, fingerprint)
+        if key not in self._entries:
+            for band_key in self._band_keys(profile, fingerprint):
+                self._buckets.setdefault(band_key, set()).add(fingerprint)
+        self._entries[key] = (hide, time.time() + self.max_age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[str, int]):
+        profile, fingerprint = key
+        self._entries.pop(key, None)
+        for band_key in self._band_keys(profile, fingerprint):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(fingerprint)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def nearest(self, profile: str, fingerprint: int) -> List[Tuple[int, int]]:
+        """(distance, fingerprint) of indexed items within max_distance, closest first"""
+        candidates: Set[int] = set()
+        for band_key in self._band_keys(profile, fingerprint):
+            candidates.update(self._buckets.get(band_key, ()))
+        matches = []
+        for candidate in candidates:
+            distance = hamming_distance(fingerprint, candidate)
+            if distance <= self.max_distance:
+                matches.append((distance, candidate))
+        matches.sort()
+        return matches
+
+    def lookup(self, profile: str, text: str) -> Optional[bool]:
+        """Verdict of the nearest live item within max_distance, or None"""
+        fingerprint = self.fingerprint(text)
+        if fingerprint is None:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        verdicts = {}
+        for distance, candidate in self.nearest(profile, fingerprint):
+            key = (profile, candidate)
+            hide, expires_at = self._entries[key]
+            if expires_at <= now:
+                self._remove(key)
+                continue
+            verdicts.setdefault(distance, set()).add(hide)
+
+        if not verdicts:
+            self.misses += 1
+            return None
+
+        closest = verdicts[min(verdicts)]
+        if len(closest) > 1:
+            # Equally close items disagree: let the LLM decide
+            self.ambiguous += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return next(iter(closest))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'buckets': len(self._buckets),
+            'hits': self.hits,
+            'misses': self.misses,
+            'ambiguous': self.ambiguous,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,52 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+The first caller for a key starts the work; concurrent callers with the same
+key await the same task and share its result or its exception.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Per-worker registry of in-flight tasks keyed by request key"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            # Run as its own task so a disconnecting leader doesn't cancel the followers' work
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"🔗 Coalesced duplicate in-flight request for key: {str(key)[:8]}...")
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every awaiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._inflight),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,145 @@
+"""
+Cold-start bookkeeping: phase timings and lazily constructed clients.
+
+Every gunicorn worker imports main on boot, so anything main builds at import
+time delays the worker accepting traffic. StartupTimer records how long each
+import/initialization phase took (logged once startup completes and shown on
+/health). LazyClient defers building an expensive client - and importing its
+SDK - until the first call that needs it, or until warm() runs it in a
+background thread once the worker is already serving.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Wall time between successive mark() calls, starting when the timer is created"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+        self._last = now
+        return elapsed
+
+    def record(self, phase: str, seconds: float):
+        """Add a phase timed elsewhere (e.g. a background warm-up) without moving the mark"""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        return f"{phases} (total {self.total * 1000:.0f}ms)"
+
+    def stats(self) -> dict:
+        return {
+            "total_ms": round(self.total * 1000, 1),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()}
+        }
+
+
+class LazyClient:
+    """
+    Builds a client on first use; attribute access is forwarded to it.
+
+    Truthiness reports whether the client is usable without building it: it
+    is configured (factory given) and not backing off after a failed build, so
+    `if not client:` checks stay cheap and turn reads away while the backend
+    is unreachable. Paths that can defer their work (e.g. write-behind
+    ingestion) should check `configured` instead. A failed build is not retried until its backoff
+    (retry_interval, doubling up to max_retry_interval) has passed.
+    """
+
+    def __init__(self, name: str, factory: Optional[Callable[[], Any]],
+                 retry_interval: float = 30.0, max_retry_interval: float = 600.0):
+        self._name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._backoff = retry_interval
+        self._retry_at = 0.0
+        self.failures = 0
+        self.init_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.configured and (self._client is not None or time.monotonic() >= self._retry_at)
+
+    @property
+    def configured(self) -> bool:
+        return self._factory is not None
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        if self._client is not None:
+            return self._client
+        if self._factory is None:
+            raise RuntimeError(f"{self._name} is not configured")
+        with self._lock:
+            if self._client is None:
+                if time.monotonic() < self._retry_at:
+                    raise RuntimeError(f"{self._name} unavailable: {self.error}")
+                start = time.perf_counter()
+                try:
+                    self._client = self._factory()
+                except Exception as e:
+                    self.failures += 1
+                    self.error = str(e)
+                    self._retry_at = time.monotonic() + self._backoff
+                    logger.warning(f"Failed to initialize {self._name} client, retrying in {self._backoff:.0f}s: {e}")
+                    self._backoff = min(self._backoff * 2, self.max_retry_interval)
+                    raise
+                self.init_seconds = time.perf_counter() - start
+                self.error = None
+                self._backoff = self.retry_interval
+                logger.info(f"🔌 {self._name} client initialized in {self.init_seconds * 1000:.0f}ms")
+        return self._client
+
+    def __getattr__(self, attribute: str):
+        # Only reached for attributes LazyClient itself doesn't define
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        return getattr(self.get(), attribute)
+
+    async def warm(self, delay: float = 0.0) -> bool:
+        """Build the client in a worker thread after delay seconds, retrying after each backoff until it works"""
+        if not self.configured:
+            return False
+        await asyncio.sleep(delay)
+        while not self.ready:
+            await asyncio.sleep(max(0.0, self._retry_at - time.monotonic()))
+            try:
+                await asyncio.to_thread(self.get)
+            except Exception:
+                pass
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.configured,
+            "available": bool(self),
+            "ready": self.ready,
+            "init_ms": round(self.init_seconds * 1000, 1) if self.init_seconds is not None else None,
+            "failures": self.failures,
+            "retry_in": round(max(0.0, self._retry_at - time.monotonic()), 1) if not self.ready else None,
+            "error": self.error
+        }
@@ -0,0 +1,109 @@
+# Cold-start report and regression budget for importing main (what every gunicorn worker does on boot)
+# Usage: python startup_budget.py [--budget 2.0] [--runs 3] [--top 15]
+#        python -m pytest test_startup_budget.py
+#
+# Each run imports main in a fresh interpreter with -X importtime and prints the slowest top-level
+# imports (cumulative, as `python -X importtime` reports them) plus main's own startup phases.
+# Exits 1 when the fastest run is over budget (seconds; STARTUP_BUDGET_SECONDS overrides the
+# default), so CI or a deploy script can fail on a cold-start regression. test_startup_budget.py
+# asserts the same budget under pytest and is skipped when main's dependencies are missing.
+import os
+import sys
+import json
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+PROBE = (
+    "import time, json; start = time.perf_counter(); import main; "
+    "print(json.dumps({'wall': time.perf_counter() - start, 'phases': main.startup_timer.stats()}))"
+)
+
+
+class ProbeError(RuntimeError):
+    """Importing main failed in the child interpreter"""
+
+    def __init__(self, stderr: str, returncode: int):
+        super().__init__(f"importing main failed (exit {returncode})")
+        self.stderr = stderr
+
+
+def parse_importtime(stderr: str):
+    """(module, self seconds, cumulative seconds, depth) for every line -X importtime wrote"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return rows
+
+
+def run_once():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=HERE,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ProbeError(result.stderr, result.returncode)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe, parse_importtime(result.stderr)
+
+
+def main_imports(imports):
+    # -X importtime lists children before their parent, so main's direct imports are the depth-1 rows
+    # between the previous top-level import and main's own row
+    direct, pending = [], []
+    for row in imports:
+        if row[3] == 1:
+            pending.append(row)
+        elif row[3] == 0:
+            if row[0] == "main":
+                direct = pending
+            pending = []
+    return direct
+
+
+def measure(runs: int):
+    """Wall times of every run, plus the probe and import rows of the fastest one"""
+    samples = [run_once() for _ in range(runs)]
+    walls = [probe["wall"] for probe, _ in samples]
+    probe, imports = min(samples, key=lambda sample: sample[0]["wall"])
+    return walls, probe, imports
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default):
+        if name in args:
+            position = args.index(name)
+            value = args[position + 1]
+            del args[position:position + 2]
+            return value
+        return default
+
+    budget = float(option("--budget", DEFAULT_BUDGET))
+    runs = int(option("--runs", "3"))
+    top = int(option("--top", "15"))
+
+    try:
+        walls, probe, imports = measure(runs)
+    except ProbeError as e:
+        sys.stderr.write(e.stderr)
+        sys.exit(str(e))
+
+    print(f"slowest imports (cumulative, fastest of {runs} runs):")
+    for name, self_time, cumulative, _ in sorted(main_imports(imports), key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative * 1000:8.1f} ms  {name}")
+
+    print("main startup phases:")
+    for name, milliseconds in probe["phases"]["phases_ms"].items():
+        print(f"  {milliseconds:8.1f} ms  {name}")
+
+    fastest = min(walls)
+    print(f"import main: {fastest:.3f}s fastest, {max(walls):.3f}s slowest, budget {budget:.3f}s")
+    if fastest > budget:
+        print(f"❌ over budget by {fastest - budget:.3f}s")
+        sys.exit(1)
+    print("✅ within budget")
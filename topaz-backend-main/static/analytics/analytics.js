@@ -0,0 +1,122 @@
+const sessionId = new URLSearchParams(window.location.search).get('session');
+
+async function loadAnalytics() {
+    try {
+        if (!sessionId) {
+            document.getElementById('content').innerHTML = `
+                <div class="error">
+                    No session ID provided. Please access analytics through the extension.
+                </div>
+            `;
+            return;
+        }
+
+        const response = await fetch(`/api/analytics/${encodeURIComponent(sessionId)}`);
+        const result = await response.json();
+
+        if (!result.success) {
+            throw new Error(result.error || 'Failed to load analytics');
+        }
+
+        const data = result.data;
+        renderAnalytics(data);
+
+    } catch (error) {
+        console.error('Error loading analytics:', error);
+        document.getElementById('content').innerHTML = `
+            <div class="error">
+                Failed to load analytics: ${error.message}
+            </div>
+        `;
+    }
+}
+
+function renderAnalytics(data) {
+    const metrics = data.metrics || {};
+    const summary = data.summary || {};
+    const sessionInfo = data.session_info || {};
+    const blockedItems = data.blocked_items || [];
+    const totalRecords = summary.total_records || blockedItems.length;
+
+    // Top sites are aggregated server-side over the whole history
+    const sortedSites = (summary.top_sites || []).map(site => [site.hostname || 'Unknown', site.count || 0]);
+
+    document.getElementById('content').innerHTML = `
+        <div class="stats-grid">
+            <div class="stat-card">
+                <div class="stat-number">${metrics.total_blocked || 0}</div>
+                <div class="stat-label">Total Blocked</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-number">${metrics.blocked_today || 0}</div>
+                <div class="stat-label">Blocked Today</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-number">${summary.unique_sites || 0}</div>
+                <div class="stat-label">Sites Protected</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-number">${totalRecords}</div>
+                <div class="stat-label">Filter Events</div>
+            </div>
+        </div>
+
+        <div class="session-info">
+            <h2 class="section-title">Session Information</h2>
+            <div class="info-row">
+                <span class="info-label">Session ID:</span>
+                <span class="info-value">${data.session_id.substring(0, 8)}...</span>
+            </div>
+            <div class="info-row">
+                <span class="info-label">Extension Version:</span>
+                <span class="info-value">${sessionInfo.extension_version || 'Unknown'}</span>
+            </div>
+            <div class="info-row">
+                <span class="info-label">Created:</span>
+                <span class="info-value">${new Date(sessionInfo.created_at || Date.now()).toLocaleDateString()}</span>
+            </div>
+            <div class="info-row">
+                <span class="info-label">First Install:</span>
+                <span class="info-value">${sessionInfo.first_install ? 'Yes' : 'No'}</span>
+            </div>
+        </div>
+
+        <div class="activity-section">
+            <h2 class="section-title">Top Sites by Blocked Content</h2>
+            ${sortedSites.length > 0 ? sortedSites.map(([site, count]) => `
+                <div class="activity-item">
+                    <span class="activity-text">${site}</span>
+                    <span class="activity-count">${count} items</span>
+                </div>
+            `).join('') : '<div class="activity-text">No data available</div>'}
+        </div>
+
+        <div class="activity-section">
+            <h2 class="section-title">Recent Blocked Items (${blockedItems.length} of ${totalRecords})</h2>
+            <div style="max-height: 400px; overflow-y: auto; border: 1px solid #333; border-radius: 8px; padding: 10px;">
+            ${blockedItems.map(item => `
+                <div class="activity-item">
+                    <div class="activity-text">
+                        <div style="font-weight: 500; margin-bottom: 4px;">
+                            ${new Date(item.timestamp).toLocaleString()} - ${item.hostname || 'Unknown'}
+                        </div>
+                        ${item.blocked_items && item.blocked_items.length > 0 ? `
+                            <div style="font-size: 0.9em; color: #999; margin-left: 20px;">
+                                ${'• ' + item.blocked_items.slice(0, 3).map(blockedItem =>
+                                    typeof blockedItem === 'string' ? blockedItem :
+                                    (blockedItem.text || blockedItem.title || 'Blocked content')
+                                ).join('<br>• ')}
+                                ${item.blocked_items.length > 3 ? `<br>• ...and ${item.blocked_items.length - 3} more` : ''}
+                            </div>
+                        ` : ''}
+                    </div>
+                    <span class="activity-count">${item.count} blocked</span>
+                </div>
+            `).join('')}
+            </div>
+        </div>
+    `;
+}
+
+// Load analytics on page load
+loadAnalytics();
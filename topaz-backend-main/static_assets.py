@@ -0,0 +1,117 @@
+"""
+Precompiled static assets with strong ETags and pre-compressed variants.
+
+Each asset is read, hashed and compressed (gzip, plus brotli when the brotli
+package is installed) once at startup; a request only picks the variant its
+Accept-Encoding allows and answers If-None-Match with a 304. Assets with a
+content hash in their URL are served with a year-long immutable
+Cache-Control, while pages that keep a fixed URL are revalidated against
+their ETag on every load.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+
+
+class StaticAsset:
+    """One in-memory asset with its identity, gzip and brotli encodings"""
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str = REVALIDATE):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:32]}"'
+        self.variants: Dict[str, bytes] = {"identity": body}
+        self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=11)
+        # Only keep encodings that actually save bytes
+        for encoding in [e for e in self.variants if e != "identity"]:
+            if len(self.variants[encoding]) >= len(body):
+                del self.variants[encoding]
+
+    def _encoding_for(self, accept_encoding: str) -> str:
+        accepted = set()
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            if name and not re.search(r"q=0(\.0*)?$", params.replace(" ", "")):
+                accepted.add(name.lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match == "*":
+            return Response(status_code=304, headers=headers)
+
+        encoding = self._encoding_for(request.headers.get("accept-encoding", ""))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variants[encoding], media_type=self.media_type, headers=headers)
+
+
+class AssetBundle:
+    """A page plus its CSS/JS, served under content-hashed URLs below prefix"""
+
+    def __init__(self, directory: str, page: str, prefix: str):
+        self.directory = directory
+        self.prefix = prefix.rstrip("/")
+        self.assets: Dict[str, StaticAsset] = {}
+        self.page: Optional[StaticAsset] = None
+        self._load(page)
+
+    def _load(self, page: str):
+        urls = {}
+        for name in sorted(os.listdir(self.directory)):
+            stem, extension = os.path.splitext(name)
+            if name == page or extension not in MEDIA_TYPES:
+                continue
+            with open(os.path.join(self.directory, name), "rb") as f:
+                asset = StaticAsset(f.read(), MEDIA_TYPES[extension], IMMUTABLE)
+            hashed = f"{stem}.{asset.digest[:12]}{extension}"
+            self.assets[hashed] = asset
+            urls[name] = f"{self.prefix}/{hashed}"
+
+        # The page keeps a fixed URL, so it references the hashed names and is revalidated instead
+        with open(os.path.join(self.directory, page), encoding="utf-8") as f:
+            html = f.read()
+        for name, url in urls.items():
+            html = html.replace("{{" + name + "}}", url)
+        self.page = StaticAsset(html.encode("utf-8"), MEDIA_TYPES[".html"], REVALIDATE)
+
+        sizes = ", ".join(f"{name} {len(asset.variants['identity'])}B->"
+                          f"{min(len(v) for v in asset.variants.values())}B"
+                          for name, asset in self.assets.items())
+        logger.info(f"📦 Precompiled {self.prefix}: {sizes}")
+
+    def asset(self, name: str) -> Optional[StaticAsset]:
+        return self.assets.get(name)
@@ -0,0 +1,68 @@
+"""
+Incremental parsing of child IDs out of a streamed LLM completion.
+
+Tokens arrive in arbitrary fragments ("g1", "c1", "2\n"), so an ID is only
+emitted once the character after it shows it cannot grow any further.
+"""
+
+import re
+from typing import Iterable, List, Optional, Set
+
+from fast_json import dumps
+
+_CHILD_ID_RE = re.compile(r"g\d+c\d+")
+
+
+class ChildIdStreamParser:
+    """Feed text deltas in, get newly completed valid child IDs out (deduplicated)"""
+
+    def __init__(self, valid_ids: Iterable[str]):
+        self.valid: Set[str] = set(valid_ids)
+        self.seen: Set[str] = set()
+        self.emitted: List[str] = []
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text or ""
+        return self._drain(final=False)
+
+    def close(self) -> List[str]:
+        """Flush whatever is left once the stream has ended"""
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[str]:
+        found = []
+        consumed = 0
+        for match in _CHILD_ID_RE.finditer(self._buffer):
+            if match.end() == len(self._buffer) and not final:
+                # "g1c1" may still become "g1c12" with the next token
+                break
+            consumed = match.end()
+            found.extend(self._accept(match.group()))
+
+        if final:
+            self._buffer = ""
+        else:
+            # Keep only a tail that could still be the start of an ID
+            rest = self._buffer[consumed:]
+            start = rest.rfind("g")
+            self._buffer = rest[start:] if start != -1 else ""
+        return found
+
+    def _accept(self, child_id: str) -> List[str]:
+        if child_id in self.valid and child_id not in self.seen:
+            self.seen.add(child_id)
+            self.emitted.append(child_id)
+            return [child_id]
+        return []
+
+
+def ndjson_line(event: dict) -> str:
+    return dumps(event) + "\n"
+
+
+def hide_event(child_id: str, source: Optional[str] = None) -> str:
+    event = {"type": "hide", "id": child_id, "grid": child_id.split('c')[0]}
+    if source:
+        event["source"] = source
+    return ndjson_line(event)
@@ -0,0 +1,70 @@
+import pytest
+
+import analytics
+
+ROWS = [{"id": 2, "count": 3, "hostname": "www.youtube.com"}, {"id": 1, "count": 1, "hostname": ""}]
+
+
+class APIError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeQuery:
+    def __init__(self, result):
+        self.result = result
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return type("Response", (), {"data": self.result})()
+
+
+class FakeClient:
+    def __init__(self, rpc_result):
+        self.rpc_result = rpc_result
+        self.rpc_calls = 0
+
+    def rpc(self, name, params):
+        self.rpc_calls += 1
+        return FakeQuery(self.rpc_result)
+
+    def table(self, name):
+        return FakeQuery(ROWS)
+
+
+@pytest.fixture(autouse=True)
+def fresh_rpc_state(monkeypatch):
+    monkeypatch.setattr(analytics, "_summary_rpc_retry_at", 0.0)
+
+
+def test_summary_from_rpc():
+    client = FakeClient({"total_records": 2, "total_blocked": 4, "unique_sites": 1, "top_sites": []})
+    assert analytics._summary(client, "session")["total_blocked"] == 4
+
+
+@pytest.mark.parametrize("error", [
+    APIError("PGRST202", "Could not find the function public.blocked_items_summary"),
+    Exception("{'code': '42883', 'message': 'function blocked_items_summary(text) does not exist'}"),
+])
+def test_missing_function_is_skipped_until_retry(error, monkeypatch):
+    client = FakeClient(error)
+    assert analytics._summary(client, "session")["total_blocked"] == 4
+    analytics._summary(client, "session")
+    assert client.rpc_calls == 1
+
+    monkeypatch.setattr(analytics, "_summary_rpc_retry_at", 0.0)
+    analytics._summary(client, "session")
+    assert client.rpc_calls == 2
+
+
+def test_transient_error_falls_back_for_that_request_only():
+    client = FakeClient(APIError("57014", "canceling statement due to statement timeout"))
+    summary = analytics._summary(client, "session")
+    assert summary["total_records"] == 2 and summary["unique_sites"] == 1
+    analytics._summary(client, "session")
+    assert client.rpc_calls == 2
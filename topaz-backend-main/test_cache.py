@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the cache module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def fixed_size(key, value):
+    return 10
+
+
+def test_entry_expires_after_its_ttl(clock):
+    lru = LRUCache(max_age=60, sizeof=fixed_size)
+    lru.set("a", 1)
+    lru.set("b", 2, max_age=5)
+    clock.value += 5
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    clock.value += 55
+    assert lru.get("a") is None
+    assert lru.stats()["expirations"] == 2
+    assert len(lru) == 0 and lru.bytes == 0
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    lru = LRUCache(max_bytes=30, sizeof=fixed_size)
+    for key in "abc":
+        lru.set(key, key)
+    assert lru.get("a") == "a"  # b is now the coldest
+    lru.set("d", "d")
+    assert lru.get("b") is None
+    assert [lru.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert lru.bytes == 30 and lru.evictions == 1
+
+
+def test_expired_entries_go_before_live_ones(clock):
+    lru = LRUCache(max_bytes=30, sizeof=fixed_size)
+    lru.set("short", 1, max_age=1)
+    lru.set("b", 2)
+    lru.set("c", 3)
+    clock.value += 2
+    lru.set("d", 4)
+    assert lru.evictions == 0 and lru.expirations == 1
+    assert [lru.get(key) for key in "bcd"] == [2, 3, 4]
+
+
+def test_oversized_entry_is_not_cached(clock):
+    lru = LRUCache(max_bytes=30, sizeof=lambda key, value: len(value))
+    lru.set("small", "x" * 10)
+    lru.set("huge", "x" * 31)
+    assert lru.get("huge") is None
+    assert lru.get("small") == "x" * 10
+
+
+def test_replacing_a_key_keeps_the_byte_count_exact(clock):
+    lru = LRUCache(sizeof=lambda key, value: len(value))
+    lru.set("a", "x" * 10)
+    lru.set("a", "x" * 4)
+    assert lru.bytes == 4 and len(lru) == 1
+    lru.delete("a")
+    assert lru.bytes == 0
+
+
+def test_max_entries(clock):
+    lru = LRUCache(max_entries=2, sizeof=fixed_size)
+    for key in "abc":
+        lru.set(key, key)
+    assert lru.get("a") is None and len(lru) == 2
+
+
+def test_estimate_size_counts_key_value_and_overhead():
+    assert cache.estimate_size("key", {"a": 1}) == len("key") + len('{"a":1}') + cache.ENTRY_OVERHEAD_BYTES
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the circuit_breaker module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def tripped(clock, **options):
+    breaker = CircuitBreaker(window=30, min_calls=4, error_rate=0.5, open_for=15, **options)
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_at_the_error_rate_once_there_are_enough_calls(clock):
+    breaker = CircuitBreaker(window=30, min_calls=4, error_rate=0.5)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED  # 3 calls: not enough to judge
+    breaker.record_success()
+    assert breaker.state == OPEN  # 3/4 failed
+    assert not breaker.allow() and breaker.rejected == 1
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = CircuitBreaker(window=30, min_calls=4, error_rate=0.5)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.value += 31
+    for _ in range(3):
+        breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 4 and breaker.stats()["window_errors"] == 1
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = tripped(clock)
+    clock.value += 14
+    assert not breaker.available() and not breaker.allow()
+    clock.value += 1
+    assert breaker.available()
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.available() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = tripped(clock)
+    clock.value += 15
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.times_opened == 2
+    assert not breaker.allow()
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = tripped(clock, probes=1)
+    clock.value += 15
+    assert breaker.allow()
+    # e.g. cancelled as a hedge loser: no outcome, but another probe may go
+    breaker.release()
+    assert breaker.state == HALF_OPEN and breaker.allow()
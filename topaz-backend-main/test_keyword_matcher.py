@@ -0,0 +1,52 @@
+import random
+
+from keyword_matcher import AhoCorasick, fold_text, get_keyword_matcher
+
+
+def test_overlapping_patterns_are_all_found():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert automaton.search("ushers") == {0, 1, 3}
+    assert automaton.search("this") == {2}
+    assert automaton.search("other shells") == {0, 1}
+
+
+def test_agrees_with_naive_substring_search():
+    rng = random.Random(11)
+    for _ in range(200):
+        patterns = ["".join(rng.choices("abc", k=rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+        text = "".join(rng.choices("abc ", k=rng.randint(0, 30)))
+        automaton = AhoCorasick(patterns)
+        assert automaton.search(text) == {index for index, pattern in enumerate(patterns) if pattern in text}
+        whole = {index for index, pattern in enumerate(patterns) if pattern in text.split()}
+        # Every whole-word hit is a substring hit, and a lone token equal to the pattern always counts
+        assert whole <= automaton.search(text, whole_words=True) <= automaton.search(text)
+
+
+def test_whole_words():
+    automaton = AhoCorasick(["cat", "hot dog"])
+    assert automaton.search("concatenate the scatter", whole_words=True) == set()
+    assert automaton.search("a cat, a HOT\n dog!", whole_words=True) == {0, 1}
+
+
+def test_folding_matches_accents_case_and_compatibility_forms():
+    assert fold_text("Café  CRÈME") == "cafe creme"
+    automaton = AhoCorasick(["cafe", "ﬁnal"])
+    assert automaton.search("CAFÉ FINAL") == {0, 1}
+
+
+def test_empty_patterns_never_match():
+    assert AhoCorasick(["", "  "]).search("anything") == set()
+
+
+def test_whitelist_vetoes_blacklist_hits():
+    matcher = get_keyword_matcher(["prank", "celebrity"], ["science"])
+    assert matcher.blacklist_hits("Celebrity PRANK compilation") == ["celebrity", "prank"]
+    assert matcher.blacklist_hits("The science of a celebrity prank") == []
+    assert not matcher.should_hide("Pranksters at work")
+    assert matcher.should_hide("Pranksters at work", whole_words=False)
+
+
+def test_matchers_are_cached_per_list_contents():
+    first = get_keyword_matcher(["b", "a", "a"], ["x"])
+    assert get_keyword_matcher(["a", "b"], ["x"]) is first
+    assert get_keyword_matcher(["a", "b"], []) is not first
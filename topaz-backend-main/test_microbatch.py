@@ -0,0 +1,68 @@
+import asyncio
+
+from microbatch import MicroBatcher
+
+
+def grid(*child_ids):
+    """One-grid cleaned grid with the given child IDs"""
+    return {"totalGrids": 1, "grids": [{"id": "g1", "children": [{"id": child_id, "text": child_id}
+                                                                   for child_id in child_ids]}]}
+
+
+class Upstream:
+    """Hides every child whose text ends in 'x'; records each combined grid it was sent"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, prompt, cleaned_grid):
+        self.calls.append(cleaned_grid)
+        await asyncio.sleep(0)
+        return "\n".join(child["id"] for g in cleaned_grid["grids"] for child in g["children"]
+                         if child["text"].endswith("x"))
+
+
+def run(submissions, **options):
+    """Submit (grid, owner) pairs concurrently; returns (results, upstream calls, batcher)"""
+    upstream = Upstream()
+    batcher = MicroBatcher(upstream, max_wait=0.01, **options)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit("prompt", cleaned_grid, owner)
+                                      for cleaned_grid, owner in submissions))
+
+    return asyncio.run(scenario()), upstream.calls, batcher
+
+
+def test_concurrent_requests_share_one_call_and_get_their_own_ids_back():
+    results, calls, batcher = run([(grid("g1c0x", "g1c1"), None), (grid("g1c0", "g1c1x"), None)])
+    assert results == ["g1c0x", "g1c1x"]
+    assert len(calls) == 1 and batcher.stats()["saved_calls"] == 1
+
+
+def test_chunks_of_one_request_never_share_a_batch():
+    a, b = object(), object()
+    results, calls, batcher = run([(grid("g1c0x"), a), (grid("g2c0x"), a), (grid("g1c0"), b), (grid("g2c0x"), b)])
+    assert results == ["g1c0x", "g2c0x", "", "g2c0x"]
+    # Two parallel calls (one per chunk of a request), each shared with the other request
+    assert len(calls) == 2 and all(c["totalGrids"] == 2 for c in calls)
+    assert batcher.stats()["pending_batches"] == 0
+
+
+def test_full_batch_goes_without_waiting():
+    results, calls, _ = run([(grid("a", "b"), None), (grid("c", "dx"), None), (grid("ex"), None)], max_children=4)
+    assert results == ["", "dx", "ex"]
+    assert [c["totalGrids"] for c in calls] == [2, 1]
+
+
+def test_upstream_failure_reaches_every_request_in_the_batch():
+    async def failing(prompt, cleaned_grid):
+        raise RuntimeError("upstream failed")
+
+    batcher = MicroBatcher(failing, max_wait=0.01)
+
+    async def scenario():
+        return await asyncio.gather(batcher.submit("prompt", grid("a")), batcher.submit("prompt", grid("b")),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
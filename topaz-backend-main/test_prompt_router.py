@@ -0,0 +1,85 @@
+import os
+import re
+import json
+
+import pytest
+
+from prompt_router import PromptRouter, extract_search_query, pattern_hostnames, url_hostname
+
+with open(os.path.join(os.path.dirname(__file__), "prompts_simplified.json")) as f:
+    PROMPTS = json.load(f)
+
+TWITTER = r"^(https?://)?(www\.)?(twitter\.com|x\.com).*$"
+REDDIT = r"^(https?://)?(www\.)?(reddit\.com).*$"
+
+
+def linear_match(url):
+    """What routing did before the host index: the first pattern in file order that matches"""
+    return next((pattern for pattern in PROMPTS if re.match(pattern, url)), None)
+
+
+@pytest.fixture
+def router():
+    return PromptRouter(PROMPTS)
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/",
+    "youtube.com",
+    "https://www.youtube.com/results?search_query=linear+algebra",
+    "https://www.youtube.com/watch?v=abc",
+    "https://x.com/home",
+    "http://twitter.com/someone/status/1",
+    "https://www.linkedin.com/feed/",
+    "https://www.linkedin.com/notifications/",
+    "https://www.linkedin.com/jobs/",
+    "https://old.reddit.com/r/python",
+    "https://www.reddit.com/r/python",
+    "https://user@reddit.com:443/r/python",
+    "https://example.com/",
+])
+def test_index_agrees_with_a_linear_scan(router, url):
+    assert router.match(url) == linear_match(url)
+
+
+@pytest.mark.parametrize("url", [
+    "https://twitter.com.evil.io/login",
+    "twitter.com.evil.io",
+    "https://x.com.evil.io/",
+    "https://www.reddit.com.evil.io/r/python",
+])
+def test_lookalike_hosts_do_not_get_the_real_sites_prompt(router, url):
+    # The bare regexes would accept these (".*" after the host); the host index only offers a pattern to
+    # the hosts it names and their subdomains
+    assert linear_match(url) is not None
+    assert router.match(url) is None
+    assert router.resolve(url) == router.default_pattern()
+
+
+def test_index_keeps_file_order_for_overlapping_patterns():
+    router = PromptRouter({r"^https://(www\.)?reddit\.com/r/.*$": {"prompt": "subreddit"}, REDDIT: {"prompt": "reddit"}})
+    assert router.match("https://www.reddit.com/r/python") == r"^https://(www\.)?reddit\.com/r/.*$"
+    assert router.match("https://www.reddit.com/") == REDDIT
+
+
+def test_pattern_without_a_hostname_is_checked_for_every_url():
+    router = PromptRouter({TWITTER: {"prompt": "twitter"}, r"^.*/feed$": {"prompt": "feeds"}})
+    assert router.stats()["generic_patterns"] == 1
+    assert router.match("https://example.org/feed") == r"^.*/feed$"
+
+
+def test_hostnames():
+    assert pattern_hostnames(TWITTER) == ["twitter.com", "x.com"]
+    assert url_hostname("https://user@WWW.Reddit.com:443/r") == "www.reddit.com"
+    assert url_hostname("twitter.com.evil.io/login") == "twitter.com.evil.io"
+
+
+def test_render_substitutes_lists_and_search_query_and_is_memoized(router):
+    url = "https://www.youtube.com/results?search_query=linear+algebra"
+    prompt = router.render(url, whitelist=["math"], blacklist=["pranks"])
+    assert "- pranks" in prompt and "- math" in prompt
+    assert prompt.endswith("Only keep videos and results relevant to this search query.")
+    assert "USER_SEARCH_QUERY: linear algebra" in prompt
+    assert router.render(url, whitelist=["math"], blacklist=["pranks"]) == prompt
+    assert router.stats()["rendered"]["hits"] == 1
+    assert extract_search_query("https://x.com/search?q=cats") is None
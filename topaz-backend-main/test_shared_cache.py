@@ -0,0 +1,77 @@
+import time
+import asyncio
+import sqlite3
+
+import pytest
+
+from cache import LRUCache
+from shared_cache import SQLiteCache, TieredCache, build_cache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def tiered(path, **l2_options):
+    """One worker's view of the shared cache"""
+    return TieredCache(LRUCache(max_age=300, name="test"), SQLiteCache(path=path, name="test", **l2_options))
+
+
+def test_workers_share_the_sqlite_tier(path):
+    first, second = tiered(path), tiered(path)
+    first.set("key", {"hidden": ["g1c1"]})
+    assert second.get("key") == {"hidden": ["g1c1"]}
+    # Now promoted into the second worker's L1
+    assert second.l1.get("key") == {"hidden": ["g1c1"]}
+
+
+def test_promotion_does_not_outlive_the_shared_copy(path):
+    first, second = tiered(path), tiered(path)
+    first.l2.set("key", "value", max_age=0.2)
+    assert second.get("key") == "value"
+    time.sleep(0.25)
+    assert second.l1.get("key") is None
+    assert second.get("key") is None
+
+
+def test_set_many_is_one_shared_write(path):
+    first, second = tiered(path), tiered(path)
+    asyncio.run(first.set_many([("a", 1), ("b", 2)]))
+    assert first.l1.get("a") == 1
+    assert [second.get("a"), second.get("b")] == [1, 2]
+
+
+def test_write_lock_held_elsewhere_degrades_to_l1(path):
+    worker = tiered(path, busy_timeout=0.02)
+    worker.set("cached", "value")
+    locker = sqlite3.connect(path, isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        worker.set("new", "value")
+        assert time.perf_counter() - start < 0.5
+        assert worker.l2.busy == 1 and worker.l2.errors == 0
+        # WAL readers aren't blocked by the writer, and the skipped write still lands in L1
+        assert worker.l2.get("cached") == "value"
+        assert worker.get("new") == "value"
+    finally:
+        locker.execute("ROLLBACK")
+    assert worker.l2.get("new") is None
+
+
+def test_prune_trims_the_soonest_to_expire_under_the_byte_budget(path):
+    l2 = SQLiteCache(path=path, name="test", max_bytes=100, prune_every=1000)
+    for position in range(10):
+        l2.set(f"k{position}", "x" * 10, max_age=100 + position)  # 14 bytes each
+    l2.prune()
+    # Down to 90% of the budget, dropping the entries closest to expiry
+    assert l2.stats()["bytes"] <= 90 and l2.evictions == 4
+    assert [l2.get(f"k{position}") is not None for position in range(10)] == [False] * 4 + [True] * 6
+
+
+def test_build_cache_backends(path):
+    l1 = LRUCache(name="test")
+    assert build_cache("memory", l1) is l1
+    assert build_cache("redis", l1) is l1
+    assert isinstance(build_cache("sqlite", l1, path=path), TieredCache)
@@ -0,0 +1,41 @@
+import random
+import string
+
+import pytest
+
+import simhash_index
+from simhash_index import SimHashIndex, simhash, simhash_tokens, simhash_words
+
+
+def test_tokens_drop_numbers_and_boilerplate_but_keep_words_starting_with_num():
+    tokens = simhash_tokens("Numb: the number of numerous 4K videos, 1.2M views 3 days ago")
+    assert tokens == ["numb", "the", "number", "of", "numerous", "videos"]
+
+
+def test_empty_text_has_no_fingerprint():
+    assert simhash("") is None
+    assert simhash("1.2M views · 3 days ago") is None
+
+
+def test_numpy_votes_match_pure_python(monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(3)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 7))) for _ in range(200)]
+    samples = [[rng.choice(vocabulary) for _ in range(rng.randint(1, 25))] for _ in range(300)]
+    vectorized = [simhash_words(words) for words in samples]
+    monkeypatch.setattr(simhash_index, "np", None)
+    assert [simhash_words(words) for words in samples] == vectorized
+
+
+def test_rerendered_item_reuses_verdict():
+    index = SimHashIndex(max_distance=3)
+    index.add("profile", "Lecture 12: eigenvalues and eigenvectors\n1.2M views · 3 days ago", True)
+    assert index.lookup("profile", "Now playing\nLecture 12: eigenvalues and eigenvectors\n1.9M views · 2 weeks ago")
+    assert index.lookup("other profile", "Lecture 12: eigenvalues and eigenvectors\n1.9M views") is None
+
+
+def test_short_texts_are_not_indexed():
+    index = SimHashIndex(min_words=3)
+    index.add("profile", "Shorts", True)
+    assert len(index) == 0
+    assert index.lookup("profile", "Shorts") is None
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2))), flight
+
+    results, flight = asyncio.run(scenario())
+    assert results == [1, 2] and flight.leaders == 2
+
+
+def test_followers_share_the_exception_and_the_key_is_released():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        # A later call starts fresh work rather than replaying the failure
+        retried = await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retried, flight
+
+    results, retried, flight = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == "ok" and len(flight) == 0 and flight.leaders == 2
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "result"
@@ -0,0 +1,26 @@
+import pytest
+
+from startup_budget import DEFAULT_BUDGET, main_imports, measure, parse_importtime
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     _json\n"
+        "import time:       300 |        420 |   json\n"
+        "import time:       900 |       1320 | main\n"
+    )
+    rows = parse_importtime(stderr)
+    assert rows == [("_json", 0.00012, 0.00012, 2), ("json", 0.0003, 0.00042, 1), ("main", 0.0009, 0.00132, 0)]
+    assert main_imports(rows) == [("json", 0.0003, 0.00042, 1)]
+
+
+def test_startup_budget():
+    for module in ("fastapi", "pydantic", "dotenv", "httpx"):
+        pytest.importorskip(module)
+    walls, _, imports = measure(runs=3)
+    slowest = sorted(main_imports(imports), key=lambda row: -row[2])[:5]
+    assert min(walls) <= DEFAULT_BUDGET, (
+        f"import main took {min(walls):.3f}s, budget {DEFAULT_BUDGET:.3f}s; slowest imports: "
+        + ", ".join(f"{name} {cumulative * 1000:.0f}ms" for name, _, cumulative, _ in slowest)
+    )
@@ -0,0 +1,46 @@
+import json
+
+from streaming import ChildIdStreamParser, hide_event
+
+VALID = ["g1c1", "g1c12", "g2c3", "g10c4"]
+
+
+def parse(deltas):
+    """IDs emitted after each delta, then on close"""
+    parser = ChildIdStreamParser(VALID)
+    emitted = [parser.feed(delta) for delta in deltas]
+    emitted.append(parser.close())
+    return emitted, parser
+
+
+def test_id_split_across_tokens_waits_until_it_cannot_grow():
+    emitted, _ = parse(["g1", "c1", "2", "\n"])
+    assert emitted == [[], [], [], ["g1c12"], []]
+
+
+def test_trailing_id_is_flushed_on_close():
+    emitted, _ = parse(["g2c3\ng1c1"])
+    assert emitted == [["g2c3"], ["g1c1"]]
+
+
+def test_invalid_and_repeated_ids_are_dropped():
+    emitted, parser = parse(["g9c9, g2c3 and g2c3 again; ", "g1c1 g10c4\n"])
+    assert emitted == [["g2c3"], ["g1c1", "g10c4"], []]
+    assert parser.emitted == ["g2c3", "g1c1", "g10c4"]
+
+
+def test_prose_around_ids_is_ignored():
+    emitted, parser = parse(["Here are the ", "ids to hide: `g", "10c4`, ", "and that's all"])
+    assert parser.emitted == ["g10c4"]
+    assert emitted[2] == ["g10c4"]
+
+
+def test_empty_and_none_deltas():
+    emitted, parser = parse(["", None, ""])
+    assert parser.emitted == [] and emitted == [[], [], [], []]
+
+
+def test_hide_event_is_one_ndjson_line():
+    line = hide_event("g10c4", "llm")
+    assert line.endswith("\n") and line.count("\n") == 1
+    assert json.loads(line) == {"type": "hide", "id": "g10c4", "grid": "g10", "source": "llm"}
@@ -0,0 +1,55 @@
+import asyncio
+
+from simhash_index import SimHashIndex
+from verdict_cache import VerdictCache, profile_key
+
+GRID = {"totalGrids": 1, "grids": [{"id": "g1", "heading": "Recommended", "children": [
+    {"id": "g1c1", "text": "Lecture 4: linear algebra"},
+    {"id": "g1c2", "text": "Top 10 celebrity pranks"},
+    {"id": "g1c3", "text": "Problem set walkthrough"},
+]}]}
+
+
+def test_partition_answers_judged_children_and_keeps_the_rest():
+    cache = VerdictCache()
+    judged = {"grids": [{"id": "g1", "children": GRID["grids"][0]["children"][:2]}]}
+    asyncio.run(cache.record(judged, ["g1c2"], "profile"))
+
+    hidden, miss_grid, miss_count = cache.partition(GRID, "profile")
+    assert hidden == ["g1c2"]
+    assert miss_count == 1
+    assert miss_grid == {"totalGrids": 1, "grids": [
+        {"id": "g1", "heading": "Recommended", "children": [{"id": "g1c3", "text": "Problem set walkthrough"}]}
+    ]}
+
+
+def test_keep_verdicts_are_cached_too():
+    cache = VerdictCache()
+    asyncio.run(cache.record(GRID, [], "profile"))
+    assert cache.get("profile", "Top 10 celebrity pranks") is False
+    assert cache.partition(GRID, "profile")[2] == 0
+
+
+def test_verdicts_are_per_profile_and_ignore_cosmetic_differences():
+    cache = VerdictCache()
+    cache.set("profile", "Top 10  Celebrity pranks", True)
+    assert cache.get("profile", "top 10 celebrity PRANKS ") is True
+    assert cache.get("other", "Top 10 celebrity pranks") is None
+
+
+def test_near_duplicate_of_a_judged_child():
+    cache = VerdictCache(near_duplicates=SimHashIndex(max_distance=3))
+    cache.set("profile", "Top 10 celebrity pranks that went wrong\n1.2M views · 3 days ago", True)
+    assert cache.get("profile", "Top 10 celebrity pranks that went wrong\n1.9M views · 2 weeks ago") is True
+
+
+def test_profile_key_ignores_list_order():
+    assert profile_key("youtube", ["a", "b"], ["c"]) == profile_key("youtube", ["b", "a"], ["c"])
+    assert profile_key("youtube", [], ["c"]) != profile_key("youtube", [], ["c"], search_query="cats")
+
+
+def test_record_writes_the_shared_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = VerdictCache(backend="sqlite", path=path), VerdictCache(backend="sqlite", path=path)
+    asyncio.run(first.record(GRID, ["g1c1"], "profile"))
+    assert second.partition(GRID, "profile")[:2] == (["g1c1"], {"totalGrids": 1, "grids": []})
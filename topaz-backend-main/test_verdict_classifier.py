@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+import pytest
+
+from verdict_classifier import VerdictClassifier
+
+GRID = {"grids": [{"id": "g1", "children": [
+    {"id": "g1c1", "text": "Lecture 4: linear algebra"},
+    {"id": "g1c2", "text": "Top 10 celebrity pranks"},
+    {"id": "g1c3", "text": "Problem set walkthrough"},
+]}]}
+
+
+def labels(classifier, profile):
+    return [hide for _, hide in classifier._profile(profile).examples]
+
+
+def test_record_labels_every_child():
+    classifier = VerdictClassifier()
+    classifier.record(GRID, ["g1c2"], "profile")
+    assert labels(classifier, "profile") == [False, True, False]
+
+
+def test_keep_only_batch_is_logged_as_label_0():
+    classifier = VerdictClassifier()
+    classifier.record(GRID, [], "profile")
+    assert labels(classifier, "profile") == [False, False, False]
+    assert classifier._profile("profile").new_examples == 3
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    """main with a stub upstream and a fresh classifier; returns (main, classifier, upstream answer calls)"""
+    for module in ("fastapi", "pydantic", "dotenv", "httpx"):
+        pytest.importorskip(module)
+    import main
+    from types import SimpleNamespace
+
+    classifier = VerdictClassifier()
+    calls = []
+
+    async def keep_everything(base_system_instruction, cleaned_grid):
+        calls.append(cleaned_grid)
+        return ""
+
+    monkeypatch.setattr(main, "verdict_classifier", classifier)
+    monkeypatch.setattr(main, "CLASSIFIER_ENABLED", False)
+    monkeypatch.setattr(main, "FANOUT_ENABLED", False)
+    monkeypatch.setattr(main, "llm_providers", SimpleNamespace(available=True, accepting=lambda: True))
+    monkeypatch.setattr(main, "analyze_grid_with_llm", keep_everything)
+    monkeypatch.setattr(main, "cache_response", lambda cache_key, result: None)
+    return main, classifier, calls
+
+
+def run(main, blacklist, profile):
+    request = main.GridRequest(GRID, "https://www.youtube.com/", "visitor", blacklist=blacklist)
+    return asyncio.run(main.run_grid_analysis(request, GRID, profile, f"key-{profile}", time.time()))
+
+
+def test_empty_llm_answer_is_training_data(analysis):
+    main, classifier, calls = analysis
+    profile = f"keep-only-{time.time_ns()}"
+
+    # The keyword fallback still hides the blacklisted child, but the model is taught what the LLM said
+    result = run(main, ["celebrity"], profile)
+    assert calls and "g1c2" in str(result)
+    assert labels(classifier, profile) == [False, False, False]
+
+
+def test_degraded_answer_is_not_training_data(analysis, monkeypatch):
+    main, classifier, calls = analysis
+    profile = f"degraded-{time.time_ns()}"
+    monkeypatch.setattr(main, "upstream_degraded", lambda cache_key: True)
+
+    run(main, ["celebrity"], profile)
+    assert not calls
+    assert profile not in classifier._profiles
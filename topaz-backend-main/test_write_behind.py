@@ -0,0 +1,146 @@
+import os
+import glob
+import json
+import asyncio
+import threading
+
+import pytest
+
+from write_behind import WriteBehindBuffer
+
+
+class FakeSupabase:
+    """Records every executed insert/upsert; fails while down, and can hold a call until released"""
+
+    def __init__(self):
+        self.sent = []
+        self.down = False
+        self.gate = None  # threading.Event a call waits on before executing
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+    def table(self, name):
+        client = self
+
+        class Query:
+            def __init__(self, op, rows, on_conflict=None):
+                self.op, self.rows, self.on_conflict = op, rows, on_conflict
+
+            def execute(self):
+                client.started.set()
+                try:
+                    if client.gate is not None:
+                        client.gate.wait(5)
+                    if client.down:
+                        raise ConnectionError("supabase down")
+                    client.sent.append((self.op, name, [row for row in self.rows]))
+                finally:
+                    client.finished.set()
+
+        class Table:
+            def insert(self, rows):
+                return Query("insert", rows)
+
+            def upsert(self, rows, on_conflict):
+                return Query("upsert", rows, on_conflict)
+
+        return Table()
+
+
+@pytest.fixture
+def client():
+    return FakeSupabase()
+
+
+def spooled_rows(spool_dir):
+    rows = []
+    for path in glob.glob(os.path.join(spool_dir, "spool-*.jsonl")):
+        with open(path) as f:
+            rows.extend(row for line in f if line.strip() for row in json.loads(line)["rows"])
+    return rows
+
+
+def test_inserts_batch_and_upserts_coalesce(client, tmp_path):
+    buffer = WriteBehindBuffer(client, batch_size=2, spool_dir=str(tmp_path))
+    buffer.insert("blocked_items", [{"n": 1}, {"n": 2}, {"n": 3}])
+    buffer.upsert("user_metrics", {"session_id": "s", "total": 1}, on_conflict="session_id")
+    buffer.upsert("user_metrics", {"session_id": "s", "total": 2}, on_conflict="session_id")
+    assert buffer.pending == 4 and buffer.coalesced == 1
+
+    asyncio.run(buffer.flush())
+    assert client.sent == [
+        ("insert", "blocked_items", [{"n": 1}, {"n": 2}]),
+        ("insert", "blocked_items", [{"n": 3}]),
+        ("upsert", "user_metrics", [{"session_id": "s", "total": 2}]),
+    ]
+    assert buffer.written == 4 and buffer.pending == 0
+
+
+def test_failed_batches_are_spooled_and_replayed_first(client, tmp_path):
+    buffer = WriteBehindBuffer(client, spool_dir=str(tmp_path))
+    client.down = True
+    buffer.insert("blocked_items", [{"n": 1}])
+    asyncio.run(buffer.flush())
+    assert client.sent == [] and spooled_rows(str(tmp_path)) == [{"n": 1}]
+
+    client.down = False
+    buffer.insert("blocked_items", [{"n": 2}])
+    asyncio.run(buffer.flush())
+    assert client.sent == [("insert", "blocked_items", [{"n": 1}]), ("insert", "blocked_items", [{"n": 2}])]
+    assert buffer.replayed == 1 and os.listdir(str(tmp_path)) == []
+
+
+def test_another_workers_leftover_spool_is_replayed(client, tmp_path):
+    with open(tmp_path / "spool-99999.jsonl", "w") as f:
+        f.write(json.dumps({"op": "insert", "table": "blocked_items", "rows": [{"n": 0}]}) + "\n")
+    asyncio.run(WriteBehindBuffer(client, spool_dir=str(tmp_path)).flush())
+    assert client.sent == [("insert", "blocked_items", [{"n": 0}])]
+
+
+def test_spool_cap_drops_rows_instead_of_filling_the_disk(client, tmp_path):
+    buffer = WriteBehindBuffer(client, spool_dir=str(tmp_path), max_spool_bytes=200)
+    client.down = True
+    buffer.insert("blocked_items", [{"n": 1}])
+    asyncio.run(buffer.flush())
+    buffer.insert("blocked_items", [{"text": "x" * 200}])
+    asyncio.run(buffer.flush())
+    assert buffer.spooled == 2  # the first row, spooled again after its failed replay
+    assert buffer.dropped == 1
+    assert spooled_rows(str(tmp_path)) == [{"n": 1}]
+
+
+def test_spool_cap_ignores_files_claimed_for_replay(client, tmp_path):
+    # A sibling worker mid-replay: its claimed file is either sent or re-spooled, so it isn't counted
+    with open(tmp_path / "spool-99999.jsonl.replay-99999", "w") as f:
+        f.write("x" * 500)
+    buffer = WriteBehindBuffer(client, spool_dir=str(tmp_path), max_spool_bytes=200)
+    client.down = True
+    buffer.insert("blocked_items", [{"n": 1}])
+    asyncio.run(buffer.flush())
+    assert buffer.dropped == 0 and spooled_rows(str(tmp_path)) == [{"n": 1}]
+
+
+@pytest.mark.parametrize("succeeds", [True, False])
+def test_cancelled_flush_settles_the_send_in_flight(client, tmp_path, succeeds):
+    buffer = WriteBehindBuffer(client, spool_dir=str(tmp_path))
+
+    async def scenario():
+        client.gate = threading.Event()
+        buffer.insert("blocked_items", [{"n": 1}])
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.to_thread(client.started.wait, 5)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        # The worker thread finishes after the flush was cancelled (e.g. at shutdown)
+        client.down = not succeeds
+        client.gate.set()
+        await asyncio.to_thread(client.finished.wait, 5)
+        client.down = False
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    # Sent exactly once either way: directly, or spooled and replayed
+    assert client.sent == [("insert", "blocked_items", [{"n": 1}])]
+    assert buffer.spooled == (0 if succeeds else 1)
+    assert spooled_rows(str(tmp_path)) == []
@@ -0,0 +1,120 @@
+"""
+Token-budget-aware selection of grid children for the LLM.
+
+Instead of keeping the first N children per grid and cutting each text at a
+fixed number of characters, children are admitted in priority order until the
+request's token budget is spent. Texts are truncated on word boundaries, and
+every child left out is reported so it can go in a follow-up call.
+"""
+
+import re
+import logging
+from typing import Dict, List, NamedTuple
+
+from payload_format import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# id, tab and newline around each child line
+CHILD_OVERHEAD_TOKENS = 4
+# Don't bother sending a child squeezed below this many tokens of text
+MIN_CHILD_TOKENS = 6
+GRID_TEXT_MAX_CHARS = 500
+
+_WORD_RE = re.compile(r"\S+")
+
+
+class BudgetResult(NamedTuple):
+    cleaned: dict
+    dropped: List[str]
+    used_tokens: int
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest word-boundary prefix of text (plus "...") that fits in max_tokens"""
+    text = (text or "").strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Offsets where each whole word ends, so the kept prefix retains the original line breaks
+    word_ends = [match.end() for match in _WORD_RE.finditer(text)]
+    low, high = 0, len(word_ends)
+    # Binary search on the number of whole words kept
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:word_ends[mid - 1]] + "...") <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+
+    if low == 0:
+        # A single oversized word (URL, CJK run): fall back to a character cut
+        return text[:max(1, max_tokens * 2)] + "..."
+    return text[:word_ends[low - 1]] + "..."
+
+
+def _priority(child: dict, index: int) -> float:
+    # Extension may send an explicit rank (e.g. viewport position); document order otherwise
+    priority = child.get('priority')
+    return priority if isinstance(priority, (int, float)) else index
+
+
+def budget_grid_structure(grid_structure: dict,
+                          token_budget: int,
+                          max_child_tokens: int = 48) -> BudgetResult:
+    """
+    Select and truncate children so their text fits in token_budget.
+
+    Children are admitted round-robin by rank across grids (the first item of every
+    grid before the second of any), so one long grid can't starve the others.
+    """
+    grids = grid_structure.get('grids', []) if grid_structure else []
+
+    ranked = []
+    for grid_index, grid in enumerate(grids):
+        for child_index, child in enumerate(grid.get('children', []) or []):
+            ranked.append((_priority(child, child_index), grid_index, child_index, child))
+    ranked.sort(key=lambda item: (item[0], item[1], item[2]))
+
+    used = 0
+    admitted: Dict[tuple, str] = {}
+    dropped = []
+    for _, grid_index, child_index, child in ranked:
+        remaining = token_budget - used - CHILD_OVERHEAD_TOKENS
+        if remaining < MIN_CHILD_TOKENS:
+            dropped.append(child.get('id'))
+            continue
+
+        text = truncate_to_tokens(child.get('text', ''), min(max_child_tokens, remaining))
+        used += estimate_tokens(text) + CHILD_OVERHEAD_TOKENS
+        admitted[(grid_index, child_index)] = text
+
+    # Rebuild in document order with the same shape the LLM helpers expect
+    cleaned_structure = {
+        'totalGrids': grid_structure.get('totalGrids', 0) if grid_structure else 0,
+        'grids': []
+    }
+    for grid_index, grid in enumerate(grids):
+        cleaned_grid = {
+            'id': grid.get('id'),
+            'totalChildren': grid.get('totalChildren', 0),
+            'children': []
+        }
+        if 'gridText' in grid:
+            grid_text = grid['gridText']
+            # Truncate grid text to prevent huge payloads
+            if len(grid_text) > GRID_TEXT_MAX_CHARS:
+                grid_text = grid_text[:GRID_TEXT_MAX_CHARS] + "..."
+            cleaned_grid['gridText'] = grid_text
+
+        for child_index, child in enumerate(grid.get('children', []) or []):
+            text = admitted.get((grid_index, child_index))
+            if text is not None:
+                cleaned_grid['children'].append({'id': child.get('id'), 'text': text})
+
+        cleaned_structure['grids'].append(cleaned_grid)
+
+    if dropped:
+        logger.info(f"✂️ Token budget {token_budget}: kept {len(admitted)} children, deferred {len(dropped)}")
+
+    return BudgetResult(cleaned_structure, [child_id for child_id in dropped if child_id], used)
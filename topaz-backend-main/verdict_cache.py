@@ -0,0 +1,135 @@
+"""
+Per-child verdict cache.
+
+Stores a hide/keep verdict for every child the LLM has judged, keyed on the
+normalized child text and the filtering profile (URL prompt pattern, search
+query, whitelist and blacklist). Repeated items in an infinite-scroll feed are
+answered locally and only unseen children are sent upstream. An optional
+SimHash index also answers children that are near-duplicates of judged ones.
+"""
+
+import re
+import json
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from shared_cache import DEFAULT_BUSY_TIMEOUT, DEFAULT_SHARED_CACHE_PATH, TieredCache, build_cache
+from simhash_index import SimHashIndex
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_child_text(text: str) -> str:
+    """Case-fold and collapse whitespace so cosmetic differences share a verdict"""
+    return _WHITESPACE_RE.sub(" ", (text or "").casefold()).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.md5(normalize_child_text(text).encode()).hexdigest()
+
+
+def profile_key(pattern: Optional[str], whitelist: List[str], blacklist: List[str],
+                search_query: Optional[str] = None) -> str:
+    """Hash of everything besides the child text that can change a verdict"""
+    key_data = {
+        'pattern': pattern or '',
+        'search_query': search_query or '',
+        'whitelist': sorted(whitelist) if whitelist else [],
+        'blacklist': sorted(blacklist) if blacklist else []
+    }
+    return hashlib.md5(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+# Two hex digests, a bool and the LRU bookkeeping
+VERDICT_ENTRY_BYTES = 200
+
+
+class VerdictCache:
+    """LRU of "profile key:text hash" -> hide verdict with a TTL, optionally shared across workers"""
+
+    def __init__(self, max_entries: int = 20000, max_age: float = 3600,
+                 backend: str = "memory", path: str = DEFAULT_SHARED_CACHE_PATH,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+                 near_duplicates: Optional[SimHashIndex] = None):
+        l1 = LRUCache(
+            max_bytes=max_entries * VERDICT_ENTRY_BYTES,
+            max_age=max_age,
+            max_entries=max_entries,
+            sizeof=lambda key, value: VERDICT_ENTRY_BYTES,
+            name="verdicts"
+        )
+        self._cache = build_cache(backend, l1, path=path,
+                                  max_bytes=max_entries * VERDICT_ENTRY_BYTES * 4, busy_timeout=busy_timeout)
+        self.near_duplicates = near_duplicates
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, profile: str, text: str) -> Optional[bool]:
+        hide = self._cache.get(f"{profile}:{text_hash(text)}")
+        if hide is None and self.near_duplicates is not None:
+            hide = self.near_duplicates.lookup(profile, text)
+        return hide
+
+    def set(self, profile: str, text: str, hide: bool):
+        self._cache.set(f"{profile}:{text_hash(text)}", hide)
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(profile, text, hide)
+
+    def partition(self, cleaned_grid: dict, profile: str) -> Tuple[List[str], dict, int]:
+        """
+        Split a cleaned grid into cached verdicts and children still to be judged.
+
+        Returns (hidden child IDs from cache, cleaned grid holding only the misses, miss count)
+        """
+        cached_hidden = []
+        miss_grid = {'totalGrids': cleaned_grid.get('totalGrids', 0), 'grids': []}
+        miss_count = 0
+
+        for grid in cleaned_grid.get('grids', []):
+            miss_children = []
+            for child in grid.get('children', []):
+                hide = self.get(profile, child.get('text', ''))
+                if hide is None:
+                    miss_children.append(child)
+                elif hide:
+                    cached_hidden.append(child.get('id'))
+
+            if miss_children:
+                miss_entry = {key: value for key, value in grid.items() if key != 'children'}
+                miss_entry['children'] = miss_children
+                miss_grid['grids'].append(miss_entry)
+                miss_count += len(miss_children)
+
+        return cached_hidden, miss_grid, miss_count
+
+    async def record(self, judged_grid: dict, hidden_ids: List[str], profile: str):
+        """Store a verdict for every child in judged_grid (hidden if its ID is in hidden_ids)
+
+        The whole grid goes to the shared tier as one transaction, written off the event loop.
+        """
+        hidden = set(hidden_ids)
+        items = []
+        for grid in judged_grid.get('grids', []):
+            for child in grid.get('children', []):
+                text = child.get('text', '')
+                hide = child.get('id') in hidden
+                items.append((f"{profile}:{text_hash(text)}", hide))
+                if self.near_duplicates is not None:
+                    self.near_duplicates.add(profile, text, hide)
+
+        if isinstance(self._cache, TieredCache):
+            await self._cache.set_many(items)
+        else:
+            for key, hide in items:
+                self._cache.set(key, hide)
+
+    def stats(self) -> Dict[str, float]:
+        stats = self._cache.stats()
+        if self.near_duplicates is not None:
+            stats['near_duplicates'] = self.near_duplicates.stats()
+        return stats
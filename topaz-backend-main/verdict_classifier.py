@@ -0,0 +1,260 @@
+"""
+Local classifier distilled from logged LLM verdicts.
+
+Every child the LLM judges is logged as (normalized text, hide) under its
+filtering profile (URL prompt pattern, search query, whitelist, blacklist).
+Once a profile has enough examples, a hashed n-gram logistic regression is
+trained for it on the CPU. Children the model is confident about are answered
+locally; the rest still go to the LLM.
+
+A model only serves verdicts after it has cleared a precision check on
+held-out examples at the serving threshold. NumPy is optional: without it,
+verdicts are still logged but nothing is trained or served.
+"""
+
+import re
+import zlib
+import random
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from verdict_cache import normalize_child_text
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+# Digits are mostly view counts and dates; folding them keeps "1.2M views" and "3.4M views" alike
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def text_features(text: str, dim: int) -> List[int]:
+    """Hashed word unigrams, bigrams and character trigrams of the normalized text"""
+    text = _DIGITS_RE.sub("0", normalize_child_text(text))
+    words = _TOKEN_RE.findall(text)
+    grams = [f"w:{word}" for word in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    # Length bucket: also guarantees every example has at least one feature
+    grams.append(f"len:{min(len(words), 32) // 4}")
+    # crc32 rather than hash(): stable across workers and restarts
+    return sorted({zlib.crc32(gram.encode()) % dim for gram in grams})
+
+
+class HashedLogisticModel:
+    """Binary logistic regression over hashed binary features"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.weights = np.zeros(dim, dtype=np.float32)
+        self.bias = 0.0
+
+    def fit(self, examples: List[Tuple[List[int], int]], epochs: int = 8, batch_size: int = 256,
+            learning_rate: float = 0.5, l2: float = 1e-4):
+        """Mini-batch gradient descent on the log loss"""
+        examples = list(examples)
+        for _ in range(epochs):
+            random.shuffle(examples)
+            for start in range(0, len(examples), batch_size):
+                batch = examples[start:start + batch_size]
+                columns, rows, labels = self._pack(batch)
+                probabilities = self._probabilities(columns, rows, len(batch))
+                error = (probabilities - labels) / len(batch)
+                gradient = np.bincount(columns, weights=error[rows], minlength=self.dim)
+                self.weights -= (learning_rate * (gradient + l2 * self.weights)).astype(np.float32)
+                self.bias -= learning_rate * float(error.sum())
+
+    def predict(self, features: List[List[int]]) -> "np.ndarray":
+        """Probability of "hide" for each feature list"""
+        columns, rows, _ = self._pack([(f, 0) for f in features])
+        return self._probabilities(columns, rows, len(features))
+
+    @staticmethod
+    def _pack(batch):
+        lengths = [len(features) for features, _ in batch]
+        columns = np.fromiter((index for features, _ in batch for index in features), dtype=np.int64,
+                              count=sum(lengths))
+        rows = np.repeat(np.arange(len(batch)), lengths)
+        labels = np.array([label for _, label in batch], dtype=np.float64)
+        return columns, rows, labels
+
+    def _probabilities(self, columns, rows, count: int) -> "np.ndarray":
+        scores = np.bincount(rows, weights=self.weights[columns], minlength=count)
+        return 1.0 / (1.0 + np.exp(-(scores + self.bias)))
+
+
+class _Profile:
+    """Logged examples and the current model for one filtering profile"""
+
+    def __init__(self, max_examples: int):
+        self.examples: Deque[Tuple[str, bool]] = deque(maxlen=max_examples)
+        self.new_examples = 0
+        self.model: Optional[HashedLogisticModel] = None
+        self.holdout_precision: Optional[float] = None
+        self.holdout_coverage: Optional[float] = None
+
+
+class VerdictClassifier:
+    """Per-profile distilled models that answer confident children without calling the LLM"""
+
+    def __init__(self,
+                 dim: int = 2 ** 16,
+                 threshold: float = 0.95,
+                 min_examples: int = 300,
+                 min_precision: float = 0.97,
+                 retrain_after: int = 200,
+                 max_examples: int = 20000,
+                 max_profiles: int = 32):
+        self.dim = dim
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.min_precision = min_precision
+        self.retrain_after = retrain_after
+        self.max_examples = max_examples
+        self.max_profiles = max_profiles
+        self.enabled = numpy_available()
+        self._profiles: "OrderedDict[str, _Profile]" = OrderedDict()
+        # Training runs in a worker thread while requests keep logging examples
+        self._lock = threading.Lock()
+        self.served = 0
+        self.deferred = 0
+        self.trained = 0
+
+        if not self.enabled:
+            logger.warning("NumPy not installed: verdict classifier will log examples but not serve")
+
+    def _profile(self, profile: str) -> _Profile:
+        entry = self._profiles.get(profile)
+        if entry is None:
+            entry = self._profiles[profile] = _Profile(self.max_examples)
+            # Least recently used profile (and its model) goes first
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(profile)
+        return entry
+
+    def record(self, judged_grid: dict, hidden_ids: List[str], profile: str):
+        """Log the LLM's verdict for every child in judged_grid"""
+        hidden = set(hidden_ids)
+        with self._lock:
+            entry = self._profile(profile)
+            for grid in judged_grid.get('grids', []):
+                for child in grid.get('children', []):
+                    entry.examples.append((child.get('text', ''), child.get('id') in hidden))
+                    entry.new_examples += 1
+
+    def partition(self, cleaned_grid: dict, profile: str) -> Tuple[List[str], dict, int]:
+        """
+        Split a cleaned grid into confident local verdicts and children for the LLM.
+
+        Returns (hidden child IDs decided locally, cleaned grid of uncertain children, uncertain count)
+        """
+        with self._lock:
+            entry = self._profiles.get(profile)
+            model = entry.model if entry is not None else None
+
+        children = [(grid, child) for grid in cleaned_grid.get('grids', []) for child in grid.get('children', [])]
+        if model is None or not children:
+            return [], cleaned_grid, len(children)
+
+        probabilities = model.predict([text_features(child.get('text', ''), self.dim) for _, child in children])
+
+        hidden = []
+        uncertain: Dict[int, List[dict]] = {}
+        for (grid, child), probability in zip(children, probabilities):
+            if probability >= self.threshold:
+                hidden.append(child.get('id'))
+            elif probability > 1.0 - self.threshold:
+                uncertain.setdefault(id(grid), []).append(child)
+
+        miss_grid = {'totalGrids': cleaned_grid.get('totalGrids', 0), 'grids': []}
+        for grid in cleaned_grid.get('grids', []):
+            if id(grid) in uncertain:
+                miss_entry = {key: value for key, value in grid.items() if key != 'children'}
+                miss_entry['children'] = uncertain[id(grid)]
+                miss_grid['grids'].append(miss_entry)
+
+        miss_count = sum(len(grid_children) for grid_children in uncertain.values())
+        self.served += len(children) - miss_count
+        self.deferred += miss_count
+        return hidden, miss_grid, miss_count
+
+    def train_pending(self) -> int:
+        """Retrain every profile with enough new examples; returns how many were trained"""
+        if not self.enabled:
+            return 0
+
+        with self._lock:
+            due = [
+                (profile, list(entry.examples))
+                for profile, entry in self._profiles.items()
+                if len(entry.examples) >= self.min_examples and entry.new_examples >= self.retrain_after
+            ]
+            for profile, _ in due:
+                self._profiles[profile].new_examples = 0
+
+        trained = 0
+        for profile, examples in due:
+            model, precision, coverage = self._train(examples)
+            with self._lock:
+                entry = self._profiles.get(profile)
+                if entry is None:
+                    continue
+                entry.holdout_precision = precision
+                entry.holdout_coverage = coverage
+                # Only a model that is right when it's confident may answer for the LLM
+                entry.model = model if precision is not None and precision >= self.min_precision else None
+            trained += 1
+            logger.info(f"🧠 Trained verdict model for {profile[:8]} on {len(examples)} examples "
+                        f"(holdout precision={precision}, coverage={coverage}, serving={entry.model is not None})")
+
+        self.trained += trained
+        return trained
+
+    def _train(self, examples: List[Tuple[str, bool]]):
+        labels = {hide for _, hide in examples}
+        if len(labels) < 2:
+            # All hide or all keep: nothing to learn that the verdict cache doesn't already cover
+            return None, None, None
+
+        featurized = [(text_features(text, self.dim), int(hide)) for text, hide in examples]
+        random.shuffle(featurized)
+        split = max(1, len(featurized) // 5)
+        holdout, training = featurized[:split], featurized[split:]
+
+        model = HashedLogisticModel(self.dim)
+        model.fit(training)
+
+        probabilities = model.predict([features for features, _ in holdout])
+        confident = [(probability >= 0.5, label) for probability, (_, label) in zip(probabilities, holdout)
+                     if probability >= self.threshold or probability <= 1.0 - self.threshold]
+        if not confident:
+            return model, None, 0.0
+        correct = sum(1 for predicted, label in confident if predicted == bool(label))
+        return model, round(correct / len(confident), 4), round(len(confident) / len(holdout), 4)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            serving = sum(1 for entry in self._profiles.values() if entry.model is not None)
+            examples = sum(len(entry.examples) for entry in self._profiles.values())
+        return {
+            'enabled': self.enabled,
+            'profiles': len(self._profiles),
+            'serving_models': serving,
+            'examples': examples,
+            'trained': self.trained,
+            'served': self.served,
+            'deferred': self.deferred
+        }
@@ -0,0 +1,255 @@
+"""
+Write-behind buffer for Supabase ingestion.
+
+Handlers enqueue rows and return without waiting on the network. A background
+flusher sends them in batches every flush_interval seconds, or sooner once
+batch_size rows are waiting: inserts go out as bulk inserts, and upserts are
+coalesced per conflict key so only the latest row for a session is sent
+(last write wins).
+
+supabase-py is synchronous, so every request runs in a worker thread. A batch
+that fails is appended to a JSONL spool file on local disk; spooled batches
+are replayed, oldest first, before anything newer is sent once Supabase
+answers again. Each worker spools to its own file and claims a file by
+renaming it before replaying, so restarted or sibling workers pick up
+leftovers without sending them twice.
+"""
+
+import os
+import glob
+import json
+import asyncio
+import logging
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), "topaz-spool")
+
+
+class WriteBehindBuffer:
+    """Batches Supabase inserts/upserts off the request path, spooling to disk on failure"""
+
+    def __init__(self, client: Any, batch_size: int = 500, flush_interval: float = 2.0,
+                 spool_dir: Optional[str] = DEFAULT_SPOOL_DIR, max_spool_bytes: int = 64 * 1024 * 1024):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.max_spool_bytes = max_spool_bytes
+
+        self._inserts: Dict[str, List[dict]] = {}
+        # (table, conflict column) -> conflict value -> latest row
+        self._upserts: Dict[Tuple[str, str], Dict[Any, dict]] = {}
+        self._size = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        # Requests whose flush was cancelled while a worker thread was sending them
+        self._in_flight = set()
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.requests = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def pending(self) -> int:
+        return self._size
+
+    def insert(self, table: str, rows: List[dict]):
+        """Queue rows for a bulk insert"""
+        if not rows:
+            return
+        self._inserts.setdefault(table, []).extend(rows)
+        self._size += len(rows)
+        self.enqueued += len(rows)
+        self._maybe_wake()
+
+    def upsert(self, table: str, row: dict, on_conflict: str):
+        """Queue an upsert; a newer row for the same key replaces one still waiting"""
+        rows = self._upserts.setdefault((table, on_conflict), {})
+        key = row.get(on_conflict)
+        if key in rows:
+            self.coalesced += 1
+        else:
+            self._size += 1
+        rows[key] = row
+        self.enqueued += 1
+        self._maybe_wake()
+
+    def _maybe_wake(self):
+        if self._size >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _take_batches(self) -> List[dict]:
+        """Swap out everything queued as a list of spool-format operations"""
+        operations = []
+        for table, rows in self._inserts.items():
+            for start in range(0, len(rows), self.batch_size):
+                operations.append({"op": "insert", "table": table, "rows": rows[start:start + self.batch_size]})
+        for (table, on_conflict), keyed in self._upserts.items():
+            rows = list(keyed.values())
+            for start in range(0, len(rows), self.batch_size):
+                operations.append({"op": "upsert", "table": table, "on_conflict": on_conflict,
+                                   "rows": rows[start:start + self.batch_size]})
+        self._inserts, self._upserts, self._size = {}, {}, 0
+        return operations
+
+    def _execute(self, operation: dict):
+        table = self.client.table(operation["table"])
+        if operation["op"] == "upsert":
+            table.upsert(operation["rows"], on_conflict=operation["on_conflict"]).execute()
+        else:
+            table.insert(operation["rows"]).execute()
+
+    async def _send(self, operation: dict) -> bool:
+        self.requests += 1
+        future = asyncio.ensure_future(asyncio.to_thread(self._execute, operation))
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread can't be stopped and may still commit, so spooling the operation now could
+            # send it twice: it is settled (counted, or spooled if it failed) once the thread is done
+            self._in_flight.add(future)
+            future.add_done_callback(lambda done: self._settle(done, operation))
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Supabase {operation['op']} into {operation['table']} failed: {e}")
+            return False
+        self.written += len(operation["rows"])
+        return True
+
+    def _settle(self, future: asyncio.Future, operation: dict):
+        self._in_flight.discard(future)
+        error = future.exception() if not future.cancelled() else asyncio.CancelledError()
+        if error is None:
+            self.written += len(operation["rows"])
+            return
+        self.errors += 1
+        logger.warning(f"Supabase {operation['op']} into {operation['table']} failed: {error}")
+        self._spool([operation])
+
+    def _spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"spool-{os.getpid()}.jsonl")
+
+    def _spool(self, operations: List[dict]):
+        if not operations:
+            return
+        rows = sum(len(operation["rows"]) for operation in operations)
+        if not self.spool_dir:
+            self.dropped += rows
+            logger.error(f"Supabase unavailable and no spool configured: dropped {rows} rows")
+            return
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # Files claimed for replay (spool-*.jsonl.replay-<pid>) are excluded: their operations are
+            # either sent or put back into a spool file, so counting them would count them twice
+            used = sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")))
+            lines = "".join(json.dumps(operation, default=str) + "\n" for operation in operations)
+            if used + len(lines) > self.max_spool_bytes:
+                self.dropped += rows
+                logger.error(f"Spool {self.spool_dir} full: dropped {rows} rows")
+                return
+            with open(self._spool_path(), "a") as f:
+                f.write(lines)
+        except OSError as e:
+            self.dropped += rows
+            logger.error(f"Could not spool {rows} rows to {self.spool_dir}: {e}")
+            return
+        self.spooled += rows
+        logger.info(f"💾 Spooled {rows} rows while Supabase is unavailable")
+
+    async def _replay(self) -> bool:
+        """Send spooled operations, oldest file first; False if Supabase is still failing"""
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return True
+        paths = sorted(glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")), key=os.path.getmtime)
+        for path in paths:
+            # Renaming claims the file; if another worker got there first, skip it
+            claimed = f"{path}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed) as f:
+                operations = [json.loads(line) for line in f if line.strip()]
+            for index, operation in enumerate(operations):
+                try:
+                    sent = await self._send(operation)
+                except asyncio.CancelledError:
+                    # operations[index] is with a worker thread and settles itself (see _send)
+                    self._spool(operations[index + 1:])
+                    os.remove(claimed)
+                    raise
+                if not sent:
+                    # Put back what's left so it's replayed before anything newer
+                    self._spool(operations[index:])
+                    os.remove(claimed)
+                    return False
+                self.replayed += len(operation["rows"])
+            os.remove(claimed)
+        return True
+
+    async def flush(self):
+        """Replay the spool, then send everything queued; failures go to the spool"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._in_flight:
+                # Let sends interrupted by a cancelled flush settle before anything is retried
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+            healthy = await self._replay()
+            operations = self._take_batches()
+            if not healthy:
+                self._spool(operations)
+                return
+            sent = 0
+            try:
+                for operation in operations:
+                    if not await self._send(operation):
+                        break
+                    sent += 1
+            except asyncio.CancelledError:
+                # operations[sent] is with a worker thread and settles itself (see _send)
+                sent += 1
+                raise
+            finally:
+                # Also runs when cancelled at shutdown, so taken rows are never silently lost
+                self._spool(operations[sent:])
+
+    async def run(self):
+        """Flush every flush_interval, or as soon as batch_size rows are waiting"""
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    async def close(self):
+        """Final flush on shutdown; anything Supabase won't take stays in the spool"""
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': self._size,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'requests': self.requests,
+            'spooled': self.spooled,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
@@ -0,0 +1,145 @@
+# Benchmark WebSocket counter fan-out with many idle connections
+# Usage: python ws_benchmark.py [--connections 10000] [--slow 100] [--rounds 20]
+#        python ws_benchmark.py --url ws://localhost:8000/ws [--connections 10000] [--rounds 20]
+#
+# In-process (default): drives ws_fanout.ConnectionManager with fake sockets, a share of
+# which never finish a send, and reports broadcast latency (call to last delivery) and
+# memory per connection.
+# --url: opens real idle /ws connections against a running server, reports blocked items
+# through the HTTP API and measures how long until every client has seen the new count.
+import os
+import sys
+import json
+import time
+import asyncio
+import tracemalloc
+
+args = sys.argv[1:]
+
+
+def option(name, default):
+    if name in args:
+        return type(default)(args[args.index(name) + 1])
+    return default
+
+
+connections = option("--connections", 10000)
+slow = option("--slow", 100)
+rounds = option("--rounds", 20)
+url = option("--url", "")
+
+
+def summarize(label, samples):
+    ordered = sorted(samples)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label}: p50 {p50 * 1000:.1f}ms  p99 {p99 * 1000:.1f}ms  max {ordered[-1] * 1000:.1f}ms")
+
+
+class FakeWebSocket:
+    def __init__(self, stuck=False):
+        self.stuck = stuck
+        self.received = 0
+        self.delivered = None
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, message):
+        if self.stuck:
+            await asyncio.sleep(3600)
+        self.received += 1
+        if self.delivered is not None:
+            self.delivered()
+
+
+async def in_process():
+    from ws_fanout import ConnectionManager
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    manager = ConnectionManager(send_timeout=2.0, counter_tick=0.05)
+    sockets = [FakeWebSocket(stuck=i < slow) for i in range(connections)]
+    for websocket in sockets:
+        await manager.connect(websocket)
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    # Tracing slows every allocation, so stop before timing anything
+    tracemalloc.stop()
+    print(f"{connections} connections ({slow} stuck): {memory / 1024 / 1024:.1f} MiB, "
+          f"{memory / connections:.0f} bytes each")
+
+    fast = [websocket for websocket in sockets if not websocket.stuck]
+    enqueue, delivery = [], []
+    for count in range(rounds):
+        remaining = len(fast)
+        done = asyncio.get_running_loop().create_future()
+
+        def delivered():
+            nonlocal remaining
+            remaining -= 1
+            if remaining == 0 and not done.done():
+                done.set_result(None)
+
+        for websocket in fast:
+            websocket.delivered = delivered
+        start = time.perf_counter()
+        await manager.broadcast_counter_update(count)
+        enqueue.append(time.perf_counter() - start)
+        await done
+        delivery.append(time.perf_counter() - start)
+
+    # Burst of reports inside one tick: should leave as a single broadcast
+    broadcasts = manager.broadcasts
+    for count in range(1000):
+        manager.publish_counter(count)
+    await asyncio.sleep(manager.counter_tick * 2)
+    print(f"1000 reports in one tick -> {manager.broadcasts - broadcasts} broadcast(s)")
+
+    summarize("broadcast call", enqueue)
+    summarize("all fast clients delivered", delivery)
+    await asyncio.sleep(manager.send_timeout + 0.5)
+    print(f"stats: {manager.stats()}")
+    manager.close()
+
+
+async def live():
+    import httpx
+    import websockets
+
+    base = url.replace("ws://", "http://").replace("wss://", "https://").rsplit("/ws", 1)[0]
+    clients = []
+    for i in range(connections):
+        websocket = await websockets.connect(url, max_queue=None)
+        await websocket.recv()  # initial counter
+        clients.append(websocket)
+        if (i + 1) % 1000 == 0:
+            print(f"  {i + 1} connected")
+
+    async def wait_for(websocket, target):
+        while True:
+            message = json.loads(await websocket.recv())
+            if message.get("type") == "counter_update" and message.get("count", 0) >= target:
+                return
+
+    samples = []
+    async with httpx.AsyncClient(base_url=base) as http:
+        for _ in range(rounds):
+            current = (await http.get("/api/blocked-count")).json()["count"]
+            start = time.perf_counter()
+            await http.post("/api/report-blocked-items", json={"count": 1})
+            await asyncio.gather(*(wait_for(websocket, current + 1) for websocket in clients))
+            samples.append(time.perf_counter() - start)
+        health = (await http.get("/health")).json()
+
+    summarize(f"report -> {connections} clients updated", samples)
+    print(f"server websockets: {health.get('websockets')}")
+    await asyncio.gather(*(websocket.close() for websocket in clients))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(live() if url else in_process())
@@ -0,0 +1,165 @@
+"""
+WebSocket fan-out with per-connection send queues.
+
+Every connection gets its own writer task and a bounded queue, so a broadcast
+is just an O(n) series of non-blocking appends and one slow client can only
+delay itself. When a client's queue is full the oldest message is dropped.
+Counter updates are coalesced: each connection holds at most one pending
+counter value, and publish_counter debounces increments into one broadcast
+per tick.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Client:
+    """Outgoing state for one WebSocket"""
+
+    __slots__ = ("websocket", "queue", "counter", "wakeup", "writer", "dropped")
+
+    def __init__(self, websocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: Deque[str] = deque(maxlen=max_queue)
+        # Latest counter update not yet sent; newer values replace it
+        self.counter: Optional[str] = None
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def push(self, message: str):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self.wakeup.set()
+
+    def push_counter(self, message: str):
+        if self.counter is not None:
+            self.dropped += 1
+        self.counter = message
+        self.wakeup.set()
+
+
+class ConnectionManager:
+    """Tracks WebSocket clients and fans messages out through per-client writers"""
+
+    def __init__(self, max_queue: int = 32, send_timeout: float = 5.0, counter_tick: float = 0.25):
+        self.active_connections: Dict[object, _Client] = {}
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.counter_tick = counter_tick
+        self._latest_count: Optional[int] = None
+        self._tick: Optional[asyncio.TimerHandle] = None
+        self.broadcasts = 0
+        self.slow_disconnects = 0
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        client = _Client(websocket, self.max_queue)
+        self.active_connections[websocket] = client
+        client.writer = asyncio.create_task(self._write(client))
+        logger.info(f"WebSocket client connected. Total connections: {len(self.active_connections)}")
+
+    def disconnect(self, websocket):
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        logger.info(f"WebSocket client disconnected. Total connections: {len(self.active_connections)}")
+
+    async def _write(self, client: _Client):
+        websocket = client.websocket
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                while client.counter is not None or client.queue:
+                    if client.counter is not None:
+                        message, client.counter = client.counter, None
+                    else:
+                        message = client.queue.popleft()
+                    await self._send(websocket, message)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.slow_disconnects += 1
+            logger.warning("WebSocket client too slow, disconnecting")
+            self.disconnect(websocket)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        except Exception as e:
+            logger.error(f"Error sending to connection: {e}")
+            self.disconnect(websocket)
+
+    async def _send(self, websocket, message: str):
+        if hasattr(asyncio, "timeout"):
+            # Python 3.11+: a deadline on the current task, no extra task per message
+            async with asyncio.timeout(self.send_timeout):
+                await websocket.send_text(message)
+        else:
+            await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+
+    async def send_personal_message(self, message: str, websocket):
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.push(message)
+
+    async def broadcast(self, message: str):
+        self.broadcasts += 1
+        for client in self.active_connections.values():
+            client.push(message)
+
+    async def broadcast_counter_update(self, count: int):
+        """Broadcast counter update to all connected WebSocket clients"""
+        message = counter_message(count)
+        self.broadcasts += 1
+        for client in self.active_connections.values():
+            client.push_counter(message)
+        logger.info(f"Broadcasted counter update: {count}")
+
+    def publish_counter(self, count: int):
+        """Schedule a counter broadcast; updates within one tick go out as a single message"""
+        self._latest_count = count
+        if self._tick is None and self.active_connections:
+            self._tick = asyncio.get_running_loop().call_later(self.counter_tick, self._flush_counter)
+
+    def _flush_counter(self):
+        self._tick = None
+        if self._latest_count is not None:
+            asyncio.ensure_future(self.broadcast_counter_update(self._latest_count))
+
+    def close(self):
+        """Stop the pending counter tick and every writer"""
+        if self._tick is not None:
+            self._tick.cancel()
+            self._tick = None
+        for client in self.active_connections.values():
+            if client.writer is not None:
+                client.writer.cancel()
+        self.active_connections.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'connections': len(self.active_connections),
+            'broadcasts': self.broadcasts,
+            'queued': sum(len(client.queue) for client in self.active_connections.values()),
+            'dropped': sum(client.dropped for client in self.active_connections.values()),
+            'slow_disconnects': self.slow_disconnects
+        }
+
+
+def counter_message(count: int) -> str:
+    return json.dumps({
+        "type": "counter_update",
+        "count": count,
+        "timestamp": time.time()
+    })